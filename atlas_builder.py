@@ -0,0 +1,212 @@
+"""Build population sensation heatmaps from a directory of session files.
+
+Every session file written by save_and_exit (MAT v5 or v7.3) is read in a worker
+process, which sums the maps of its reports. The main process adds these partial sums
+into running per-hand heatmaps: all reports, per nerve, per modulation type and per
+sensation. Only a few sessions are in flight at a time, so memory does not grow with
+the number of files.
+
+The heatmaps are written to the output directory as atlas.npz (one uint32 array per
+heatmap, counting the reports that selected each pixel), atlas.json (the number of
+reports and sessions behind each heatmap) and one PNG per heatmap, drawn over the
+bundled hand image.
+
+Usage: python atlas_builder.py SESSION_DIR [-o atlas] [--pattern "*_session.mat"]
+           [--recursive] [--workers N]
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import cv2
+import numpy as np
+
+from hand_assets import HandAssets, handDirectory
+from session_files import headerText, openSession
+
+# Opacity of the heatmap over the hand image, for the least and the most reported pixels
+MIN_ALPHA = 0.35
+MAX_ALPHA = 0.85
+
+
+def sessionSums(path):
+    """Sum the report maps of one session file (runs in a worker process).
+
+    Nerve and modulation type are fixed for a session, so a single sum of all the
+    maps serves every heatmap but the per-sensation ones.
+    """
+    with openSession(path) as session:
+        header = session.header
+        total = None
+        sensations = {}
+        count = 0
+        for key in session.reportKeys():
+            report = session.report(key)
+            selected = np.asarray(report['Map']) > 0
+            if total is None:
+                total = np.zeros(selected.shape, dtype=np.uint16)
+            elif selected.shape != total.shape:
+                raise ValueError(f"report {key} has a {selected.shape} map, expected {total.shape}")
+            total += selected
+            count += 1
+            for sensation in report['Sensation']:
+                if sensation not in sensations:
+                    sensations[sensation] = [np.zeros(total.shape, dtype=np.uint16), 0]
+                sensations[sensation][0] += selected
+                sensations[sensation][1] += 1
+
+    return {
+        'path': path,
+        'hand': headerText(header.get('Hand')).lower() or 'unknown',
+        'nerve': headerText(header.get('Nerve')) or 'None',
+        'modulation': headerText(header.get('ModulationType')) or 'unknown',
+        'reports': count,
+        'total': total,
+        'sensations': sensations
+    }
+
+
+class HeatmapAtlas:
+    """Running sums of the report maps, keyed by (hand, group, value)"""
+    def __init__(self):
+        self.sums = {}
+        self.reports = {}
+        self.sessions = {}
+
+    def add(self, key, partial_sum, reports):
+        heatmap = self.sums.get(key)
+        if heatmap is None:
+            heatmap = self.sums[key] = np.zeros(partial_sum.shape, dtype=np.uint32)
+        elif heatmap.shape != partial_sum.shape:
+            raise ValueError(f"{'/'.join(key)}: map shape {partial_sum.shape} does not match {heatmap.shape}")
+        np.add(heatmap, partial_sum, out=heatmap, casting='unsafe')
+        self.reports[key] = self.reports.get(key, 0) + reports
+        self.sessions[key] = self.sessions.get(key, 0) + 1
+
+    def addSession(self, result):
+        if result['total'] is None:
+            return
+        hand = result['hand']
+        for group, value in (('all', 'all'), ('nerve', result['nerve']), ('modulation', result['modulation'])):
+            self.add((hand, group, value), result['total'], result['reports'])
+        for sensation, (partial_sum, reports) in result['sensations'].items():
+            self.add((hand, 'sensation', sensation), partial_sum, reports)
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        np.savez_compressed(os.path.join(directory, 'atlas.npz'),
+                            **{'/'.join(key): heatmap for key, heatmap in self.sums.items()})
+
+        summary = []
+        for key in sorted(self.sums):
+            image_name = fileName(key) + '.png'
+            cv2.imwrite(os.path.join(directory, image_name), renderHeatmap(self.sums[key], key[0]))
+            summary.append({'hand': key[0], 'group': key[1], 'value': key[2],
+                            'reports': self.reports[key], 'sessions': self.sessions[key],
+                            'max_count': int(self.sums[key].max()), 'image': image_name})
+        with open(os.path.join(directory, 'atlas.json'), 'w') as f:
+            json.dump(summary, f, indent=2)
+        return summary
+
+
+def fileName(key):
+    return '_'.join(re.sub(r'[^A-Za-z0-9]+', '-', part).strip('-').lower() for part in key)
+
+
+def handBackground(side, shape):
+    """Grayscale hand image from PIC as a BGR background of the given (height, width)"""
+    image_path = os.path.join(handDirectory(side), 'Hand.jpg')
+    background = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE) if os.path.exists(image_path) else None
+    if background is None:
+        # No photo for this hand: draw its silhouette from the hand region
+        region = HandAssets(side).load().region
+        if region is None:
+            background = np.full(shape, 255, dtype=np.uint8)
+        else:
+            background = np.where(region > 0, 200, 255).astype(np.uint8)
+    if background.shape != shape:
+        background = cv2.resize(background, (shape[1], shape[0]), interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(background, cv2.COLOR_GRAY2BGR)
+
+
+def renderHeatmap(heatmap, side):
+    """Blend a heatmap over its hand image, more opaque where more reports overlap"""
+    background = handBackground(side, heatmap.shape)
+    peak = int(heatmap.max())
+    if peak == 0:
+        return background
+
+    level = heatmap.astype(np.float32) / peak
+    colors = cv2.applyColorMap((level * 255).astype(np.uint8), cv2.COLORMAP_JET)
+    alpha = np.where(heatmap > 0, MIN_ALPHA + (MAX_ALPHA - MIN_ALPHA) * level, 0)[..., None]
+    return (background * (1 - alpha) + colors * alpha).astype(np.uint8)
+
+
+def findSessions(directory, pattern, recursive):
+    if recursive:
+        pattern = os.path.join('**', pattern)
+    return sorted(glob.glob(os.path.join(directory, pattern), recursive=recursive))
+
+
+def buildAtlas(paths, workers=None):
+    """Aggregate the session files on a process pool, with a bounded number in flight"""
+    atlas = HeatmapAtlas()
+    failed = []
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        remaining = iter(paths)
+        pending = {}
+        done = 0
+        while True:
+            while len(pending) < 2 * workers:
+                path = next(remaining, None)
+                if path is None:
+                    break
+                pending[pool.submit(sessionSums, path)] = path
+            if not pending:
+                break
+
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                path = pending.pop(future)
+                done += 1
+                try:
+                    result = future.result()
+                    atlas.addSession(result)
+                    print(f"[{done}/{len(paths)}] {path}: {result['reports']} reports")
+                except Exception as e:
+                    failed.append(path)
+                    print(f"[{done}/{len(paths)}] {path}: skipped ({e})")
+    return atlas, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('directory', help="directory containing the session files")
+    parser.add_argument('-o', '--output', default='atlas', help="output directory (default: atlas)")
+    parser.add_argument('--pattern', default='*_session.mat', help="file name pattern of the session files")
+    parser.add_argument('--recursive', action='store_true', help="also search the subdirectories")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per CPU)")
+    args = parser.parse_args()
+
+    paths = findSessions(args.directory, args.pattern, args.recursive)
+    if not paths:
+        print(f"No session files matching {args.pattern} in {args.directory}")
+        return 1
+
+    atlas, failed = buildAtlas(paths, args.workers)
+    summary = atlas.save(args.output)
+    for entry in summary:
+        print(f"{entry['hand']:<6} {entry['group']:<10} {entry['value']:<20} "
+              f"{entry['reports']:>6} reports in {entry['sessions']:>4} sessions")
+    print(f"Atlas of {len(paths) - len(failed)} sessions written to {args.output}"
+          + (f" ({len(failed)} files skipped)" if failed else ""))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""Compare the MAT v5 (savemat) and MAT v7.3 (HDF5) export backends.
+
+For synthetic sessions of increasing size this measures write time, file size, the
+time to load the whole file and the time to read a single report's map.
+
+Usage: python benchmarks/bench_export_backends.py [--reports 10 100 300]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+import scipy.io as sio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from export_backends import MatV5Backend, Hdf5Backend  # noqa: E402
+from export_worker import matlabReportEntry  # noqa: E402
+from report_maps import CompactMap  # noqa: E402
+
+MAP_SHAPE = (954, 1470)
+
+
+def syntheticReports(count, seed=0):
+    """Reports with blob-shaped maps of random size and position, like lasso selections"""
+    rng = np.random.default_rng(seed)
+    reports = []
+    for i in range(count):
+        mask = np.zeros(MAP_SHAPE, dtype=np.uint8)
+        center = (int(rng.integers(100, MAP_SHAPE[1] - 100)), int(rng.integers(100, MAP_SHAPE[0] - 100)))
+        axes = (int(rng.integers(10, 150)), int(rng.integers(10, 150)))
+        cv2.ellipse(mask, center, axes, float(rng.uniform(0, 180)), 0, 360, 255, -1)
+        reports.append((str(i + 1), {
+            'Map': CompactMap.fromArray(mask),
+            'ModulatedParameter': 1.0 + 0.1 * i,
+            'Sensation': ['Tingle', 'Buzz'],
+            'AdditionalDescription': f'Synthetic report {i + 1}',
+            'Naturalness': 5,
+            'Painfulness': 0,
+            'UnderElectrodeSensation': 5
+        }))
+    return reports
+
+
+def sessionHeader():
+    return {
+        'Date': '2025/01/01 12:00',
+        'PatientID': 'BENCH',
+        'Hand': 'Right',
+        'ModulationType': 'amplitude',
+        'Nerve': 'Median',
+        'InterphaseDistance_us': 100.0,
+        'Current': np.array([]),
+        'Frequency': 50.0,
+        'PulseWidth': 200.0,
+        'MotorThreshold': 10.0,
+        'SensoryThreshold': 1.0
+    }
+
+
+def writeSession(backend, filename, reports):
+    backend.begin(filename, sessionHeader())
+    for report_key, report in reports:
+        backend.writeReport(report_key, matlabReportEntry(report))
+    backend.finish()
+
+
+def loadAllV5(filename):
+    return sio.loadmat(filename, simplify_cells=True)['data']
+
+
+def loadOneV5(filename, report_num):
+    # MAT v5 has no random access: the whole 'data' variable must be decoded
+    return sio.loadmat(filename, simplify_cells=True)['data']['report'][f'report_{report_num}']['Map']
+
+
+def loadAllHdf5(filename):
+    import h5py
+    with h5py.File(filename, 'r') as f:
+        return {name: group['Map'][()] for name, group in f['data/report'].items()}
+
+
+def loadOneHdf5(filename, report_num):
+    import h5py
+    with h5py.File(filename, 'r') as f:
+        return f[f'data/report/report_{report_num}/Map'][()]
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--reports', type=int, nargs='+', default=[10, 100, 300])
+    args = parser.parse_args()
+
+    backends = [(MatV5Backend, loadAllV5, loadOneV5)]
+    if Hdf5Backend.available():
+        backends.append((Hdf5Backend, loadAllHdf5, loadOneHdf5))
+    else:
+        print("h5py is not installed: only the MAT v5 backend is measured")
+
+    print(f"{'backend':<20} {'reports':>7} {'write s':>9} {'size MB':>9} {'load all s':>11} {'load one s':>11}")
+    with tempfile.TemporaryDirectory() as directory:
+        for count in args.reports:
+            reports = syntheticReports(count)
+            for backend_class, load_all, load_one in backends:
+                filename = os.path.join(directory, f'{backend_class.__name__}_{count}.mat')
+                write_time = timed(writeSession, backend_class(), filename, reports)
+                size_mb = os.path.getsize(filename) / 1e6
+                load_all_time = timed(load_all, filename)
+                load_one_time = timed(load_one, filename, count // 2 + 1)
+                print(f"{backend_class.name:<20} {count:>7} {write_time:>9.3f} {size_mb:>9.2f} "
+                      f"{load_all_time:>11.3f} {load_one_time:>11.4f}")
+
+
+if __name__ == '__main__':
+    main()
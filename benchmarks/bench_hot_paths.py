@@ -0,0 +1,348 @@
+"""Benchmark the selection, rendering and export hot paths of SensationApp.
+
+Runs headless (QT_QPA_PLATFORM=offscreen) and drives a real SensationApp with:
+  - synthetic lasso polygons of several sizes and vertex counts (processLassoSelection),
+  - repaints of the selection layers (redrawAreaSelection / the label's paintEvent),
+  - rescaling of the hand image (displayImage),
+for the hand image at 1x, 2x and 4x its resolution, and save_and_exit for synthetic
+sessions of 10 to 1,000 reports with every available export backend. The file dialog
+and message boxes are stubbed so the export runs unattended.
+
+Latency percentiles and throughput are printed for each case. With --save-baseline the
+results are stored as the new baseline; otherwise they are compared with the baseline
+and the script exits with status 1 if a median got slower than the allowed tolerance.
+It also exits with status 1 if the 95th percentile of a stroke frame exceeds the
+frame-time target of the app (STROKE_FRAME_TARGET_MS), whatever the baseline.
+
+Usage: python benchmarks/bench_hot_paths.py [--repeat 20] [--scales 1 2 4]
+           [--sessions 10 100 1000] [--save-baseline] [--tolerance 0.5]
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+# Keep the app's diagnostics out of the measurements
+os.environ.setdefault("SENSATION_LOG_LEVEL", "WARNING")
+
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+from PyQt5.QtCore import Qt  # noqa: E402
+from PyQt5.QtWidgets import QApplication, QFileDialog, QMessageBox  # noqa: E402
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from bench_export_backends import syntheticReports  # noqa: E402
+from export_backends import availableBackends  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+# Lasso radius as a fraction of the smaller side of the image, and vertex counts
+LASSO_SIZES = {'small': 0.03, 'medium': 0.1, 'large': 0.3}
+LASSO_VERTICES = [50, 500, 5000]
+# Points of the lasso stroke in progress, and pointer positions added per frame
+# (a 1 kHz pen at 60 Hz)
+STROKE_POINTS = 5000
+STROKE_BATCH = 16
+
+
+class Stats:
+    """Latency samples of one benchmark case"""
+    def __init__(self, name, samples, items=1):
+        self.name = name
+        self.samples_ms = np.asarray(samples) * 1000.0
+        self.items = items  # Work items processed per sample (for the throughput)
+
+    def summary(self):
+        p50, p95, p99 = np.percentile(self.samples_ms, [50, 95, 99])
+        mean = float(self.samples_ms.mean())
+        return {
+            'p50_ms': round(float(p50), 3),
+            'p95_ms': round(float(p95), 3),
+            'p99_ms': round(float(p99), 3),
+            'mean_ms': round(mean, 3),
+            'throughput_per_s': round(self.items * 1000.0 / mean, 2) if mean > 0 else None,
+            'samples': int(self.samples_ms.size)
+        }
+
+
+def timeCalls(function, repeat, setup=None):
+    """Time repeat calls of function, running setup (untimed) before each call"""
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def lassoPolygon(center, radius, vertices, rng):
+    """Closed, irregular lasso around center, like a hand-drawn selection"""
+    angles = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+    radii = radius * rng.uniform(0.7, 1.0, vertices)
+    points = [(center[0] + r * np.cos(a), center[1] + r * np.sin(a)) for a, r in zip(angles, radii)]
+    return points + points[:1]
+
+
+class HotPathBenchmark:
+    def __init__(self, app, window, repeat, output_dir):
+        self.app = app
+        self.window = window
+        self.repeat = repeat
+        self.output_dir = output_dir
+        self.results = []
+        self.base_pixmap = window.original_pixmap
+        self.base_region = window.hand_region
+
+    def record(self, name, samples, items=1):
+        stats = Stats(name, samples, items)
+        self.results.append(stats)
+        summary = stats.summary()
+        print(f"{name:<44} {summary['p50_ms']:>9.3f} {summary['p95_ms']:>9.3f} "
+              f"{summary['p99_ms']:>9.3f} {summary['throughput_per_s']:>11.1f}")
+
+    def setScale(self, scale):
+        """Swap in the hand image and region scaled by the given factor"""
+        window = self.window
+        width, height = self.base_pixmap.width() * scale, self.base_pixmap.height() * scale
+        window.original_pixmap = self.base_pixmap.scaled(width, height, Qt.IgnoreAspectRatio,
+                                                         Qt.SmoothTransformation)
+        window.pixmap_cache.setSource(window.original_pixmap)
+        window.hand_region = cv2.resize(self.base_region, (width, height), interpolation=cv2.INTER_NEAREST)
+        window.selected_area = None
+        window.selection_overlay.clear()
+        window.displayImage()
+        self.app.processEvents()
+
+    def handCenter(self):
+        """The point of the hand farthest from its edge (the middle of the palm)"""
+        distance = cv2.distanceTransform(self.window.hand_region, cv2.DIST_L2, 3)
+        _, _, _, center = cv2.minMaxLoc(distance)
+        return center
+
+    def benchLasso(self, scale):
+        window = self.window
+        center = self.handCenter()
+        height, width = window.hand_region.shape
+        rng = np.random.default_rng(0)
+
+        def clearSelection():
+            # Every repeat starts a new selection, without the strokes and edits of the previous ones
+            window.selected_area = None
+            window.selection_vectors = None
+            window.selection_history.clear()
+            window.selection_overlay.clear()
+
+        for size, fraction in LASSO_SIZES.items():
+            for vertices in LASSO_VERTICES:
+                polygon = lassoPolygon(center, fraction * min(width, height), vertices, rng)
+                samples = timeCalls(lambda: window.processLassoSelection(polygon), self.repeat,
+                                    setup=clearSelection)
+                self.record(f"lasso {scale}x {size} {vertices}v", samples)
+
+    def benchRendering(self, scale):
+        window = self.window
+        label = window.image_label
+        center = self.handCenter()
+        height, width = window.hand_region.shape
+        rng = np.random.default_rng(1)
+
+        # A selection to composite over the hand
+        window.selected_area = None
+        window.processLassoSelection(lassoPolygon(center, 0.2 * min(width, height), 500, rng))
+
+        def redraw():
+            window.redrawAreaSelection()
+            label.repaint()
+
+        redraw()  # Build the overlay once
+        self.record(f"redraw {scale}x overlay cached", timeCalls(redraw, self.repeat))
+        self.record(f"redraw {scale}x overlay rebuilt",
+                    timeCalls(redraw, self.repeat, setup=window.selection_overlay.invalidate))
+
+        # A frame of a long lasso stroke in progress, through the input path of the label:
+        # the pointer positions queued since the last frame are added and the label repainted
+        offset, image_scale, _ = label.imageTransform()
+        stroke = np.asarray(lassoPolygon(center, 0.25 * min(width, height), STROKE_POINTS, rng)) / image_scale + offset
+        positions = iter(np.tile(stroke, (self.repeat * STROKE_BATCH // len(stroke) + 2, 1)).tolist())
+        label.beginStroke(next(positions))
+        for _ in range(STROKE_POINTS):
+            label.queuePosition(next(positions))
+        label.flushStroke()
+
+        def queueBatch():
+            for _ in range(STROKE_BATCH):
+                label.queuePosition(next(positions))
+
+        self.record(f"redraw {scale}x stroke {STROKE_POINTS} points",
+                    timeCalls(label.flushStroke, self.repeat, setup=queueBatch))
+        label.drawing = False
+        label.lasso_points = []
+        label.stroke_layer.clear()
+
+    def benchDisplay(self, scale):
+        window = self.window
+
+        def dropCache():
+            window.pixmap_cache.setSource(window.original_pixmap)
+
+        self.record(f"displayImage {scale}x cached", timeCalls(window.displayImage, self.repeat))
+        self.record(f"displayImage {scale}x smooth uncached",
+                    timeCalls(window.displayImage, self.repeat, setup=dropCache))
+        self.record(f"displayImage {scale}x fast uncached",
+                    timeCalls(lambda: window.displayImage(fast=True), self.repeat, setup=dropCache))
+
+    def benchExport(self, sessions, max_export_mb):
+        window = self.window
+        self.setScale(1)
+        backends = availableBackends()
+        map_mb = window.hand_region.size / 1e6
+        repeat = max(1, self.repeat // 10)
+
+        for count in sessions:
+            reports = dict(syntheticReports(count))
+            for backend in backends:
+                # The MAT v5 backend holds every expanded map until savemat
+                if backend.name == "MATLAB v5" and count * map_mb > max_export_mb:
+                    print(f"{'export ' + backend.name + f' {count} reports':<44} skipped "
+                          f"(~{count * map_mb:.0f} MB of maps, see --max-export-mb)")
+                    continue
+
+                filename = os.path.join(self.output_dir, f"session_{count}.mat")
+                QFileDialog.getSaveFileName = staticmethod(
+                    lambda *args, _filter=backend.file_filter, **kwargs: (filename, _filter))
+                samples = []
+                for _ in range(repeat):
+                    window.reports = dict(reports)
+                    window.journal = None
+                    start = time.perf_counter()
+                    window.save_and_exit()
+                    self.waitForQuit()
+                    samples.append(time.perf_counter() - start)
+                    os.remove(filename)
+                self.record(f"export {backend.name} {count} reports", samples, items=count)
+
+    def waitForQuit(self):
+        """Process events until the export worker has finished and the app asked to quit"""
+        self.app.quit_requested = False
+        while not self.app.quit_requested:
+            self.app.processEvents()
+            time.sleep(0.001)
+
+
+def compareWithBaseline(results, baseline, tolerance):
+    """Return the cases whose median latency regressed by more than the tolerance"""
+    regressions = []
+    for name, summary in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        limit = reference['p50_ms'] * (1.0 + tolerance)
+        if summary['p50_ms'] > limit:
+            regressions.append((name, reference['p50_ms'], summary['p50_ms']))
+    return regressions
+
+
+def checkFrameTargets(results, target_ms):
+    """Return the stroke frame cases whose 95th percentile exceeds the frame-time target"""
+    return [(name, summary['p95_ms']) for name, summary in results.items()
+            if ' stroke ' in name and summary['p95_ms'] > target_ms]
+
+
+def machineInfo():
+    """Description of the machine that produced the results, stored with a baseline"""
+    cpu = platform.processor() or platform.machine()
+    try:
+        with open('/proc/cpuinfo') as f:
+            cpu = next(line.split(':', 1)[1].strip() for line in f if line.startswith('model name'))
+    except (OSError, StopIteration):
+        pass
+    return {'platform': platform.platform(), 'python': platform.python_version(),
+            'cpu': cpu, 'cpu_count': os.cpu_count()}
+
+
+def stubDialogs(app):
+    """Replace the modal dialogs and quit() so that the app can be driven unattended"""
+    QMessageBox.warning = staticmethod(lambda *args, **kwargs: QMessageBox.Ok)
+    QMessageBox.information = staticmethod(lambda *args, **kwargs: QMessageBox.Ok)
+    QMessageBox.critical = staticmethod(lambda *args, **kwargs: QMessageBox.Ok)
+    QMessageBox.question = staticmethod(lambda *args, **kwargs: QMessageBox.Yes)
+
+    def quit():
+        app.quit_requested = True
+    QApplication.quit = staticmethod(quit)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=20, help="samples per case (exports use a tenth)")
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--sessions', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--max-export-mb', type=float, default=2048,
+                        help="skip MAT v5 exports whose expanded maps exceed this size")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help="allowed relative slowdown of the median before failing")
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    app.quit_requested = False
+    stubDialogs(app)
+
+    with tempfile.TemporaryDirectory() as directory:
+        # The app writes its journal and Saving_folder in the working directory
+        os.symlink(os.path.join(REPO_DIR, 'PIC'), os.path.join(directory, 'PIC'))
+        os.chdir(directory)
+
+        from sensation_app import STROKE_FRAME_TARGET_MS, SensationApp
+        window = SensationApp()
+        window.setWindowState(Qt.WindowNoState)
+        window.resize(1600, 1000)
+        window.show()
+        app.processEvents()
+        window.loadHandAssets()
+
+        benchmark = HotPathBenchmark(app, window, args.repeat, directory)
+        print(f"{'case':<44} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'per second':>11}")
+        for scale in args.scales:
+            benchmark.setScale(scale)
+            benchmark.benchLasso(scale)
+            benchmark.benchRendering(scale)
+            benchmark.benchDisplay(scale)
+        benchmark.benchExport(args.sessions, args.max_export_mb)
+        window.hide()
+
+    results = {stats.name: stats.summary() for stats in benchmark.results}
+    over_target = checkFrameTargets(results, STROKE_FRAME_TARGET_MS)
+    for name, p95 in over_target:
+        print(f"OVER TARGET {name}: p95 {p95:.3f} ms (target {STROKE_FRAME_TARGET_MS:.0f} ms)")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(dict(machineInfo(), results=results), f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return 1 if over_target else 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}: run with --save-baseline to create one")
+        return 1 if over_target else 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)['results']
+    regressions = compareWithBaseline(results, baseline, args.tolerance)
+    for name, reference, current in regressions:
+        print(f"REGRESSION {name}: p50 {current:.3f} ms (baseline {reference:.3f} ms)")
+    if not regressions:
+        print(f"No regression beyond {args.tolerance:.0%} of the baseline medians")
+    return 1 if regressions or over_target else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
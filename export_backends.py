@@ -0,0 +1,274 @@
+import datetime
+import re
+import zlib
+
+import numpy as np
+import scipy.io as sio
+
+from instrumentation import log, timed
+
+try:
+    import h5py
+except ImportError:  # h5py is optional: without it only the MAT v5 backend is offered
+    h5py = None
+
+
+class CompressedMap:
+    """A report map split into its HDF5 chunks, each deflate-compressed (see Hdf5Backend)"""
+    def __init__(self, shape, dtype, chunks, chunk_data):
+        self.shape = shape            # Shape of the stored (transposed) map
+        self.dtype = dtype
+        self.chunks = chunks          # Chunk shape
+        self.chunk_data = chunk_data  # [(offset of the chunk, compressed bytes)]
+
+
+class MatV5Backend:
+    """Writes the session as a MAT v5 file with scipy.io.savemat (the original format).
+
+    MAT v5 files are written in one go, so the reports are collected until finish().
+    savemat compresses the whole 'data' variable as a single zlib stream there, so
+    unlike HDF5 the compression cannot be spread over the export threads.
+    """
+    name = "MATLAB v5"
+    file_filter = "MATLAB Files (*.mat)"
+
+    @classmethod
+    def available(cls):
+        return True
+
+    def begin(self, filename, header):
+        self.filename = filename
+        self.matlab_data = dict(header)
+        self.report_struct = {}
+
+    def prepareReport(self, entry):
+        return entry
+
+    def writeReport(self, report_key, entry):
+        # Add to our nested structure with key "report_N"
+        self.report_struct[f'report_{int(report_key)}'] = entry
+
+    def finish(self):
+        # Store the report structure in the MATLAB data
+        self.matlab_data['report'] = self.report_struct
+        log.debug("MATLAB data structure keys: %s", list(self.matlab_data.keys()))
+        sio.savemat(self.filename, {'data': self.matlab_data},
+                    long_field_names=True,
+                    do_compression=True)
+
+    def abort(self):
+        self.report_struct = {}
+
+
+class Hdf5Backend:
+    """Writes the session as an HDF5 file laid out as a MATLAB v7.3 MAT-file.
+
+    Each report is written as soon as it is ready, with its map in its own chunked,
+    gzip-compressed dataset, so the file is built incrementally and readers can open
+    a single report (data/report/report_N) without loading the others. The scalar
+    fields of each report are also stored as attributes of its group for quick queries.
+
+    prepareReport() compresses the chunks of a map ahead of writeReport(). The export
+    worker calls it on its thread pool (zlib releases the GIL), so the maps of several
+    reports are compressed in parallel; the chunks are then written as they are.
+    """
+    name = "MATLAB v7.3 (HDF5)"
+    file_filter = "MATLAB v7.3 / HDF5 Files (*.mat *.h5)"
+
+    # MAT-file header stored in the HDF5 user block, as written by MATLAB for v7.3 files
+    USERBLOCK_SIZE = 512
+
+    def __init__(self, compression_level=4, chunk_size=(512, 512)):
+        self.compression_level = compression_level
+        self.chunk_size = chunk_size
+        self.file = None
+
+    @classmethod
+    def available(cls):
+        return h5py is not None
+
+    def begin(self, filename, header):
+        self.filename = filename
+        self.file = h5py.File(filename, 'w', userblock_size=self.USERBLOCK_SIZE, libver='earliest')
+        self._ref_count = 0
+        self._refs = self.file.create_group('#refs#')
+
+        self.data = self.file.create_group('data')
+        self.data.attrs['MATLAB_class'] = np.bytes_('struct')
+        self._data_fields = list(header.keys()) + ['report']
+        for field, value in header.items():
+            self._writeValue(self.data, field, value)
+
+        self.reports = self.data.create_group('report')
+        self.reports.attrs['MATLAB_class'] = np.bytes_('struct')
+        self._report_fields = []
+
+    def prepareReport(self, entry):
+        """Return the report entry with its map compressed into its dataset chunks"""
+        return dict(entry, Map=self._compressMap(entry['Map']))
+
+    def writeReport(self, report_key, entry):
+        field = f'report_{int(report_key)}'
+        group = self.reports.create_group(field)
+        group.attrs['MATLAB_class'] = np.bytes_('struct')
+        for name, value in entry.items():
+            if name == 'Map':
+                self._writeMap(group, name, value)
+            else:
+                self._writeValue(group, name, value)
+                if np.isscalar(value):
+                    group.attrs[name] = value
+        self._setFields(group, list(entry.keys()))
+
+        self._report_fields.append(field)
+        self.file.flush()
+
+    def finish(self):
+        self._setFields(self.reports, self._report_fields)
+        self._setFields(self.data, self._data_fields)
+        self.file.close()
+        self.file = None
+        self._writeMatHeader()
+
+    def abort(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def _writeMatHeader(self):
+        """Write the 128 byte MAT-file header into the user block"""
+        created = datetime.datetime.now().strftime("%a %b %d %H:%M:%S %Y")
+        text = f"MATLAB 7.3 MAT-file, Platform: Python, Created on: {created} HDF5 schema 1.00 ."
+        header = text.encode('ascii').ljust(116, b' ')
+        header += b'\x00' * 8          # Subsystem data offset
+        header += b'\x00\x02' + b'IM'  # Version 0x0200 and endian indicator
+        with open(self.filename, 'r+b') as f:
+            f.write(header)
+
+    def _setFields(self, group, fields):
+        """Store the field order of a struct group as MATLAB does"""
+        vlen = h5py.vlen_dtype(np.dtype('S1'))
+        names = np.empty(len(fields), dtype=object)
+        for i, field in enumerate(fields):
+            names[i] = np.array(list(field), dtype='S1')
+        group.attrs.create('MATLAB_fields', names, dtype=vlen)
+
+    @timed("export.compressMap")
+    def _compressMap(self, array):
+        """Split a map into the chunks of its dataset and compress each one as the gzip
+        filter of HDF5 does (a zlib stream); empty maps are returned as arrays"""
+        if isinstance(array, CompressedMap):
+            return array
+        # MATLAB is column-major: store the transpose so the map loads as height x width
+        data = np.ascontiguousarray(np.asarray(array).T)
+        if not data.size:
+            return data
+        chunks = tuple(min(c, s) for c, s in zip(self.chunk_size, data.shape))
+        chunk_data = []
+        for row in range(0, data.shape[0], chunks[0]):
+            for col in range(0, data.shape[1], chunks[1]):
+                # Chunks are stored at their full size: the ones at the edges are padded
+                block = data[row:row + chunks[0], col:col + chunks[1]]
+                if block.shape != chunks:
+                    padded = np.zeros(chunks, dtype=data.dtype)
+                    padded[:block.shape[0], :block.shape[1]] = block
+                    block = padded
+                chunk_data.append(((row, col), zlib.compress(np.ascontiguousarray(block), self.compression_level)))
+        return CompressedMap(data.shape, data.dtype, chunks, chunk_data)
+
+    def _writeMap(self, group, name, array):
+        data = self._compressMap(array)
+        if isinstance(data, CompressedMap):
+            dataset = group.create_dataset(name, shape=data.shape, dtype=data.dtype, chunks=data.chunks,
+                                           compression='gzip', compression_opts=self.compression_level,
+                                           shuffle=False)
+            for offset, chunk in data.chunk_data:
+                dataset.id.write_direct_chunk(offset, chunk)
+        else:
+            dataset = group.create_dataset(name, data=data)
+        dataset.attrs['MATLAB_class'] = np.bytes_(self._matlabClass(data.dtype))
+
+    def _writeValue(self, parent, name, value):
+        """Write a scalar, string, numeric array or cell array of strings"""
+        if isinstance(value, dict):
+            group = parent.create_group(name)
+            group.attrs['MATLAB_class'] = np.bytes_('struct')
+            for field, field_value in value.items():
+                self._writeValue(group, field, field_value)
+            self._setFields(group, list(value.keys()))
+            return None
+
+        if isinstance(value, str):
+            return self._writeString(parent, name, value)
+
+        array = np.asarray(value)
+        if array.dtype == object:
+            return self._writeCell(parent, name, array)
+        if array.dtype.kind in ('U', 'S'):
+            return self._writeString(parent, name, str(value))
+
+        matlab_class = self._matlabClass(array.dtype)
+        if array.size == 0:
+            dataset = parent.create_dataset(name, data=np.zeros(2, dtype=np.uint64))
+            dataset.attrs['MATLAB_empty'] = np.uint8(1)
+        else:
+            dataset = parent.create_dataset(name, data=np.atleast_2d(array).T)
+        dataset.attrs['MATLAB_class'] = np.bytes_(matlab_class)
+        return dataset
+
+    def _writeString(self, parent, name, text):
+        if not text:
+            dataset = parent.create_dataset(name, data=np.zeros(2, dtype=np.uint64))
+            dataset.attrs['MATLAB_empty'] = np.uint8(1)
+        else:
+            codes = np.frombuffer(text.encode('utf-16-le'), dtype=np.uint16)
+            dataset = parent.create_dataset(name, data=codes.reshape(-1, 1))
+        dataset.attrs['MATLAB_class'] = np.bytes_('char')
+        dataset.attrs['MATLAB_int_decode'] = np.int32(2)
+        return dataset
+
+    def _writeCell(self, parent, name, array):
+        """Write a 1 x N cell array; its elements live in the #refs# group"""
+        items = array.ravel()
+        if items.size == 0:
+            dataset = parent.create_dataset(name, data=np.zeros(2, dtype=np.uint64))
+            dataset.attrs['MATLAB_empty'] = np.uint8(1)
+        else:
+            refs = np.empty((items.size, 1), dtype=h5py.ref_dtype)
+            for i, item in enumerate(items):
+                self._ref_count += 1
+                element = self._writeValue(self._refs, f'r{self._ref_count}', item)
+                refs[i, 0] = element.ref
+            dataset = parent.create_dataset(name, data=refs)
+        dataset.attrs['MATLAB_class'] = np.bytes_('cell')
+        return dataset
+
+    @staticmethod
+    def _matlabClass(dtype):
+        dtype = np.dtype(dtype)
+        if dtype == np.bool_:
+            return 'logical'
+        if dtype.kind == 'f':
+            return 'single' if dtype.itemsize == 4 else 'double'
+        return dtype.name  # int8 ... uint64 have the same names in MATLAB
+
+
+# Backends offered in the save dialog, in order of preference
+EXPORT_BACKENDS = [MatV5Backend, Hdf5Backend]
+
+
+def availableBackends():
+    """Return the export backends whose dependencies are installed"""
+    return [backend for backend in EXPORT_BACKENDS if backend.available()]
+
+
+def sessionFileFilter():
+    """Open dialog filter for session files: the patterns of every available backend
+    together, then the filter of each backend"""
+    backends = availableBackends()
+    patterns = []
+    for backend in backends:
+        for pattern in re.search(r'\((.*)\)', backend.file_filter).group(1).split():
+            if pattern not in patterns:
+                patterns.append(pattern)
+    return ";;".join([f"Session files ({' '.join(patterns)})"] + [backend.file_filter for backend in backends])
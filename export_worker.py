@@ -0,0 +1,144 @@
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PyQt5.QtCore import QObject, QRunnable, pyqtSignal
+
+from export_backends import MatV5Backend
+from instrumentation import log, span, timed
+
+
+@timed("export.expandReport")
+def matlabReportEntry(report_data):
+    """Convert a stored report into the dict written as a MATLAB struct, expanding its map"""
+    # Convert sensation list to a cell array for MATLAB
+    sensation_list = report_data['Sensation']
+    matlab_sensations = np.array([str(s) for s in sensation_list], dtype=object)
+
+    report_map = report_data['Map']
+    if hasattr(report_map, 'toArray'):
+        report_map = report_map.toArray()
+
+    # Simplified lasso strokes as a cell array of N x 2 [x y] vertex arrays (image pixels)
+    selection_vectors = report_data.get('Strokes')
+    strokes = selection_vectors.strokes if selection_vectors is not None else []
+    erased = selection_vectors.erased if selection_vectors is not None else []
+    region_id = selection_vectors.region_id if selection_vectors is not None else None
+    matlab_strokes = np.empty(len(strokes), dtype=object)
+    for i, stroke in enumerate(strokes):
+        matlab_strokes[i] = stroke.astype(np.float64)
+
+    return {
+        'Map': report_map,
+        'ModulatedParameter': report_data['ModulatedParameter'],
+        'Sensation': matlab_sensations,
+        'AdditionalDescription': report_data['AdditionalDescription'],
+        'Naturalness': report_data['Naturalness'],
+        'Painfulness': report_data['Painfulness'],
+        'UnderElectrodeSensation': report_data['UnderElectrodeSensation'],
+        'Strokes': matlab_strokes,
+        'StrokeErase': np.array(erased, dtype=np.uint8),  # 1 for the strokes that erased
+        'HandMaskId': region_id or '',
+        # Selected pixels per anatomical zone and per nerve territory (empty without a label map)
+        'RegionPixels': report_data.get('RegionPixels') or {},
+        'NervePixels': report_data.get('NervePixels') or {}
+    }
+
+
+class ExportSignals(QObject):
+    """Signals emitted by SessionExportWorker (delivered on the GUI thread)"""
+    progress = pyqtSignal(int, int, str)  # Completed steps, total steps, message
+    finished = pyqtSignal(str)            # Path of the written file
+    failed = pyqtSignal(str)              # Error message
+
+
+class SessionExportWorker(QRunnable):
+    """Builds the session struct and writes it with an export backend, off the GUI thread.
+
+    Report maps are expanded from their compact form and prepared by the backend in
+    parallel on a thread pool (NumPy and zlib release the GIL for the heavy work), then
+    handed to the backend one report at a time, in order. The HDF5 backend compresses
+    the chunks of each map there and writes them as they are, incrementally, so it
+    never needs every map in memory at once. The MAT v5 backend collects the maps and
+    writes in finish(), as savemat compresses its single 'data' variable in one stream
+    that cannot be split across cores.
+
+    summary, if given, is a (ReportTable, path) pair: the rows of the reports missing
+    from the table are added as the reports are written, and the table is written to
+    path once the session file is complete.
+    """
+    def __init__(self, filename, matlab_data, report_items, backend=None, max_workers=None,
+                 report_count=None, summary=None):
+        super().__init__()
+        self.filename = filename
+        self.matlab_data = matlab_data
+        self.report_items = report_items
+        self.report_count = report_count  # Number of report items, if they are given as an iterator
+        self.backend = backend if backend is not None else MatV5Backend()
+        self.summary_table, self.summary_path = summary if summary is not None else (None, None)
+        self.max_workers = max_workers or min(8, os.cpu_count() or 1)
+        self.signals = ExportSignals()
+
+    @timed("export.session")
+    def run(self):
+        try:
+            # Reports are read from the iterator as they are exported; without a
+            # report count they must be listed first to know the progress total
+            report_items = self.report_items
+            if self.report_count is None:
+                report_items = list(report_items)
+            report_count = self.report_count if self.report_count is not None else len(report_items)
+            total = report_count + 1  # One step per report plus the final write
+
+            self.backend.begin(self.filename, self.matlab_data)
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                # Only a few expanded maps are in flight at a time, so that incremental
+                # backends export large sessions in bounded memory
+                pending = deque()
+                done = 0
+                for report_key, report_data in report_items:
+                    pending.append((report_key, report_data, pool.submit(self._prepareEntry, report_data)))
+                    if len(pending) >= 2 * self.max_workers:
+                        done = self._writeNext(pending, done, total)
+                while pending:
+                    done = self._writeNext(pending, done, total)
+
+            self.signals.progress.emit(total - 1, total, "Writing file...")
+            with span("export.finish"):
+                self.backend.finish()
+            if self.summary_table is not None:
+                self.writeSummary()
+            self.signals.progress.emit(total, total, "Done")
+            self.signals.finished.emit(self.filename)
+        except Exception as e:
+            self.backend.abort()
+            log.error("Detailed error: %s", e)
+            self.signals.failed.emit(str(e))
+
+    def _prepareEntry(self, report_data):
+        """Expand a report and let the backend prepare it for writing (on the thread pool)"""
+        return self.backend.prepareReport(matlabReportEntry(report_data))
+
+    def _writeNext(self, pending, done, total):
+        """Hand the oldest expanded report to the backend, in report order"""
+        report_key, report_data, entry = pending.popleft()
+        report_entry = entry.result()
+        log.debug("Processing report #%d with sensations: %s", int(report_key), report_entry['Sensation'])
+        with span("export.writeReport"):
+            self.backend.writeReport(report_key, report_entry)
+        done += 1
+        if self.summary_table is not None and report_key not in self.summary_table:
+            # The map is already expanded (or read) by matlabReportEntry
+            self.summary_table.add(report_key, report_data)
+        self.signals.progress.emit(done, total, f"Saved report #{int(report_key)}")
+        return done
+
+    @timed("export.summary")
+    def writeSummary(self):
+        """Write the report table; the session file is complete, so a failure here is only logged"""
+        try:
+            self.summary_table.write(self.summary_path)
+            log.info("Report summary saved to %s", self.summary_path)
+        except Exception as e:
+            log.error("Error writing the report summary %s: %s", self.summary_path, e)
@@ -0,0 +1,186 @@
+import hashlib
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+from PyQt5.QtGui import QImage, QPixmap
+
+from hand_labels import LABEL_FILE, loadLabels, saveLabels, segmentHand
+
+# Pixels of the JPEG mask darker than this belong to the hand (the hand is black in the mask)
+MASK_THRESHOLD = 50
+
+# Lossless hand region shipped next to each JPEG mask (see buildRegionFile)
+REGION_FILE = 'hand_region.npz'
+
+
+def resource_path(relative_path):
+    """Get the absolute path to the resource, works for development and for PyInstaller"""
+    try:
+        # PyInstaller creates a temp folder and stores path in _MEIPASS
+        base_path = sys._MEIPASS
+    except Exception:
+        base_path = os.path.abspath(".")
+
+    return os.path.join(base_path, relative_path)
+
+
+def handDirectory(side):
+    return resource_path(os.path.join('PIC', side.capitalize()))
+
+
+def regionFromJpegMask(mask):
+    """Binary hand region (255 inside the hand) from the grayscale JPEG mask"""
+    return cv2.threshold(mask, MASK_THRESHOLD, 255, cv2.THRESH_BINARY_INV)[1]
+
+
+def regionId(region):
+    """Short fingerprint of a hand region, to tell which mask a selection was made on"""
+    digest = hashlib.sha1(str(region.shape).encode('ascii'))
+    digest.update(np.packbits(region > 0).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def saveRegion(path, region):
+    """Store a binary region losslessly as packed bits"""
+    np.savez_compressed(path, bits=np.packbits(region > 0), shape=np.array(region.shape))
+
+
+def loadRegion(path):
+    with np.load(path) as data:
+        shape = tuple(int(n) for n in data['shape'])
+        bits = np.unpackbits(data['bits'], count=shape[0] * shape[1])
+    return (bits.reshape(shape) * 255).astype(np.uint8)
+
+
+class HandAssets:
+    """Decoded image, binary region and anatomical labels of one hand"""
+    def __init__(self, side):
+        self.side = side
+        self.image_path = os.path.join(handDirectory(side), 'Hand.jpg')
+        self.mask_path = os.path.join(handDirectory(side), 'binary_mask.jpg')
+        self.image = QImage()      # Decoded hand image (safe to create off the GUI thread)
+        self.region = None         # uint8 mask, 255 inside the hand
+        self.region_source = None  # File the region was loaded from
+        self.region_id = None      # Fingerprint of the region (see regionId)
+        self.labels = None         # HandLabels aligned with the region (None if not available)
+        self.error = None          # Why the region could not be loaded, if it could not
+        self.label_error = None    # Why the labels could not be loaded, if they could not
+        self._pixmap = None
+
+    def load(self):
+        self.image = QImage(self.image_path)
+
+        # Prefer the lossless precomputed region; fall back to thresholding the JPEG mask
+        region_path = os.path.join(handDirectory(self.side), REGION_FILE)
+        try:
+            if os.path.exists(region_path):
+                self.region = loadRegion(region_path)
+                self.region_source = region_path
+            else:
+                mask = cv2.imread(self.mask_path, cv2.IMREAD_GRAYSCALE)
+                if mask is None:
+                    self.error = f"Unable to load hand mask from {self.mask_path}"
+                else:
+                    self.region = regionFromJpegMask(mask)
+                    self.region_source = self.mask_path
+        except Exception as e:
+            self.error = f"Error loading the mask: {e}"
+            self.region = None
+        if self.region is not None:
+            self.region_id = regionId(self.region)
+
+            # Anatomical labels are optional: without them reports have no region summary
+            label_path = os.path.join(handDirectory(self.side), LABEL_FILE)
+            if os.path.exists(label_path):
+                try:
+                    self.labels = loadLabels(label_path).resized(self.region.shape)
+                except Exception as e:
+                    self.labels = None
+                    self.label_error = f"Error loading the hand labels: {e}"
+        return self
+
+    def pixmap(self):
+        """The hand image as a QPixmap (must be called on the GUI thread)"""
+        if self._pixmap is None:
+            self._pixmap = QPixmap.fromImage(self.image)
+        return self._pixmap
+
+
+class HandAssetRegistry:
+    """Process-wide cache of the hand assets, keyed by side ("right" or "left").
+
+    Each hand is decoded once. prewarm() starts decoding a hand on a background thread
+    (e.g. while the user is still on the selection screen); get() returns the cached
+    assets, waiting for a prewarm in progress instead of decoding the files again.
+    """
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loads = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="hand-assets")
+
+    def prewarm(self, side):
+        """Start decoding the assets of a hand in the background"""
+        self._load(side.lower(), background=True)
+
+    def get(self, side):
+        """Return the assets of a hand, decoding them now if they were not prewarmed"""
+        return self._load(side.lower(), background=False).result()
+
+    def _load(self, side, background):
+        with self._lock:
+            load = self._loads.get(side)
+            if load is None:
+                assets = HandAssets(side)
+                if background:
+                    load = self._executor.submit(assets.load)
+                else:
+                    load = _Done(assets.load())
+                self._loads[side] = load
+        return load
+
+
+class _Done:
+    """Already completed load, with the same result() interface as a Future"""
+    def __init__(self, value):
+        self.value = value
+
+    def result(self):
+        return self.value
+
+
+def buildRegionFile(side):
+    """Precompute the lossless region file of a hand from its JPEG mask"""
+    directory = os.path.join('PIC', side.capitalize())
+    mask = cv2.imread(os.path.join(directory, 'binary_mask.jpg'), cv2.IMREAD_GRAYSCALE)
+    if mask is None:
+        raise FileNotFoundError(f"No binary_mask.jpg in {directory}")
+    region = regionFromJpegMask(mask)
+    saveRegion(os.path.join(directory, REGION_FILE), region)
+    print(f"Saved {os.path.join(directory, REGION_FILE)} ({cv2.countNonZero(region)} hand pixels)")
+    return region
+
+
+def buildLabelFile(side, region):
+    """Segment a hand region into anatomical zones and save its label file"""
+    directory = os.path.join('PIC', side.capitalize())
+    hand_labels = segmentHand(region, side)
+    saveLabels(os.path.join(directory, LABEL_FILE), hand_labels)
+    print(f"Saved {os.path.join(directory, LABEL_FILE)} ({int(hand_labels.labels.max())} labels)")
+
+
+if __name__ == "__main__":
+    # Regenerate the lossless region files, and the label files, after changing a JPEG mask
+    for hand in sys.argv[1:] or ["right", "left"]:
+        buildLabelFile(hand, buildRegionFile(hand))
@@ -0,0 +1,202 @@
+import cv2
+import numpy as np
+
+# Anatomical label map shipped next to the hand region of each hand (see hand_assets.buildLabelFile)
+LABEL_FILE = 'hand_labels.npz'
+
+VIEWS = ('Palmar', 'Dorsal')
+FINGERS = ('Thumb', 'Index', 'Middle', 'Ring', 'Little')
+TERRITORIES = ('Median', 'Ulnar', 'Radial')
+
+# Phalanges of each finger, with their end as a fraction of the visible finger length from the tip
+PHALANGES = {
+    'Thumb': (('Distal', 0.45), ('Proximal', 1.0)),
+    'Finger': (('Distal', 0.28), ('Middle', 0.58), ('Proximal', 1.0))
+}
+
+# Fingers are the five largest parts a morphological opening of this radius (as a fraction
+# of the radius of the largest disc fitting in the palm) removes from a hand; smaller
+# leftovers go to the palm
+PALM_OPENING = 0.55
+
+# Connected parts of the hand region smaller than this fraction of the image are not hand views
+MIN_VIEW_AREA = 0.02
+
+
+def zoneNames():
+    """Zones of the label maps, in order: palm (or back of the hand) and phalanges, per view"""
+    names = []
+    for view in VIEWS:
+        names.append(f"{view}_{'Palm' if view == 'Palmar' else 'Dorsum'}")
+        for finger in FINGERS:
+            for phalanx, _ in PHALANGES['Thumb' if finger == 'Thumb' else 'Finger']:
+                names.append(f"{view}_{finger}_{phalanx}")
+    return names
+
+
+def territory(view, finger, phalanx, radial_side):
+    """Cutaneous nerve territory of a part of the hand (finger None for the palm or the back)"""
+    if finger == 'Little' or (finger in (None, 'Ring') and not radial_side):
+        return 'Ulnar'
+    if view == 'Palmar':
+        return 'Median'
+    # Back of the hand: radial nerve, except the distal phalanges of the lateral three and a half fingers
+    if finger in ('Index', 'Middle', 'Ring') and phalanx != 'Proximal':
+        return 'Median'
+    return 'Radial'
+
+
+class HandLabels:
+    """Integer label image aligned with a hand region, mapping each pixel to a zone and a nerve territory.
+
+    Label 0 is outside the hand; label n > 0 is zone label_zone[n] in territory
+    label_territory[n]. A selection is summarized in one bincount of the labels it covers.
+    """
+    def __init__(self, labels, zones, territories, label_zone, label_territory):
+        self.labels = labels                            # uint8 label image
+        self.zones = list(zones)                        # Zone names
+        self.territories = list(territories)            # Nerve territory names
+        self.label_zone = np.asarray(label_zone, dtype=np.intp)
+        self.label_territory = np.asarray(label_territory, dtype=np.intp)
+
+    @property
+    def shape(self):
+        return self.labels.shape
+
+    def resized(self, shape):
+        """The same labels at another (height, width)"""
+        if tuple(shape) == self.labels.shape:
+            return self
+        labels = cv2.resize(self.labels, (shape[1], shape[0]), interpolation=cv2.INTER_NEAREST)
+        return HandLabels(labels, self.zones, self.territories, self.label_zone, self.label_territory)
+
+    def summarize(self, mask, bbox=None):
+        """Selected pixels per zone and per nerve territory, as two {name: count} dicts"""
+        labels = self.labels
+        if bbox is not None:
+            x0, y0, x1, y1 = bbox
+            labels, mask = labels[y0:y1, x0:x1], mask[y0:y1, x0:x1]
+        counts = np.bincount(labels[mask > 0], minlength=len(self.label_zone))[1:len(self.label_zone)]
+        zone_counts = np.bincount(self.label_zone[1:], weights=counts, minlength=len(self.zones))
+        territory_counts = np.bincount(self.label_territory[1:], weights=counts, minlength=len(self.territories))
+        return ({name: int(count) for name, count in zip(self.zones, zone_counts)},
+                {name: int(count) for name, count in zip(self.territories, territory_counts)})
+
+
+def describeRegions(zone_pixels, territory_pixels, top=3):
+    """Short text of the main zones (at least 1% of the selection) and the nerve territories, in percent"""
+    total = sum(territory_pixels.values())
+    if not total:
+        return ""
+    zones = sorted((count, name) for name, count in zone_pixels.items() if 100 * count >= total)[::-1][:top]
+    zone_text = ", ".join(f"{name.replace('_', ' ').lower()} {100 * count / total:.0f}%".capitalize()
+                          for count, name in zones)
+    territory_text = ", ".join(f"{name} {100 * count / total:.0f}%"
+                               for name, count in territory_pixels.items() if count)
+    return f"{zone_text}\n{territory_text}"
+
+
+def saveLabels(path, hand_labels):
+    np.savez_compressed(path, labels=hand_labels.labels, zones=np.array(hand_labels.zones),
+                        territories=np.array(hand_labels.territories),
+                        label_zone=hand_labels.label_zone.astype(np.int16),
+                        label_territory=hand_labels.label_territory.astype(np.int16))
+
+
+def loadLabels(path):
+    with np.load(path) as data:
+        return HandLabels(data['labels'], [str(name) for name in data['zones']],
+                          [str(name) for name in data['territories']],
+                          data['label_zone'], data['label_territory'])
+
+
+def segmentHand(region, side):
+    """Label a binary hand region (one palmar and/or one dorsal view of the hand) automatically.
+
+    Fingers are separated from the palm by a morphological opening; the thumb is the
+    finger attached lowest, the others follow in order away from it. Phalanges are cut
+    at fixed fractions of the finger length, and the palm and the ring finger are split
+    along the axis of the ring finger into their radial and ulnar halves.
+    """
+    zones = zoneNames()
+    label_zone = [-1] + [zone for zone in range(len(zones)) for _ in TERRITORIES]
+    label_territory = [-1] + [territory for _ in zones for territory in range(len(TERRITORIES))]
+
+    def label(zone, territory_name):
+        return 1 + zones.index(zone) * len(TERRITORIES) + TERRITORIES.index(territory_name)
+
+    labels = np.zeros(region.shape, dtype=np.uint8)
+    count, components, stats, _ = cv2.connectedComponentsWithStats((region > 0).astype(np.uint8))
+    views = 0
+    for component in range(1, count):
+        if stats[component, cv2.CC_STAT_AREA] < MIN_VIEW_AREA * region.size:
+            continue
+        hand = (components == component).astype(np.uint8)
+        radius = int(cv2.distanceTransform(hand, cv2.DIST_L2, 5).max() * PALM_OPENING)
+        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * radius + 1, 2 * radius + 1))
+        palm = cv2.morphologyEx(hand, cv2.MORPH_OPEN, kernel)
+        finger_mask = cv2.morphologyEx(hand & ~palm & 1, cv2.MORPH_OPEN,
+                                       cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (9, 9)))
+        parts, part_labels, part_stats, centroids = cv2.connectedComponentsWithStats(finger_mask)
+        largest = np.argsort(part_stats[1:, cv2.CC_STAT_AREA])[::-1][:len(FINGERS)] + 1
+        if len(largest) < len(FINGERS):
+            raise ValueError(f"found {len(largest)} fingers in a view of the {side} hand, expected 5")
+
+        palm_ys, palm_xs = np.nonzero(palm)
+        palm_center = np.array([palm_xs.mean(), palm_ys.mean()])
+        # The thumb is attached lowest; the other fingers are ordered away from it
+        thumb = max(largest, key=lambda part: centroids[part][1])
+        others = sorted((part for part in largest if part != thumb),
+                        key=lambda part: abs(centroids[part][0] - centroids[thumb][0]))
+        fingers = dict(zip(FINGERS, [thumb] + others))
+        thumb_right = centroids[thumb][0] > palm_center[0]
+        view = 'Palmar' if thumb_right == (side.lower() == 'right') else 'Dorsal'
+
+        # Radial side of the axis of the ring finger (the side of the middle finger)
+        ring_ys, ring_xs = np.nonzero(part_labels == fingers['Ring'])
+        ring_center, ring_axis = fingerAxis(ring_xs, ring_ys, palm_center)
+
+        def radialSide(xs, ys):
+            side_of_axis = ring_axis[0] * (ys - ring_center[1]) - ring_axis[1] * (xs - ring_center[0])
+            middle = centroids[fingers['Middle']] - ring_center
+            return np.sign(side_of_axis) == np.sign(ring_axis[0] * middle[1] - ring_axis[1] * middle[0])
+
+        # Palm: the rest of the hand, including the leftovers of the opening
+        rest_ys, rest_xs = np.nonzero(hand & ~np.isin(part_labels, largest))
+        radial = radialSide(rest_xs, rest_ys)
+        palm_zone = f"{view}_{'Palm' if view == 'Palmar' else 'Dorsum'}"
+        for is_radial in (True, False):
+            selected = radial == is_radial
+            labels[rest_ys[selected], rest_xs[selected]] = label(
+                palm_zone, territory(view, None, None, is_radial))
+
+        for finger, part in fingers.items():
+            ys, xs = np.nonzero(part_labels == part)
+            center, axis = fingerAxis(xs, ys, palm_center)
+            position = (xs - center[0]) * axis[0] + (ys - center[1]) * axis[1]
+            from_tip = (position.max() - position) / max(position.max() - position.min(), 1)
+            radial = radialSide(xs, ys)
+            start = 0.0
+            for phalanx, end in PHALANGES['Thumb' if finger == 'Thumb' else 'Finger']:
+                in_phalanx = (from_tip >= start) & (from_tip <= end)
+                for is_radial in (True, False):
+                    selected = in_phalanx & (radial == is_radial)
+                    labels[ys[selected], xs[selected]] = label(
+                        f"{view}_{finger}_{phalanx}", territory(view, finger, phalanx, is_radial))
+                start = end
+        views += 1
+
+    if not views:
+        raise ValueError(f"no hand found in the region of the {side} hand")
+    return HandLabels(labels, zones, TERRITORIES, label_zone, label_territory)
+
+
+def fingerAxis(xs, ys, palm_center):
+    """Centroid and unit direction (towards the tip) of the main axis of a finger"""
+    points = np.column_stack([xs, ys]).astype(np.float64)
+    center = points.mean(axis=0)
+    _, _, vt = np.linalg.svd(points - center, full_matrices=False)
+    axis = vt[0]
+    if np.dot(center - palm_center, axis) < 0:
+        axis = -axis
+    return center, axis
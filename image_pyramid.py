@@ -0,0 +1,109 @@
+import math
+from collections import OrderedDict
+
+from PyQt5.QtCore import Qt, QRect
+from PyQt5.QtGui import QPainter, QPixmap
+
+from instrumentation import span
+
+# Side of the square tiles of every level, in pixels of that level
+TILE_SIZE = 256
+
+# Tiles kept in memory (about 256 KB each); enough for a few screens of a zoomed view
+MAX_CACHED_TILES = 192
+
+
+class ImagePyramid:
+    """Multi-resolution, tiled version of an image, for drawing it zoomed in or out.
+
+    Level 0 is the image itself and each next level halves it, down to a single tile.
+    A view is drawn from the level closest above its scale (so every level is shown
+    between half and full size, or magnified from level 0), and only the tiles of that
+    level it overlaps are converted to pixmaps, on first use; an LRU cache keeps the
+    recently drawn ones. The cost of a frame thus depends on the size of the view,
+    not on the resolution of the image.
+    """
+    def __init__(self, image, tile_size=TILE_SIZE, max_tiles=MAX_CACHED_TILES):
+        self.tile_size = tile_size
+        self.max_tiles = max_tiles
+        self._levels = [image]  # QImage of each level built so far
+        self._tiles = OrderedDict()  # (level, column, row) -> QPixmap
+
+        # Number of levels: halve until the image fits in one tile
+        longest = max(image.width(), image.height(), 1)
+        self.level_count = 1 + max(0, math.ceil(math.log2(longest / tile_size)))
+
+    @property
+    def width(self):
+        return self._levels[0].width()
+
+    @property
+    def height(self):
+        return self._levels[0].height()
+
+    def level(self, index):
+        """QImage of a level, built from the one above on first use"""
+        while len(self._levels) <= index:
+            above = self._levels[-1]
+            with span("render.pyramidLevel"):
+                self._levels.append(above.scaled(max(1, above.width() // 2), max(1, above.height() // 2),
+                                                 Qt.IgnoreAspectRatio, Qt.SmoothTransformation))
+        return self._levels[index]
+
+    def levelFor(self, scale):
+        """Index of the coarsest level that still has at least one pixel per displayed pixel"""
+        if scale >= 1:
+            return 0
+        return min(int(math.floor(math.log2(1 / scale))), self.level_count - 1)
+
+    def tile(self, level, column, row):
+        key = (level, column, row)
+        pixmap = self._tiles.get(key)
+        if pixmap is not None:
+            self._tiles.move_to_end(key)
+            return pixmap
+
+        size = self.tile_size
+        image = self.level(level)
+        # Tiles on the right and bottom edges are cut to the image
+        x, y = column * size, row * size
+        with span("render.pyramidTile"):
+            pixmap = QPixmap.fromImage(image.copy(x, y, min(size, image.width() - x), min(size, image.height() - y)))
+        self._tiles[key] = pixmap
+        while len(self._tiles) > self.max_tiles:
+            self._tiles.popitem(last=False)
+        return pixmap
+
+    def draw(self, painter, target, clip):
+        """Draw the image scaled to the target QRect (label coordinates), inside clip only"""
+        if target.isEmpty():
+            return
+        index = self.levelFor(target.width() / self.width)
+        image = self.level(index)
+        # Label pixels per pixel of the level
+        scale_x = target.width() / image.width()
+        scale_y = target.height() / image.height()
+
+        visible = clip.intersected(target)
+        if visible.isEmpty():
+            return
+        size = self.tile_size
+        columns = range(max(0, int((visible.left() - target.x()) / scale_x) // size),
+                        min(math.ceil(image.width() / size),
+                            int((visible.right() + 1 - target.x()) / scale_x) // size + 1))
+        rows = range(max(0, int((visible.top() - target.y()) / scale_y) // size),
+                     min(math.ceil(image.height() / size),
+                         int((visible.bottom() + 1 - target.y()) / scale_y) // size + 1))
+
+        painter.save()
+        painter.setRenderHint(QPainter.SmoothPixmapTransform)
+        for row in rows:
+            for column in columns:
+                pixmap = self.tile(index, column, row)
+                # Edges are rounded from the level coordinates, so neighbouring tiles always abut
+                x0 = target.x() + round(column * size * scale_x)
+                y0 = target.y() + round(row * size * scale_y)
+                x1 = target.x() + round((column * size + pixmap.width()) * scale_x)
+                y1 = target.y() + round((row * size + pixmap.height()) * scale_y)
+                painter.drawPixmap(QRect(x0, y0, x1 - x0, y1 - y0), pixmap, pixmap.rect())
+        painter.restore()
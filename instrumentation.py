@@ -0,0 +1,229 @@
+"""Diagnostics for the application: log messages, timed spans and trace export.
+
+Messages go through the "sensation" logger, whose level is set with the
+SENSATION_LOG_LEVEL environment variable (DEBUG, INFO, WARNING or ERROR; INFO by default).
+Messages from the hot paths (every lasso, every exported report...) are logged at DEBUG.
+
+Spans time the hot paths (mouse handling, lasso processing, rendering, scaling, export):
+
+    with span("selection.lasso"):
+        ...
+
+or, for a whole method, the @timed("render.paint") decorator. Spans are disabled unless
+SENSATION_INSTRUMENT=1 (or enable() is called); disabled spans cost one flag check.
+Enabled spans feed a rolling latency histogram per span name, and if SENSATION_TRACE
+names a file, also a Chrome/Perfetto trace written there by finish() (open it with
+chrome://tracing or https://ui.perfetto.dev).
+"""
+import atexit
+import bisect
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+log = logging.getLogger("sensation")
+
+# Latest samples kept per span name for the rolling histograms
+HISTOGRAM_WINDOW = 2048
+
+# Histogram bucket upper bounds in milliseconds (the last bucket is unbounded)
+HISTOGRAM_BOUNDS_MS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 33, 66, 125, 250, 500, 1000)
+
+# Trace events kept in memory (about 200 bytes each); the oldest are dropped beyond this
+MAX_TRACE_EVENTS = 500000
+
+_enabled = False
+_trace_path = None
+_trace_events = deque(maxlen=MAX_TRACE_EVENTS)
+_histograms = {}
+_histograms_lock = threading.Lock()
+_clock_origin = time.perf_counter()
+
+
+class LatencyHistogram:
+    """Rolling window of the latest durations of one span"""
+    def __init__(self, window=HISTOGRAM_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.count = 0  # Total number of samples, including those that left the window
+
+    def add(self, duration_ms):
+        self.samples.append(duration_ms)
+        self.count += 1
+
+    def buckets(self):
+        """Number of samples of the window in each bucket of HISTOGRAM_BOUNDS_MS"""
+        counts = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+        for duration_ms in list(self.samples):
+            counts[bisect.bisect_left(HISTOGRAM_BOUNDS_MS, duration_ms)] += 1
+        return dict(zip([f"<{bound}" for bound in HISTOGRAM_BOUNDS_MS] + ["more"], counts))
+
+    def percentile(self, q, samples=None):
+        """Latency (ms) below which q percent of the samples of the window fall"""
+        samples = samples if samples is not None else sorted(self.samples)
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(len(samples) * q / 100.0))]
+
+    def summary(self):
+        samples = sorted(self.samples)
+        return {
+            'count': self.count,
+            'p50_ms': round(self.percentile(50, samples), 3),
+            'p95_ms': round(self.percentile(95, samples), 3),
+            'p99_ms': round(self.percentile(99, samples), 3),
+            'max_ms': round(samples[-1], 3) if samples else 0.0
+        }
+
+
+class _Span:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.name, self.start, time.perf_counter())
+        return False
+
+
+class _NullSpan:
+    """Shared span used while instrumentation is disabled"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name):
+    """Context manager timing the enclosed block under the given name"""
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name)
+
+
+def timed(name):
+    """Decorator timing every call of a function as a span"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(name, start, time.perf_counter())
+        return wrapper
+    return decorator
+
+
+def record(name, start, end):
+    """Add a span measured with time.perf_counter() to its histogram and to the trace"""
+    duration_ms = (end - start) * 1000.0
+    histogram = _histograms.get(name)
+    if histogram is None:
+        with _histograms_lock:
+            histogram = _histograms.setdefault(name, LatencyHistogram())
+    histogram.add(duration_ms)
+
+    if _trace_path is not None:
+        _trace_events.append({
+            'name': name,
+            'cat': name.split('.', 1)[0],
+            'ph': 'X',
+            'ts': (start - _clock_origin) * 1e6,
+            'dur': duration_ms * 1000.0,
+            'pid': os.getpid(),
+            'tid': threading.get_ident()
+        })
+
+
+def isEnabled():
+    return _enabled
+
+
+def enable(trace_path=None):
+    """Start recording spans, and a trace to be written to trace_path if given"""
+    global _enabled, _trace_path
+    _enabled = True
+    if trace_path:
+        _trace_path = trace_path
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def histograms():
+    """Snapshot of the rolling histograms, keyed by span name"""
+    with _histograms_lock:
+        return dict(_histograms)
+
+
+def logSummary(level=logging.INFO):
+    """Log the latency percentiles of every span recorded so far"""
+    for name, histogram in sorted(histograms().items()):
+        summary = histogram.summary()
+        log.log(level, "%-28s n=%-6d p50 %.2f ms  p95 %.2f ms  p99 %.2f ms  max %.2f ms",
+                name, summary['count'], summary['p50_ms'], summary['p95_ms'],
+                summary['p99_ms'], summary['max_ms'])
+
+
+def writeTrace(path):
+    """Write the recorded spans as a Chrome/Perfetto trace (JSON object format)"""
+    events = list(_trace_events)
+    thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+    for tid in {event['tid'] for event in events}:
+        events.append({'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid,
+                       'args': {'name': thread_names.get(tid, str(tid))}})
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+    log.info("Trace with %d events written to %s", len(events), path)
+
+
+def finish():
+    """Log the span summary and write the trace, if instrumentation is enabled (runs at exit)"""
+    if not _enabled:
+        return
+    logSummary()
+    if _trace_path is not None:
+        try:
+            writeTrace(_trace_path)
+        except OSError as e:
+            log.error("Could not write the trace: %s", e)
+        _trace_events.clear()
+
+
+def configureFromEnvironment():
+    """Set up the logger and the spans from the SENSATION_* environment variables"""
+    if not log.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        log.addHandler(handler)
+        log.propagate = False
+    level = os.environ.get("SENSATION_LOG_LEVEL", "INFO").upper()
+    log.setLevel(getattr(logging, level, logging.INFO))
+
+    trace_path = os.environ.get("SENSATION_TRACE")
+    if os.environ.get("SENSATION_INSTRUMENT", "0") not in ("", "0") or trace_path:
+        enable(trace_path)
+        atexit.register(finish)
+
+
+configureFromEnvironment()
@@ -0,0 +1,35 @@
+import numpy as np
+
+
+class ParameterSweep:
+    """Planned levels of the modulated parameter, from start to stop (inclusive) by step.
+
+    The levels are rounded to the decimals of the parameter input, so they are exactly
+    the values it shows. A sweep goes down if stop is below start; a step that does not
+    divide the range ends at the last level before stop.
+    """
+    def __init__(self, start, stop, step, decimals=2):
+        if step <= 0:
+            raise ValueError("The sweep step must be greater than zero")
+        direction = 1 if stop >= start else -1
+        # The small tolerance keeps stop when the range is a multiple of the step
+        count = int(np.floor(abs(stop - start) / step + 1e-9)) + 1
+        self.levels = np.round(start + direction * step * np.arange(count), decimals)
+        self.index = 0  # Level of the next capture
+
+    def __len__(self):
+        return len(self.levels)
+
+    @property
+    def finished(self):
+        return self.index >= len(self.levels)
+
+    @property
+    def value(self):
+        """Value of the current level (None once the sweep is finished)"""
+        return None if self.finished else float(self.levels[self.index])
+
+    def advance(self):
+        """Move to the next level; return False if the sweep is finished"""
+        self.index += 1
+        return not self.finished
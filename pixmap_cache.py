@@ -0,0 +1,49 @@
+from collections import OrderedDict
+
+from PyQt5.QtCore import Qt
+
+from instrumentation import span
+
+
+class ScaledPixmapCache:
+    """Small LRU cache of scaled versions of the hand image, keyed by target size.
+
+    Fast (nearest neighbour) and smooth (bilinear) versions are cached separately, so an
+    interactive resize can use cheap fast scaling and switch to the smooth version once
+    resizing stops without recomputing sizes that were already seen.
+    """
+    def __init__(self, max_entries=6):
+        self.max_entries = max_entries
+        self.source = None
+        self._entries = OrderedDict()
+
+    def setSource(self, pixmap):
+        """Set the full resolution pixmap and drop every cached scaled version"""
+        self.source = pixmap
+        self._entries.clear()
+
+    def scaled(self, size, smooth=True):
+        """Return the source scaled to fit size (keeping aspect ratio), from the cache if possible"""
+        if self.source is None or self.source.isNull():
+            return None
+
+        key = (size.width(), size.height(), smooth)
+        pixmap = self._entries.get(key)
+        if pixmap is not None:
+            self._entries.move_to_end(key)
+            return pixmap
+
+        # A smooth version is always better than a fast one, so reuse it when available
+        if not smooth:
+            pixmap = self._entries.get((size.width(), size.height(), True))
+            if pixmap is not None:
+                return pixmap
+
+        transformation = Qt.SmoothTransformation if smooth else Qt.FastTransformation
+        with span("render.rescaleSmooth" if smooth else "render.rescaleFast"):
+            pixmap = self.source.scaled(size, Qt.KeepAspectRatio, transformation)
+
+        self._entries[key] = pixmap
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return pixmap
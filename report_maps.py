@@ -0,0 +1,153 @@
+import zlib
+
+import numpy as np
+
+
+class CompactMap:
+    """Report map stored as its bounding box offset plus bit-packed contents.
+
+    Selection maps are binary (0 or a single "selected" value, normally 255) and usually
+    cover a small part of the hand image, so only the bounding box of the selected pixels
+    is kept, packed to one bit per pixel. toArray() rebuilds the exact original frame.
+    """
+    __slots__ = ('shape', 'dtype', 'offset', 'box_shape', 'value', 'bits', 'dense')
+
+    def __init__(self, shape, dtype, offset, box_shape, value=0, bits=None, dense=None):
+        self.shape = shape            # (height, width) of the full frame
+        self.dtype = dtype            # dtype of the full frame
+        self.offset = offset          # (row, col) of the bounding box top-left corner
+        self.box_shape = box_shape    # (height, width) of the bounding box
+        self.value = value            # Value of the selected pixels when bit-packed
+        self.bits = bits              # Bit-packed bounding box contents
+        self.dense = dense            # Cropped contents, used only for non-binary maps
+
+    @classmethod
+    def fromArray(cls, array, bbox=None):
+        """Build a compact map from a full-frame 2D array.
+
+        bbox, if known, is the (x0, y0, x1, y1) bounding box of the non-zero pixels;
+        otherwise it is found by scanning the array.
+        """
+        array = np.asarray(array)
+        if bbox is not None:
+            c0, r0, c1, r1 = bbox
+        else:
+            rows = np.flatnonzero(array.any(axis=1))
+            if rows.size == 0:
+                return cls(array.shape, array.dtype, (0, 0), (0, 0))
+
+            cols = np.flatnonzero(array.any(axis=0))
+            r0, r1 = int(rows[0]), int(rows[-1]) + 1
+            c0, c1 = int(cols[0]), int(cols[-1]) + 1
+        box = array[r0:r1, c0:c1]
+
+        selected = box != 0
+        value = box[selected][0]
+        if np.all(box[selected] == value):
+            return cls(array.shape, array.dtype, (r0, c0), box.shape, value=value,
+                       bits=np.packbits(selected, axis=None))
+
+        # Not a binary map: keep the cropped values as they are
+        return cls(array.shape, array.dtype, (r0, c0), box.shape, dense=box.copy())
+
+    def toArray(self):
+        """Expand back to the full-frame array"""
+        array = np.zeros(self.shape, dtype=self.dtype)
+        height, width = self.box_shape
+        if height == 0 or width == 0:
+            return array
+
+        r0, c0 = self.offset
+        array[r0:r0 + height, c0:c0 + width] = self.box()
+        return array
+
+    def box(self):
+        """Expand only the bounding box contents (placed at offset in the full frame)"""
+        height, width = self.box_shape
+        if self.dense is not None:
+            return self.dense
+        box = np.zeros((height, width), dtype=self.dtype)
+        if height and width:
+            selected = np.unpackbits(self.bits, count=height * width).reshape(height, width)
+            box[selected.astype(bool)] = self.value
+        return box
+
+    @property
+    def nbytes(self):
+        """Memory used by the map contents"""
+        if self.dense is not None:
+            return self.dense.nbytes
+        return self.bits.nbytes if self.bits is not None else 0
+
+    @property
+    def bbox(self):
+        """Bounding box (x0, y0, x1, y1) of the selected pixels, or None if nothing is selected.
+
+        Same order as SelectionMask.bbox and the bbox argument of fromArray(); note that
+        offset and box_shape are (row, col) and (height, width).
+        """
+        height, width = self.box_shape
+        if height == 0 or width == 0:
+            return None
+        r0, c0 = self.offset
+        return (c0, r0, c0 + width, r0 + height)
+
+    def encode(self, level=6):
+        """Serialize the map to a JSON-compatible header and a zlib-compressed payload"""
+        header = {
+            'shape': list(self.shape),
+            'dtype': np.dtype(self.dtype).str,
+            'offset': list(self.offset),
+            'box_shape': list(self.box_shape),
+            'value': int(self.value),
+            'encoding': 'dense' if self.dense is not None else 'bits'
+        }
+        if self.dense is not None:
+            raw = np.ascontiguousarray(self.dense).tobytes()
+        else:
+            raw = self.bits.tobytes() if self.bits is not None else b''
+        return header, zlib.compress(raw, level)
+
+    @classmethod
+    def decode(cls, header, payload):
+        """Rebuild a map from the output of encode()"""
+        dtype = np.dtype(header['dtype'])
+        box_shape = tuple(header['box_shape'])
+        raw = zlib.decompress(payload)
+        bits = dense = None
+        if header['encoding'] == 'dense':
+            dense = np.frombuffer(raw, dtype=dtype).reshape(box_shape).copy()
+        elif box_shape[0] and box_shape[1]:
+            bits = np.frombuffer(raw, dtype=np.uint8).copy()
+        return cls(tuple(header['shape']), dtype, tuple(header['offset']), box_shape,
+                   value=dtype.type(header['value']), bits=bits, dense=dense)
+
+
+class LazyMap:
+    """Report map of a session file, read and compacted only when it is first used.
+
+    The frame shape is known without reading the map; any other use (toArray(), box(),
+    offset, encode(), ...) calls load() once and is answered by the resulting CompactMap.
+    """
+    __slots__ = ('shape', '_load', '_map')
+
+    def __init__(self, shape, load):
+        self.shape = tuple(shape)     # (height, width) of the full frame
+        self._load = load             # Returns the full-frame array
+        self._map = None
+
+    @property
+    def loaded(self):
+        return self._map is not None
+
+    def compact(self):
+        """The CompactMap of the map, reading it on first use"""
+        if self._map is None:
+            self._map = CompactMap.fromArray(self._load())
+            self._load = None
+        return self._map
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.compact(), name)
@@ -0,0 +1,180 @@
+import mmap
+import os
+import tempfile
+import weakref
+from collections.abc import MutableMapping
+
+import numpy as np
+
+from report_maps import CompactMap
+from session_files import headerText, sessionReport
+
+# Initial size of the map file; it doubles whenever it is full
+INITIAL_STORE_BYTES = 8 * 1024 * 1024
+
+
+class MemoryReportStore(dict):
+    """Reports of a session kept in memory: a dict of report key -> report dict.
+
+    Has the reserve() of the other stores so that callers need not tell them apart;
+    there is nothing to preallocate for a dict, so it does nothing.
+    """
+    def reserve(self, nbytes):
+        """Nothing to do: the dict grows as reports are added"""
+
+
+class MemmapReportStore(MutableMapping):
+    """Reports of a session, with their maps kept on disk in a memory-mapped file.
+
+    Behaves like the dict of reports (report key -> report dict with a CompactMap 'Map'),
+    but only the metadata of the reports stays in RAM. Each map is compressed and
+    appended to a preallocated file-backed array, which grows by doubling, and is read
+    back only when its report is requested, so resident memory does not grow with the
+    number of reports. The file is a scratch file: it is deleted by close().
+    """
+    def __init__(self, directory=None, initial_bytes=INITIAL_STORE_BYTES):
+        fd, self.path = tempfile.mkstemp(prefix="sensation_reports_", suffix=".maps", dir=directory)
+        self._file = os.fdopen(fd, 'r+b')
+        self._index = {}   # Report key -> (metadata, map header, offset, length)
+        self._end = 0      # End of the used part of the file
+        self._mmap = None
+        self._data = None
+        self._map(initial_bytes)
+        # Delete the file at exit if the store is never closed
+        self._finalizer = weakref.finalize(self, removeFile, self.path)
+
+    def _map(self, size):
+        """(Re)map the file with the given size"""
+        self._unmap()
+        self._file.truncate(size)
+        self._mmap = mmap.mmap(self._file.fileno(), size)
+        self._data = np.frombuffer(self._mmap, dtype=np.uint8)
+
+    def _unmap(self):
+        if self._mmap is not None:
+            self._data = None  # Release the buffer export before closing the map
+            self._mmap.close()
+            self._mmap = None
+
+    def _release(self, offset, length):
+        """Drop the pages of a range from this process; their data stays in the file"""
+        if hasattr(mmap, 'MADV_DONTNEED'):
+            start = offset - offset % mmap.PAGESIZE
+            end = min(offset + length, len(self._mmap))
+            if end > start:
+                self._mmap.madvise(mmap.MADV_DONTNEED, start, end - start)
+
+    def reserve(self, nbytes):
+        """Make room for nbytes more of map data now, so that adding the reports that
+        use it never has to grow and remap the file"""
+        if self._end + nbytes > self._data.size:
+            size = self._data.size
+            while self._end + nbytes > size:
+                size *= 2
+            self._map(size)
+
+    def __setitem__(self, key, report):
+        header, payload = report['Map'].encode(level=1)
+        self.reserve(len(payload))
+
+        offset = self._end
+        self._data[offset:offset + len(payload)] = np.frombuffer(payload, dtype=np.uint8)
+        self._release(offset, len(payload))
+        self._end += len(payload)
+
+        metadata = {name: value for name, value in report.items() if name != 'Map'}
+        self._index[key] = (metadata, header, offset, len(payload))
+
+    def __getitem__(self, key):
+        metadata, header, offset, length = self._index[key]
+        payload = self._data[offset:offset + length].tobytes()
+        self._release(offset, length)
+        report = dict(metadata)
+        report['Map'] = CompactMap.decode(header, payload)
+        return report
+
+    def __delitem__(self, key):
+        # The space of the map is not reused: reports are rarely deleted
+        del self._index[key]
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    @property
+    def nbytes(self):
+        """Bytes of map data written to the file"""
+        return self._end
+
+    def close(self):
+        """Unmap and delete the map file"""
+        if self._file is None:
+            return
+        self._unmap()
+        self._file.close()
+        self._file = None
+        self._index = {}
+        self._finalizer()
+
+
+class SessionFileReportStore(MutableMapping):
+    """Reports of a session resumed from a session file, followed by the reports added to it.
+
+    Behaves like the dict of reports. The reports of the file are read from it only when
+    they are requested, and their maps only when they are used (see LazyMap), so opening
+    even a large session costs little more than listing its reports. Added reports go to
+    store (a MemoryReportStore or a MemmapReportStore). close() closes the file and the store.
+    """
+    def __init__(self, reader, store=None):
+        self.reader = reader
+        self.hand = headerText(reader.header['Hand']).lower()
+        self._file_keys = {str(key): key for key in reader.reportKeys()}  # Report key -> key in the file
+        self._read = {}  # Reports already read from the file
+        self._store = store if store is not None else MemoryReportStore()
+
+    def __setitem__(self, key, report):
+        self._file_keys.pop(key, None)
+        self._read.pop(key, None)
+        self._store[key] = report
+
+    def __getitem__(self, key):
+        if key in self._store:
+            return self._store[key]
+        if key not in self._read:
+            self._read[key] = sessionReport(self.reader, self._file_keys[key], self.hand)
+        return self._read[key]
+
+    def __delitem__(self, key):
+        if key in self._file_keys:
+            del self._file_keys[key]
+            self._read.pop(key, None)
+        else:
+            del self._store[key]
+
+    def __iter__(self):
+        yield from self._file_keys
+        yield from self._store
+
+    def __len__(self):
+        return len(self._file_keys) + len(self._store)
+
+    def reserve(self, nbytes):
+        """Make room for added reports in the store (see MemmapReportStore.reserve)"""
+        self._store.reserve(nbytes)
+
+    def close(self):
+        """Close the session file and the store of the added reports"""
+        self.reader.close()
+        self._file_keys = {}
+        self._read = {}
+        if hasattr(self._store, 'close'):
+            self._store.close()
+
+
+def removeFile(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,179 @@
+import csv
+import os
+import re
+
+import numpy as np
+
+from selection_mask import boxSums
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional: without it the summary table is written as CSV
+    pa = pq = None
+
+# Typed columns of every report, in order; the one-hot sensation columns follow them
+COLUMNS = (
+    ('Report', np.int32),
+    ('ModulatedParameter', np.float64),
+    ('Naturalness', np.int8),
+    ('Painfulness', np.int8),
+    ('UnderElectrodeSensation', np.int8),
+    ('Area', np.int64),          # Selected pixels of the map
+    ('CentroidX', np.float64),   # Centroid of the selected pixels, in map pixels (NaN if none)
+    ('CentroidY', np.float64),
+)
+TEXT_COLUMNS = ('OtherSensation', 'AdditionalDescription')
+
+# Custom sensations are saved as "Other: <text>"; they share the Other column
+OTHER_PREFIX = "Other: "
+
+# Rows allocated at first; the columns double whenever they are full
+INITIAL_ROWS = 64
+
+# Rows converted at a time while writing (the row group size of Parquet files)
+WRITE_BLOCK_ROWS = 4096
+
+
+def sensationColumn(sensation):
+    """Name of the one-hot column of a sensation, e.g. Sensation_Urge_to_move"""
+    return "Sensation_" + "_".join(re.findall(r'\w+', sensation))
+
+
+def mapStats(report_map):
+    """Area and centroid (x, y) of a report map (CompactMap, LazyMap or array), from its bounding box only"""
+    if hasattr(report_map, 'box'):
+        box = report_map.box()
+        y0, x0 = report_map.offset
+    else:
+        box = np.asarray(report_map)
+        y0 = x0 = 0
+    if not box.size:
+        return 0, None
+    m00, m10, m01 = boxSums((box != 0).view(np.uint8), x0, y0)
+    area = int(round(m00))
+    return area, ((m10 / m00, m01 / m00) if area else None)
+
+
+def summaryFormat():
+    """Format of the summary table: Parquet if pyarrow is installed, unless
+    SENSATION_SUMMARY_FORMAT=csv; CSV otherwise"""
+    if pq is None or os.environ.get("SENSATION_SUMMARY_FORMAT", "").lower() == "csv":
+        return "csv"
+    return "parquet"
+
+
+def summaryPath(filename, summary_format=None):
+    """Path of the summary table written next to a session file"""
+    return f"{os.path.splitext(filename)[0]}_summary.{summary_format or summaryFormat()}"
+
+
+class ReportTable:
+    """Scalar fields of the reports of a session, one typed array per column.
+
+    Each sensation is a one-hot bool column (the given sensation types first, any other
+    added when it is first reported); the text of custom sensations is kept in
+    OtherSensation. The area and the centroid of the map are derived when a report is
+    added, so the table can be written and queried without the maps. Rows stay in the
+    order they were added; columns() and the writers sort them by report number.
+    """
+    def __init__(self, sensations=()):
+        self._count = 0
+        self._capacity = INITIAL_ROWS
+        self._columns = {name: np.zeros(self._capacity, dtype=dtype) for name, dtype in COLUMNS}
+        self._sensations = {}  # Column name -> bool array
+        self._text = {name: [] for name in TEXT_COLUMNS}
+        self._rows = {}  # Report key -> row
+        for sensation in list(sensations) + ['Other']:
+            self._sensationArray(sensation)
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, key):
+        return str(key) in self._rows
+
+    def _sensationArray(self, sensation):
+        name = sensationColumn(sensation)
+        if name not in self._sensations:
+            self._sensations[name] = np.zeros(self._capacity, dtype=bool)
+        return self._sensations[name]
+
+    def _grow(self):
+        self._capacity *= 2
+        for arrays in (self._columns, self._sensations):
+            for name, array in arrays.items():
+                arrays[name] = np.zeros(self._capacity, dtype=array.dtype)
+                arrays[name][:self._count] = array[:self._count]
+
+    def add(self, key, report, area=None, centroid=None):
+        """Add (or replace) the row of a report.
+
+        area and centroid, if known (e.g. from the SelectionMask the report was saved
+        from), save reading the map; otherwise they are computed from report['Map'].
+        """
+        if area is None:
+            area, centroid = mapStats(report['Map'])
+        key = str(key)
+        row = self._rows.get(key)
+        if row is None:
+            if self._count == self._capacity:
+                self._grow()
+            row = self._rows[key] = self._count
+            self._count += 1
+            for values in self._text.values():
+                values.append('')
+
+        columns = self._columns
+        columns['Report'][row] = int(key)
+        columns['ModulatedParameter'][row] = report['ModulatedParameter']
+        for name in ('Naturalness', 'Painfulness', 'UnderElectrodeSensation'):
+            columns[name][row] = report[name]
+        columns['Area'][row] = area
+        columns['CentroidX'][row], columns['CentroidY'][row] = centroid if centroid is not None else (np.nan, np.nan)
+
+        for array in self._sensations.values():
+            array[row] = False
+        other = []
+        for sensation in report['Sensation']:
+            if sensation.startswith(OTHER_PREFIX):
+                other.append(sensation[len(OTHER_PREFIX):])
+                sensation = 'Other'
+            self._sensationArray(sensation)[row] = True
+        self._text['OtherSensation'][row] = "; ".join(other)
+        self._text['AdditionalDescription'][row] = report.get('AdditionalDescription') or ''
+
+    def columns(self):
+        """{column name: array} of the table, sorted by report number"""
+        order = np.argsort(self._columns['Report'][:self._count], kind='stable')
+        columns = {name: array[:self._count][order] for name, array in self._columns.items()}
+        columns.update((name, array[:self._count][order]) for name, array in self._sensations.items())
+        columns.update((name, np.array(values, dtype=object)[order]) for name, values in self._text.items())
+        return columns
+
+    def write(self, path):
+        """Write the table as Parquet or CSV, depending on the extension of path"""
+        if path.endswith('.parquet'):
+            self.writeParquet(path)
+        else:
+            self.writeCsv(path)
+
+    def writeCsv(self, path):
+        """Write the table as CSV (one-hot columns as 0/1), a block of rows at a time"""
+        columns = self.columns()
+        with open(path, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(columns)
+            for start in range(0, self._count, WRITE_BLOCK_ROWS):
+                block = [array[start:start + WRITE_BLOCK_ROWS] for array in columns.values()]
+                writer.writerows(zip(*(array.view(np.uint8).tolist() if array.dtype == bool else array.tolist()
+                                       for array in block)))
+
+    def writeParquet(self, path):
+        """Write the table as a Parquet file (requires pyarrow), in row groups of WRITE_BLOCK_ROWS"""
+        if pq is None:
+            raise RuntimeError("Writing Parquet files requires pyarrow")
+        columns = self.columns()
+        table = pa.table({name: pa.array(array.tolist() if array.dtype == object else array)
+                          for name, array in columns.items()})
+        pq.write_table(table, path, row_group_size=WRITE_BLOCK_ROWS)
@@ -0,0 +1,87 @@
+import zlib
+
+import numpy as np
+
+# Oldest edits are forgotten beyond this many undo levels
+MAX_UNDO_LEVELS = 500
+
+
+class SelectionEdit:
+    """One edit of the selection mask, stored as a compressed XOR delta of its bounding box.
+
+    Applying the delta to the mask toggles exactly the pixels the edit changed, so the
+    same operation undoes and redoes it. Only the box is kept, bit-packed and compressed,
+    so an edit costs memory in proportion to the area it touched, not to the image.
+    """
+    __slots__ = ('bbox', 'box_shape', 'delta', 'removed_strokes', 'added_strokes')
+
+    def __init__(self, bbox, before, after, removed_strokes=(), added_strokes=()):
+        self.bbox = bbox                    # (x0, y0, x1, y1) of the changed region
+        self.box_shape = before.shape
+        changed = np.not_equal(before, after)
+        self.delta = zlib.compress(np.packbits(changed, axis=None).tobytes(), 1)
+        self.removed_strokes = list(removed_strokes)  # Strokes the edit removed from the selection
+        self.added_strokes = list(added_strokes)      # Strokes the edit added to the selection
+
+    def apply(self, selection):
+        """Toggle the changed pixels of a SelectionMask in place (undo or redo the edit)"""
+        x0, y0, x1, y1 = self.bbox
+        height, width = self.box_shape
+        changed = np.unpackbits(np.frombuffer(zlib.decompress(self.delta), dtype=np.uint8),
+                                count=height * width).reshape(height, width)
+        roi = selection.mask[y0:y1, x0:x1]
+        before = roi.copy()
+        np.bitwise_xor(roi, changed * np.uint8(255), out=roi)
+        selection.regionChanged(self.bbox, before)
+
+    @property
+    def nbytes(self):
+        return len(self.delta)
+
+
+class SelectionHistory:
+    """Undo/redo stacks of the edits made to the selection since it was last saved"""
+    def __init__(self, max_levels=MAX_UNDO_LEVELS):
+        self.max_levels = max_levels
+        self._undo = []
+        self._redo = []
+
+    def record(self, edit):
+        """Add a new edit; it discards the edits that could be redone"""
+        self._undo.append(edit)
+        if len(self._undo) > self.max_levels:
+            del self._undo[0]
+        self._redo.clear()
+
+    def canUndo(self):
+        return bool(self._undo)
+
+    def canRedo(self):
+        return bool(self._redo)
+
+    def undo(self, selection):
+        """Revert the last edit on a SelectionMask and return it (None if there is nothing to undo)"""
+        if not self._undo:
+            return None
+        edit = self._undo.pop()
+        edit.apply(selection)
+        self._redo.append(edit)
+        return edit
+
+    def redo(self, selection):
+        """Reapply the last undone edit on a SelectionMask and return it (None if there is nothing to redo)"""
+        if not self._redo:
+            return None
+        edit = self._redo.pop()
+        edit.apply(selection)
+        self._undo.append(edit)
+        return edit
+
+    def clear(self):
+        self._undo.clear()
+        self._redo.clear()
+
+    @property
+    def nbytes(self):
+        """Memory used by the stored deltas"""
+        return sum(edit.nbytes for edit in self._undo + self._redo)
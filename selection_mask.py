@@ -0,0 +1,115 @@
+import cv2
+import numpy as np
+
+
+class SelectionMask:
+    """Selected hand area, stored as a uint8 mask (255 = selected) in original image coordinates.
+
+    Area, centroid, bounding box and contours are computed lazily with OpenCV and cached
+    until the mask is modified; call changed() after editing the mask in place, or
+    regionChanged() when the edit was confined to a bounding box.
+    """
+    def __init__(self, mask):
+        self.mask = mask
+        self.changed()
+
+    @classmethod
+    def empty(cls, height, width):
+        selection = cls(np.zeros((height, width), dtype=np.uint8))
+        selection._sums = (0.0, 0.0, 0.0)
+        return selection
+
+    def changed(self):
+        """Drop the cached measurements after the mask has been modified"""
+        self._sums = None         # (m00, m10, m01) moments, enough for the area and the centroid
+        self._moments = None
+        self._bbox = None
+        self._contours = None
+
+    def regionChanged(self, bbox, before):
+        """Update the cached measurements after the pixels inside bbox changed from before.
+
+        Area and centroid are updated from the moments of the box alone, so an edit costs
+        in proportion to its bounding box. The bounding box of the selection is kept when
+        the edit only added pixels and recomputed lazily otherwise.
+        """
+        x0, y0, x1, y1 = bbox
+        after = self.mask[y0:y1, x0:x1]
+        if self._sums is not None:
+            old = boxSums(before, x0, y0)
+            new = boxSums(after, x0, y0)
+            self._sums = tuple(total - o + n for total, o, n in zip(self._sums, old, new))
+
+        if self._bbox is not None and not cv2.countNonZero(cv2.bitwise_and(before, cv2.bitwise_not(after))):
+            x, y, w, h = cv2.boundingRect(after)
+            if w and h:
+                bx0, by0, bx1, by1 = self._bbox
+                self._bbox = (min(bx0, x0 + x), min(by0, y0 + y), max(bx1, x0 + x + w), max(by1, y0 + y + h))
+        else:
+            self._bbox = None
+        self._moments = None
+        self._contours = None
+
+    @property
+    def shape(self):
+        return self.mask.shape
+
+    @property
+    def area(self):
+        """Number of selected pixels"""
+        return int(round(self.sums[0]))
+
+    def __bool__(self):
+        return self.area > 0
+
+    @property
+    def sums(self):
+        """Zeroth and first order moments (m00, m10, m01) of the selected pixels"""
+        if self._sums is None:
+            m = self.moments
+            self._sums = (m['m00'], m['m10'], m['m01'])
+        return self._sums
+
+    @property
+    def moments(self):
+        if self._moments is None:
+            self._moments = cv2.moments(self.mask, binaryImage=True)
+        return self._moments
+
+    @property
+    def centroid(self):
+        """Centroid (x, y) in image pixels, or None if nothing is selected"""
+        m00, m10, m01 = self.sums
+        if round(m00) == 0:
+            return None
+        return (m10 / m00, m01 / m00)
+
+    @property
+    def normalizedCentroid(self):
+        """Centroid (x, y) normalized to the image size (0-1), or None if nothing is selected"""
+        centroid = self.centroid
+        if centroid is None:
+            return None
+        height, width = self.mask.shape
+        return (centroid[0] / width, centroid[1] / height)
+
+    @property
+    def bbox(self):
+        """Bounding box (x0, y0, x1, y1) of the selected pixels, or None if nothing is selected"""
+        if self._bbox is None and self.area > 0:
+            x, y, w, h = cv2.boundingRect(self.mask)
+            self._bbox = (x, y, x + w, y + h)
+        return self._bbox
+
+    @property
+    def contours(self):
+        """Outer contours of the selected regions, as returned by cv2.findContours"""
+        if self._contours is None:
+            self._contours, _ = cv2.findContours(self.mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        return self._contours
+
+
+def boxSums(box, x0, y0):
+    """Moments (m00, m10, m01) of a box of a mask, in the coordinates of the whole mask"""
+    m = cv2.moments(box, binaryImage=True)
+    return (m['m00'], m['m10'] + x0 * m['m00'], m['m01'] + y0 * m['m00'])
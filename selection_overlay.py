@@ -0,0 +1,361 @@
+import cv2
+import numpy as np
+from PyQt5.QtCore import Qt, QPoint
+from PyQt5.QtGui import QImage, QPainter, QColor, QPolygon
+
+from instrumentation import timed
+
+
+# Number of overlapping reports at which the heatmap reaches its most intense color, and
+# opacity of the heatmap for one report and from that number on
+HEATMAP_SATURATION = 10
+HEATMAP_MIN_ALPHA = 70
+HEATMAP_MAX_ALPHA = 170
+
+# Heatmap color of the sensations not in the list given to HeatmapOverlay (e.g. "Other: ...")
+OTHER_SENSATION_COLOR = (128, 128, 128)
+
+# When zoomed in, the overlays are rendered only around the visible part of the display,
+# in whole tiles of this many display pixels plus one tile of margin, so panning within
+# that area does not render them again
+OVERLAY_TILE = 256
+
+
+def displayRect(bbox, source_shape, display_size):
+    """Display pixels (dx0, dy0, dx1, dy1) covering bbox (x0, y0, x1, y1) of a source image
+    scaled to display_size (width, height), or None if the box is empty"""
+    source_height, source_width = source_shape
+    width, height = display_size
+    x_scale, y_scale = width / source_width, height / source_height
+    x0, y0, x1, y1 = bbox
+    dx0, dx1 = max(int(x0 * x_scale) - 1, 0), min(int(np.ceil(x1 * x_scale)) + 1, width)
+    dy0, dy1 = max(int(y0 * y_scale) - 1, 0), min(int(np.ceil(y1 * y_scale)) + 1, height)
+    if dx1 <= dx0 or dy1 <= dy0:
+        return None
+    return (dx0, dy0, dx1, dy1)
+
+
+def tileArea(visible, display_size, tile=OVERLAY_TILE):
+    """Display rect (dx0, dy0, dx1, dy1) to render for a visible display rect: the whole
+    display if visible is None, else the tiles covering it plus one tile of margin"""
+    width, height = display_size
+    if visible is None:
+        return (0, 0, width, height)
+    vx0, vy0, vx1, vy1 = visible
+    return (max((vx0 // tile - 1) * tile, 0), max((vy0 // tile - 1) * tile, 0),
+            min((-(-vx1 // tile) + 1) * tile, width), min((-(-vy1 // tile) + 1) * tile, height))
+
+
+def covers(area, visible, display_size):
+    """Whether a rendered display rect contains the visible rect (the whole display if None)"""
+    vx0, vy0, vx1, vy1 = visible if visible is not None else (0, 0) + tuple(display_size)
+    ax0, ay0, ax1, ay1 = area
+    return ax0 <= vx0 and ay0 <= vy0 and vx1 <= ax1 and vy1 <= ay1
+
+
+def intersection(rect, area):
+    """Intersection of two display rects (dx0, dy0, dx1, dy1), or None if it is empty"""
+    x0, y0 = max(rect[0], area[0]), max(rect[1], area[1])
+    x1, y1 = min(rect[2], area[2]), min(rect[3], area[3])
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return (x0, y0, x1, y1)
+
+
+def sourceIndices(rect, source_shape, display_size):
+    """Rows and columns of the source pixels shown in a display rect, as cv2.resize with
+    INTER_NEAREST picks them (so a part of an overlay matches a full rebuild exactly)"""
+    source_height, source_width = source_shape
+    width, height = display_size
+    dx0, dy0, dx1, dy1 = rect
+    xs = np.floor(np.arange(dx0, dx1) * (1 / (width / source_width))).astype(np.intp)
+    ys = np.floor(np.arange(dy0, dy1) * (1 / (height / source_height))).astype(np.intp)
+    return np.minimum(ys, source_height - 1), np.minimum(xs, source_width - 1)
+
+
+def gather(source, ys, xs):
+    """source[ys[:, None], xs], one axis at a time (much faster than a 2D fancy index)"""
+    return source.take(ys, axis=0).take(xs, axis=1)
+
+
+def rgbaPixels(lut, index):
+    """Look up a 2D index in a table of RGBA colors stored one uint32 per color,
+    returning (height, width, 4) uint8 pixels"""
+    return lut.take(index).view(np.uint8).reshape(index.shape + (4,))
+
+
+class SelectionOverlay:
+    """Semi-transparent overlay of the selected hand area, rendered from the intersection mask.
+
+    The overlay is built once as a single RGBA QImage at the current display size and
+    cached, so drawing it costs one drawImage call regardless of how large the selection is.
+    It is only rebuilt when the display size changes or a new mask is set; edits of the
+    mask confined to a bounding box only update that part of the cached overlay. When
+    zoomed in, only the area around the visible part of the display is built (see view()).
+    """
+    def __init__(self, color=(0, 153, 255, 90)):
+        self.color = color
+        self.mask = None          # Source mask in original image coordinates (uint8, 0/255)
+        self._image = None        # Cached QImage at display size
+        self._buffer = None       # NumPy buffer backing the cached QImage
+        self._size = None         # (width, height) of the display
+        self._area = None         # Display rect (dx0, dy0, dx1, dy1) covered by the cached QImage
+
+        # Lookup table mapping mask values (0 or 1) to RGBA pixels, one uint32 per pixel
+        self._lut = np.array([(0, 0, 0, 0), color], dtype=np.uint8).view(np.uint32).ravel()
+
+    def setMask(self, mask):
+        """Set a new source mask and invalidate the cached overlay"""
+        if isinstance(mask, np.ndarray) and mask.size > 0:
+            self.mask = mask
+        else:
+            self.mask = None
+        self.invalidate()
+
+    def clear(self):
+        """Remove the mask and the cached overlay"""
+        self.setMask(None)
+
+    def invalidate(self):
+        """Drop the cached overlay so it is rebuilt on the next request"""
+        self._image = None
+        self._buffer = None
+        self._size = None
+        self._area = None
+
+    @timed("render.overlayUpdate")
+    def updateRegion(self, bbox):
+        """Refresh the part of the cached overlay covering bbox (x0, y0, x1, y1) of the mask.
+
+        Returns the refreshed (x, y, width, height) rectangle in display coordinates, or
+        None if there was no cached overlay (it is built in full on the next request).
+        """
+        if self.mask is None or self._image is None:
+            return None
+        rect = displayRect(bbox, self.mask.shape, self._size)
+        if rect is None or intersection(rect, self._area) is None:
+            return None
+        rect = intersection(rect, self._area)
+        dx0, dy0, dx1, dy1 = rect
+        ys, xs = sourceIndices(rect, self.mask.shape, self._size)
+        scaled = gather(self.mask, ys, xs)
+        # The cached QImage shares this buffer, so it is updated in place
+        ax0, ay0 = self._area[:2]
+        self._buffer[dy0 - ay0:dy1 - ay0, dx0 - ax0:dx1 - ax0] = rgbaPixels(self._lut, (scaled > 0).view(np.uint8))
+        return (dx0, dy0, dx1 - dx0, dy1 - dy0)
+
+    def isEmpty(self):
+        return self.mask is None
+
+    def view(self, width, height, visible=None):
+        """Return the overlay for a display of the given size as (QImage, (x, y)): an image
+        covering at least the visible display rect (dx0, dy0, dx1, dy1), or the whole display
+        if None, and its position in the display. (None, None) if there is no mask."""
+        if self.mask is None or width <= 0 or height <= 0:
+            return None, None
+
+        if (self._image is None or self._size != (width, height)
+                or not covers(self._area, visible, (width, height))):
+            self._build(width, height, tileArea(visible, (width, height)))
+
+        return self._image, self._area[:2]
+
+    @timed("render.overlayBuild")
+    def _build(self, width, height, area):
+        """Rasterize the mask to display size and convert it to RGBA in one vectorized step"""
+        if area == (0, 0, width, height):
+            # Nearest neighbour keeps the mask binary while downscaling to display size
+            scaled = cv2.resize(self.mask, (width, height), interpolation=cv2.INTER_NEAREST)
+        else:
+            ys, xs = sourceIndices(area, self.mask.shape, (width, height))
+            scaled = gather(self.mask, ys, xs)
+        self._buffer = rgbaPixels(self._lut, (scaled > 0).view(np.uint8))
+
+        # The QImage shares memory with self._buffer, which is kept alive alongside it
+        area_height, area_width = scaled.shape
+        self._image = QImage(self._buffer.data, area_width, area_height, area_width * 4,
+                             QImage.Format_RGBA8888)
+        self._size = (width, height)
+        self._area = area
+
+
+class HeatmapOverlay:
+    """Cumulative coverage of the saved reports, rendered as a cached RGBA overlay.
+
+    Reports are added to running uint16 counters (all reports, and one per sensation type)
+    inside their bounding box only, and the cached overlay is refreshed in the same box,
+    so saving a report costs the same however many reports the session has, and drawing
+    costs one drawImage call. Pixels are colored by the number of reports covering them
+    ('coverage' mode) or by the sensation reported there most often ('sensation' mode).
+    """
+    MODES = ('coverage', 'sensation')
+
+    def __init__(self, sensation_types=()):
+        self.mode = None          # None (hidden), 'coverage' or 'sensation'
+        self.counts = None        # Reports covering each pixel (uint16, original image size)
+        self.sensation_counts = {}  # Sensation -> reports of that sensation covering each pixel
+        self._image = None
+        self._buffer = None
+        self._size = None         # (width, height) of the display
+        self._area = None         # Display rect covered by the cached QImage (see SelectionOverlay)
+
+        # Coverage colors (JET, from one report to HEATMAP_SATURATION) and opacity by count
+        levels = np.linspace(0, 255, HEATMAP_SATURATION + 1).astype(np.uint8)
+        jet = cv2.applyColorMap(levels.reshape(-1, 1), cv2.COLORMAP_JET).reshape(-1, 3)[:, ::-1]
+        self._alpha = np.linspace(HEATMAP_MIN_ALPHA, HEATMAP_MAX_ALPHA, HEATMAP_SATURATION + 1).astype(np.uint8)
+        self._alpha[0] = 0
+        self._coverage_lut = np.column_stack([jet, self._alpha]).astype(np.uint8).view(np.uint32).ravel()
+        self.setSensationTypes(sensation_types)
+
+    def setSensationTypes(self, sensation_types):
+        """Assign a distinct color to each known sensation type"""
+        self.sensation_types = list(sensation_types)
+        hues = np.linspace(0, 180, len(self.sensation_types), endpoint=False).astype(np.uint8)
+        hsv = np.column_stack([hues, np.full_like(hues, 220), np.full_like(hues, 230)]).reshape(-1, 1, 3)
+        colors = cv2.cvtColor(hsv, cv2.COLOR_HSV2RGB).reshape(-1, 3) if len(hues) else np.zeros((0, 3), np.uint8)
+        self.sensation_colors = {sensation: tuple(int(c) for c in color)
+                                 for sensation, color in zip(self.sensation_types, colors)}
+        self.invalidate()
+
+    def colorOf(self, sensation):
+        return self.sensation_colors.get(sensation, OTHER_SENSATION_COLOR)
+
+    def reset(self):
+        """Forget all the reports"""
+        self.counts = None
+        self.sensation_counts = {}
+        self.invalidate()
+
+    def setMode(self, mode):
+        self.mode = mode if mode in self.MODES else None
+        self.invalidate()
+
+    def invalidate(self):
+        self._image = None
+        self._buffer = None
+        self._size = None
+        self._area = None
+
+    def isEmpty(self):
+        return self.counts is None
+
+    @timed("render.heatmapAdd")
+    def addReport(self, box, bbox, shape, sensations):
+        """Add a report whose map is box (non-zero = selected) at bbox (x0, y0, x1, y1) of a
+        frame of the given shape; returns False if the shape does not match the earlier reports"""
+        if self.counts is None:
+            self.counts = np.zeros(shape, dtype=np.uint16)
+        elif self.counts.shape != tuple(shape):
+            return False
+        x0, y0, x1, y1 = bbox
+        selected = np.asarray(box) != 0
+        np.add(self.counts[y0:y1, x0:x1], selected, out=self.counts[y0:y1, x0:x1], casting='unsafe')
+
+        # Sensations outside the known types (e.g. "Other: ...") share one counter
+        for sensation in {s if s in self.sensation_colors else 'Other' for s in sensations}:
+            counts = self.sensation_counts.get(sensation)
+            if counts is None:
+                counts = self.sensation_counts[sensation] = np.zeros(shape, dtype=np.uint16)
+            np.add(counts[y0:y1, x0:x1], selected, out=counts[y0:y1, x0:x1], casting='unsafe')
+
+        if self._image is not None:
+            rect = displayRect(bbox, self.counts.shape, self._size)
+            if rect is not None and intersection(rect, self._area) is not None:
+                self._render(intersection(rect, self._area))
+        return True
+
+    def view(self, width, height, visible=None):
+        """Return the heatmap around the visible display rect as (QImage, (x, y)), like
+        SelectionOverlay.view(); (None, None) if hidden or empty"""
+        if self.mode is None or self.counts is None or width <= 0 or height <= 0:
+            return None, None
+        if (self._image is None or self._size != (width, height)
+                or not covers(self._area, visible, (width, height))):
+            self._build(width, height, tileArea(visible, (width, height)))
+        return self._image, self._area[:2]
+
+    @timed("render.heatmapBuild")
+    def _build(self, width, height, area):
+        ax0, ay0, ax1, ay1 = area
+        self._buffer = np.zeros((ay1 - ay0, ax1 - ax0, 4), dtype=np.uint8)
+        self._image = QImage(self._buffer.data, ax1 - ax0, ay1 - ay0, (ax1 - ax0) * 4, QImage.Format_RGBA8888)
+        self._size = (width, height)
+        self._area = area
+        self._render(area)
+
+    def _render(self, rect):
+        """Color the display rect (dx0, dy0, dx1, dy1) of the cached overlay from the counters"""
+        ax0, ay0 = self._area[:2]
+        dx0, dy0, dx1, dy1 = rect[0] - ax0, rect[1] - ay0, rect[2] - ax0, rect[3] - ay0
+        ys, xs = sourceIndices(rect, self.counts.shape, self._size)
+        counts = np.minimum(gather(self.counts, ys, xs), HEATMAP_SATURATION)
+        if self.mode == 'sensation' and self.sensation_counts:
+            names = list(self.sensation_counts)
+            dominant = np.argmax(np.stack([gather(self.sensation_counts[name], ys, xs) for name in names]), axis=0)
+            palette = np.array([self.colorOf(name) for name in names], dtype=np.uint8)
+            self._buffer[dy0:dy1, dx0:dx1, :3] = palette[dominant]
+            self._buffer[dy0:dy1, dx0:dx1, 3] = self._alpha[counts]
+        else:
+            self._buffer[dy0:dy1, dx0:dx1] = rgbaPixels(self._coverage_lut, counts)
+
+
+class StrokeLayer:
+    """Transparent layer holding the lasso stroke currently being drawn, at display size.
+
+    Each new mouse position only adds one segment to the layer, so the cost of a mouse
+    move does not grow with the length of the stroke. The whole stroke is redrawn only
+    when the display changes in the middle of a stroke. When zoomed in, the layer only
+    covers the visible part of the display, starting at origin (display pixels).
+    """
+    def __init__(self, color=(0, 153, 255, 200)):
+        self.default_color = QColor(*color)
+        self.color = self.default_color
+        self._image = None
+        self._size = None
+        self._scale = (1.0, 1.0)
+        self._origin = (0, 0)
+
+    def reset(self, width, height, scale_x, scale_y, color=None, origin=(0, 0)):
+        """Start a new, empty stroke layer for the given display size and image scale
+
+        color, if given, is used for the stroke until the layer is cleared.
+        """
+        if color is not None:
+            self.color = QColor(*color)
+        self._image = QImage(width, height, QImage.Format_ARGB32_Premultiplied)
+        self._image.fill(Qt.transparent)
+        self._size = (width, height)
+        self._scale = (scale_x, scale_y)
+        self._origin = tuple(origin)
+
+    def clear(self):
+        self._image = None
+        self._size = None
+        self._origin = (0, 0)
+        self.color = self.default_color
+
+    def addSegments(self, points):
+        """Draw a polyline through consecutive points (original image coordinates) onto the layer"""
+        if self._image is None:
+            return
+        self._drawSegments(points)
+
+    def image(self, width, height, scale_x, scale_y, points, origin=(0, 0)):
+        """Return the stroke layer at the given display size, rebuilding it only if the display changed"""
+        if self._image is None:
+            return None
+        if self._size != (width, height) or self._scale != (scale_x, scale_y) or self._origin != tuple(origin):
+            self.reset(width, height, scale_x, scale_y, origin=origin)
+            self._drawSegments(points)
+        return self._image
+
+    @timed("render.strokeSegments")
+    def _drawSegments(self, points):
+        if len(points) < 2:
+            return
+        # Scaled and truncated to display pixels in one pass, then drawn as one polyline
+        display_points = (np.asarray(points, dtype=np.float64) * self._scale).astype(np.int32) - self._origin
+        painter = QPainter(self._image)
+        painter.setPen(self.color)
+        painter.drawPolyline(QPolygon([QPoint(x, y) for x, y in display_points.tolist()]))
+        painter.end()
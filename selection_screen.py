@@ -1,14 +1,27 @@
 import sys
+import os
 from PyQt5.QtWidgets import (QApplication, QWidget, QRadioButton, QCheckBox, QLabel,
                            QVBoxLayout, QHBoxLayout, QPushButton, QGroupBox, QFormLayout,
-                           QDoubleSpinBox, QFrame, QGridLayout, QButtonGroup, QMessageBox, QLineEdit)
+                           QDoubleSpinBox, QFrame, QGridLayout, QButtonGroup, QMessageBox, QLineEdit,
+                           QFileDialog)
 from PyQt5.QtCore import Qt, pyqtSignal
 from PyQt5.QtGui import QFont, QIcon
 
+# Name of the modulated parameter shown in the main window, per modulation type
+MODULATION_PARAM_NAMES = {
+    "amplitude": "Current (mA)",
+    "pulse_width": "Pulse width (μs)",
+    "frequency": "Frequency (Hz)"
+}
+
 
 class SelectionScreen(QWidget):
     # Signal to pass data to the main window
     selectionComplete = pyqtSignal(dict)
+    # Signal emitted with "right" or "left" when the selected hand changes
+    handChanged = pyqtSignal(str)
+    # Signal emitted with the path of an exported session file to continue
+    resumeRequested = pyqtSignal(str)
     
     def __init__(self):
         super().__init__()
@@ -94,6 +107,9 @@ class SelectionScreen(QWidget):
         hand_button_group.addButton(self.right_hand)
         hand_button_group.addButton(self.left_hand)
         
+        # Notify listeners (e.g. to preload the hand image) when the hand changes
+        self.right_hand.toggled.connect(lambda _: self.handChanged.emit(self.selectedHand()))
+        
         hand_layout.addWidget(self.right_hand)
         hand_layout.addWidget(self.left_hand)
         hand_group.setLayout(hand_layout)
@@ -192,10 +208,14 @@ class SelectionScreen(QWidget):
         nerve_layout.addWidget(self.ulnar_nerve)
         nerve_group.setLayout(nerve_layout)
         
-        # Continue button
+        # Resume and continue buttons
         button_layout = QHBoxLayout()
+        self.resume_button = QPushButton("Resume Session...")
+        self.resume_button.setToolTip("Continue a session from a file saved earlier")
+        self.resume_button.clicked.connect(self.onResumeClicked)
         self.continue_button = QPushButton("Continue to Sensation Interface")
         self.continue_button.clicked.connect(self.onContinueClicked)
+        button_layout.addWidget(self.resume_button)
         button_layout.addStretch()
         button_layout.addWidget(self.continue_button)
         
@@ -216,6 +236,10 @@ class SelectionScreen(QWidget):
         # Update parameter visibility based on default selection
         self.updateParameterVisibility()
     
+    def selectedHand(self):
+        """Return the currently selected hand ("right" or "left")"""
+        return "right" if self.right_hand.isChecked() else "left"
+    
     def updateParameterVisibility(self):
         """Update which parameters are enabled based on modulation type selected"""
         # Current is disabled if Amplitude modulation is selected
@@ -259,7 +283,7 @@ class SelectionScreen(QWidget):
     def onContinueClicked(self):
         """Collect all selected parameters and emit signal to main app"""
         # Determine which hand was selected
-        hand = "right" if self.right_hand.isChecked() else "left"
+        hand = self.selectedHand()
         # Collect Patient ID and Device Name
         patient_id = self.patient_id.text().strip()
         device_name = self.device_name.text().strip()
@@ -270,16 +294,14 @@ class SelectionScreen(QWidget):
         
         if self.amplitude_radio.isChecked():
             modulation = "amplitude"
-            modulation_param_name = "Current (mA)"
             # This will be entered in the main window
         elif self.pulse_width_radio.isChecked():
             modulation = "pulse_width"
-            modulation_param_name = "Pulse width (μs)"
             # This will be entered in the main window
         else:  # frequency
             modulation = "frequency"
-            modulation_param_name = "Frequency (Hz)"
             # This will be entered in the main window
+        modulation_param_name = MODULATION_PARAM_NAMES[modulation]
         
         # Get threshold values
         sensory_threshold = self.sensory_threshold_input.value()
@@ -339,6 +361,37 @@ class SelectionScreen(QWidget):
         # Close this window
         self.hide()
 
+    def onResumeClicked(self):
+        """Ask for a session file saved earlier and request to continue its session"""
+        # Imported here: the export backends pull in SciPy, which is kept off the startup path
+        from export_backends import sessionFileFilter
+        filename, _ = QFileDialog.getOpenFileName(
+            self, "Resume Session", os.path.join(os.getcwd(), "Saving_folder"), sessionFileFilter())
+        if filename:
+            self.resumeRequested.emit(filename)
+
+    def setSessionData(self, data):
+        """Show the parameters of a session (in the format emitted by selectionComplete)"""
+        self.patient_id.setText(data.get("patient_id", ""))
+        self.device_name.setText(data.get("device_name", ""))
+        (self.right_hand if data["hand"] == "right" else self.left_hand).setChecked(True)
+
+        modulation = data["modulation"]["type"]
+        {"amplitude": self.amplitude_radio, "pulse_width": self.pulse_width_radio,
+         "frequency": self.frequency_radio}[modulation].setChecked(True)
+
+        # The threshold ranges follow the modulation type, so they are set after it
+        parameters = data["parameters"]
+        for name, spin_box in (("current", self.current_input), ("frequency", self.frequency_input),
+                               ("pulse_width", self.pulse_width_input), ("interphase", self.interphase_input),
+                               ("sensory_threshold", self.sensory_threshold_input),
+                               ("motor_threshold", self.motor_threshold_input)):
+            if parameters.get(name) is not None:
+                spin_box.setValue(parameters[name])
+
+        self.median_nerve.setChecked(data["stimulation"]["median_nerve"])
+        self.ulnar_nerve.setChecked(data["stimulation"]["ulnar_nerve"])
+
 if __name__ == "__main__":
     # For testing this module independently
     app = QApplication(sys.argv)
@@ -0,0 +1,130 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+# Vertex reduction of the lasso strokes: points closer than this (in original image
+# pixels) to the simplified outline are dropped, and the tolerance is doubled until
+# the stroke has at most MAX_STROKE_POINTS vertices
+SIMPLIFY_TOLERANCE = 0.5
+MAX_STROKE_POINTS = 256
+
+# Longer strokes are first thinned to this many points, evenly spaced along the stroke,
+# so that simplifying (which may take several passes) costs the same for any stroke
+MAX_SIMPLIFY_INPUT = 4 * MAX_STROKE_POINTS
+
+
+def thinStroke(points, count):
+    """About count of the points of a stroke, evenly spaced along its length (in order)"""
+    length = np.concatenate(([0.0], np.cumsum(np.hypot(*np.diff(points, axis=0).T))))
+    keep = np.searchsorted(length, np.linspace(0.0, length[-1], count, endpoint=False))
+    # The indices are sorted: drop the repeats (where a single step spans several spacings)
+    return points[keep[np.concatenate(([True], keep[1:] != keep[:-1]))]]
+
+
+def simplifyStroke(points, tolerance=SIMPLIFY_TOLERANCE, max_points=MAX_STROKE_POINTS):
+    """Reduce a closed lasso polygon to a bounded number of vertices (Douglas-Peucker)"""
+    points = np.asarray(points, dtype=np.float32).reshape(-1, 2)
+    if len(points) > 1 and np.array_equal(points[0], points[-1]):
+        points = points[:-1]  # The lasso is closed by repeating its first point
+    if len(points) > MAX_SIMPLIFY_INPUT:
+        points = thinStroke(points, MAX_SIMPLIFY_INPUT)
+    contour = points.reshape(-1, 1, 2)
+    simplified = cv2.approxPolyDP(contour, tolerance, True)
+    while len(simplified) > max_points:
+        tolerance *= 2
+        simplified = cv2.approxPolyDP(contour, tolerance, True)
+    return simplified.reshape(-1, 2)
+
+
+class SelectionVectors:
+    """Lasso strokes that produced a selection, kept as simplified polygons.
+
+    Strokes are stored in the pixel coordinates of the hand image they were drawn on
+    (image_shape), along with the identity of the hand region they were intersected
+    with, so the selection map can be regenerated at any resolution with rasterize().
+    Erase strokes subtract their polygon from the strokes drawn before them.
+    """
+    def __init__(self, hand, region_id, image_shape, strokes=None, erased=None):
+        self.hand = hand                        # "right" or "left"
+        self.region_id = region_id              # Identity of the hand region (see hand_assets.regionId)
+        self.image_shape = tuple(image_shape)   # (height, width) of the hand image
+        self.strokes = list(strokes or [])      # float32 arrays of (x, y) vertices, in drawing order
+        self.erased = list(erased or [False] * len(self.strokes))  # True for the erase strokes
+
+    def addStroke(self, points, erase=False):
+        """Simplify and add a stroke; return its (stroke, erase) entry"""
+        stroke = simplifyStroke(points)
+        self.strokes.append(stroke)
+        self.erased.append(erase)
+        return (stroke, erase)
+
+    def entries(self):
+        """(stroke, erase) entries of all the strokes, in drawing order"""
+        return list(zip(self.strokes, self.erased))
+
+    def removeStrokes(self, entries):
+        """Remove the given entries (matched by identity of their stroke)"""
+        removed = [stroke for stroke, _ in entries]
+        kept = [(stroke, erase) for stroke, erase in zip(self.strokes, self.erased)
+                if not any(stroke is other for other in removed)]
+        self.strokes = [stroke for stroke, _ in kept]
+        self.erased = [erase for _, erase in kept]
+
+    def appendStrokes(self, entries):
+        for stroke, erase in entries:
+            self.strokes.append(stroke)
+            self.erased.append(erase)
+
+    @property
+    def vertexCount(self):
+        return sum(len(stroke) for stroke in self.strokes)
+
+    def rasterize(self, shape=None, region=None):
+        """Render the selection as a uint8 map (255 = selected) of the given (height, width).
+
+        region is the binary hand region to intersect with, at any resolution; it is
+        resized to shape if needed. Without it, the union of the strokes is returned.
+        """
+        height, width = shape or self.image_shape
+        scale = np.array([width / self.image_shape[1], height / self.image_shape[0]], dtype=np.float64)
+
+        selection = np.zeros((height, width), dtype=np.uint8)
+        for stroke, erase in zip(self.strokes, self.erased):
+            if len(stroke) > 2:
+                polygon = np.floor(stroke * scale).astype(np.int32)
+                cv2.fillPoly(selection, [polygon], 0 if erase else 255)
+
+        if region is not None:
+            if region.shape != selection.shape:
+                region = cv2.resize(region, (width, height), interpolation=cv2.INTER_NEAREST)
+            cv2.bitwise_and(selection, region, dst=selection)
+        return selection
+
+    def toDict(self):
+        """JSON-compatible form (for the session journal)"""
+        return {
+            'hand': self.hand,
+            'region_id': self.region_id,
+            'image_shape': list(self.image_shape),
+            'strokes': [np.round(stroke.astype(np.float64), 2).tolist() for stroke in self.strokes],
+            'erased': list(self.erased)
+        }
+
+    @classmethod
+    def fromDict(cls, data):
+        strokes = [np.asarray(stroke, dtype=np.float32).reshape(-1, 2) for stroke in data['strokes']]
+        return cls(data['hand'], data['region_id'], data['image_shape'], strokes, data.get('erased'))
+
+
+def rasterizeBatch(selections, shape=None, region=None, max_workers=None):
+    """Rasterize many selections in parallel (OpenCV releases the GIL while filling).
+
+    region, if given, is resized to shape once and shared by every selection.
+    """
+    if region is not None and shape is not None and region.shape != tuple(shape):
+        region = cv2.resize(region, (shape[1], shape[0]), interpolation=cv2.INTER_NEAREST)
+    max_workers = max_workers or min(8, os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(lambda selection: selection.rasterize(shape, region), selections))
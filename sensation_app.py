@@ -0,0 +1,1917 @@
+import os
+import datetime
+import time
+from PyQt5.QtWidgets import (QApplication, QLabel, QWidget, QPushButton,
+                             QVBoxLayout, QHBoxLayout, QSlider, QTextEdit, QFileDialog,
+                             QGridLayout, QGroupBox, QFrame, QSizePolicy, QCheckBox,
+                             QScrollArea, QDoubleSpinBox, QFormLayout, QMessageBox, QStyle,
+                             QProgressDialog, QShortcut, QComboBox)
+from PyQt5.QtCore import Qt, QEvent, QRect, QPoint, QTimer, QThreadPool
+from PyQt5.QtGui import QPainter, QColor, QIcon, QKeySequence, QTabletEvent
+import cv2
+import numpy as np
+
+from selection_overlay import HeatmapOverlay, OTHER_SENSATION_COLOR, SelectionOverlay, StrokeLayer
+from image_pyramid import ImagePyramid
+from pixmap_cache import ScaledPixmapCache
+from report_maps import CompactMap
+from report_store import MemmapReportStore, MemoryReportStore, SessionFileReportStore, removeFile
+from report_table import ReportTable, summaryPath
+from selection_history import SelectionEdit, SelectionHistory
+from selection_mask import SelectionMask
+from selection_vectors import SelectionVectors
+from session_journal import SessionJournal
+from session_files import headerText, openSession
+from selection_screen import MODULATION_PARAM_NAMES
+from export_worker import SessionExportWorker
+from export_backends import availableBackends
+from hand_assets import HandAssetRegistry
+from hand_labels import describeRegions
+from parameter_sweep import ParameterSweep
+from instrumentation import log, timed
+
+# Frame-time target for repainting an in-progress lasso stroke. Thanks to the incremental
+# stroke layer this must hold for strokes of any length; benchmarks/bench_hot_paths.py
+# fails if the 95th percentile of a frame of a 5,000-point stroke exceeds it.
+STROKE_FRAME_TARGET_MS = 8.0
+
+# Delay after the last resize event before the image is rescaled with smooth filtering
+SMOOTH_RESCALE_DELAY_MS = 150
+
+# Holding this modifier when starting a lasso erases instead of adding (like the Erase toggle),
+# and the stroke is drawn in this color
+ERASE_MODIFIER = Qt.AltModifier
+ERASE_STROKE_COLOR = (255, 87, 34, 220)
+
+# Zoom of the hand image: each wheel step multiplies it by ZOOM_STEP, from 1 (the whole
+# image fitted to the label) up to MAX_ZOOM; dragging with these buttons pans the image
+ZOOM_STEP = 1.25
+MAX_ZOOM = 16.0
+PAN_BUTTONS = Qt.RightButton | Qt.MiddleButton
+
+# How long the status of a saved report stays shown under the buttons
+STATUS_MESSAGE_MS = 6000
+
+# Map data reserved per planned report when a sweep starts, until the session has
+# reports to measure (a typical compressed selection is a few KB)
+SWEEP_REPORT_BYTES = 16 * 1024
+
+def journalDirectory():
+    """Directory holding the journals of sessions that have not been exported yet"""
+    return os.path.join(os.getcwd(), "Saving_folder", "journal")
+
+def sessionFromHeader(header, path):
+    """Session parameters, in the format emitted by the selection screen, from the header of a
+    session file; "resumed_from" records the file the session continues"""
+    def number(value):
+        # The modulated parameter is stored as an empty array
+        return None if np.size(value) == 0 else float(np.asarray(value).ravel()[0])
+
+    modulation = headerText(header['ModulationType'])
+    nerve = headerText(header.get('Nerve')) or 'None'
+    parameters = {
+        "current": number(header.get('Current')),
+        "frequency": number(header.get('Frequency')),
+        "pulse_width": number(header.get('PulseWidth')),
+        "interphase": number(header.get('InterphaseDistance_us')),
+        "sensory_threshold": number(header.get('SensoryThreshold')),
+        "motor_threshold": number(header.get('MotorThreshold'))
+    }
+    return {
+        "hand": headerText(header['Hand']).lower(),
+        "modulation": {
+            "type": modulation,
+            "param_name": MODULATION_PARAM_NAMES[modulation]
+        },
+        "parameters": parameters,
+        "stimulation": {
+            "median_nerve": nerve in ("Median", "Both"),
+            "ulnar_nerve": nerve in ("Ulnar", "Both")
+        },
+        "patient_id": headerText(header.get('PatientID')),
+        "device_name": headerText(header.get('DeviceName')),
+        "sensory_threshold": parameters["sensory_threshold"],
+        "motor_threshold": parameters["motor_threshold"],
+        "resumed_from": os.path.abspath(path)
+    }
+
+def newReportStore():
+    """Container for the reports of a session.
+
+    By default the reports are kept in memory (MemoryReportStore, a dict). Setting the environment variable
+    SENSATION_REPORT_STORE=disk keeps their maps in a memory-mapped file instead, so that
+    memory use stays flat in very long sessions.
+    """
+    if os.environ.get("SENSATION_REPORT_STORE", "memory").lower() == "disk":
+        return MemmapReportStore()
+    return MemoryReportStore()
+
+class ImageLabelWithClick(QLabel):
+    """Custom QLabel class that handles mouse clicks and maintains image proportions"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.parent_app = None
+        self.setAlignment(Qt.AlignCenter)
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+        self.setMinimumSize(100, 100)
+        self.drawing = False
+        self.lasso_points = []
+        self.last_point = None
+        self.realise_lasso = False
+        self.erasing = False  # The current stroke subtracts from the selection
+        self.pending_positions = []  # Pointer positions (label pixels) not yet added to the stroke
+        self.image_transform = None  # Cached label-to-image transform, see imageTransform()
+        self.zoom = 1.0  # Zoom of the image (1 = whole image fitted to the label)
+        self.view_center = (0.5, 0.5)  # Image point at the center of the label, as fractions of the image
+        self.pan_start = None  # (label position, view center) when panning started
+
+        # Persistent layer with the stroke being drawn (only the newest segment is added per move)
+        self.stroke_layer = StrokeLayer()
+        self.max_frame_ms = 0.0
+
+        # Coalesce repaints during a stroke to the display refresh rate
+        self.repaint_timer = QTimer(self)
+        self.repaint_timer.setSingleShot(True)
+        self.repaint_timer.timeout.connect(self.flushStroke)
+
+        
+    def setParentApp(self, app):
+        self.parent_app = app
+
+    def frameInterval(self):
+        """Return the repaint interval (ms) matching the refresh rate of the current screen"""
+        screen = self.screen() if self.window() else None
+        refresh_rate = screen.refreshRate() if screen else 0
+        if refresh_rate <= 0:
+            refresh_rate = 60.0
+        return max(1, int(1000.0 / refresh_rate))
+
+    def scheduleRepaint(self):
+        """Request a repaint of the stroke; several mouse moves within a frame share one repaint"""
+        if not self.repaint_timer.isActive():
+            self.repaint_timer.start(self.frameInterval())
+
+    @timed("render.strokeFrame")
+    def flushStroke(self):
+        """Add the pending points to the stroke, repaint the label and record the frame time"""
+        self.repaint_timer.stop()
+        start = time.perf_counter()
+        self.addPendingPoints()
+        self.repaint()
+        frame_ms = (time.perf_counter() - start) * 1000.0
+        self.max_frame_ms = max(self.max_frame_ms, frame_ms)
+
+    def resizeEvent(self, event):
+        self.image_transform = None
+        super().resizeEvent(event)
+
+    def setPixmap(self, pixmap):
+        self.image_transform = None
+        super().setPixmap(pixmap)
+
+    def imageTransform(self):
+        """Return (offset, scale, size) arrays mapping label positions to original image coordinates.
+
+        Computed once and kept until the label is resized or shows another pixmap; None
+        if no image is displayed.
+        """
+        if self.image_transform is None:
+            img_rect = self.imageTarget() if self.isZoomed() else self.getImageRect()
+            original_pixmap = self.parent_app.original_pixmap if self.parent_app else None
+            if img_rect.isEmpty() or original_pixmap is None or original_pixmap.isNull():
+                return None
+            size = np.array([original_pixmap.width(), original_pixmap.height()], dtype=np.float64)
+            self.image_transform = (np.array([img_rect.x(), img_rect.y()], dtype=np.float64),
+                                    size / [img_rect.width(), img_rect.height()], size)
+        return self.image_transform
+
+    def toImage(self, positions):
+        """Convert label positions (N x 2) to original image coordinates in one pass.
+
+        Positions outside the image are brought back to its edge, so a stroke that
+        leaves the image follows the edge instead of jumping when it comes back.
+        """
+        offset, scale, size = self.imageTransform()
+        points = (np.asarray(positions, dtype=np.float64).reshape(-1, 2) - offset) * scale
+        return np.clip(points, 0, size - 1, out=points)
+
+    @timed("input.mousePress")
+    def mousePressEvent(self, event):
+        """Start drawing the lasso when mouse is pressed (or panning, with the pan buttons)"""
+        position = event.localPos()
+        if event.button() & PAN_BUTTONS:
+            if self.isZoomed() and not self.drawing:
+                self.pan_start = ((position.x(), position.y()), self.view_center)
+                self.setCursor(Qt.ClosedHandCursor)
+            return
+        self.beginStroke((position.x(), position.y()), bool(event.modifiers() & ERASE_MODIFIER))
+
+    @timed("input.mouseMove")
+    def mouseMoveEvent(self, event):
+        """Queue the mouse position; it is added to the lasso with the next repaint"""
+        position = event.localPos()
+        if self.pan_start is not None:
+            (start_x, start_y), (center_x, center_y) = self.pan_start
+            target = self.imageTarget()
+            self.setView(self.zoom, (center_x - (position.x() - start_x) / target.width(),
+                                     center_y - (position.y() - start_y) / target.height()))
+        elif self.drawing:
+            self.queuePosition((position.x(), position.y()))
+
+    @timed("input.mouseRelease")
+    def mouseReleaseEvent(self, event):
+        """Finish drawing the lasso and set the selected area"""
+        if event.button() & PAN_BUTTONS:
+            if self.pan_start is not None:
+                self.pan_start = None
+                self.unsetCursor()
+            return
+        self.finishStroke()
+
+    def wheelEvent(self, event):
+        """Zoom in or out, keeping the image point under the mouse in place"""
+        steps = event.angleDelta().y() / 120
+        if not steps or not self.pixmap() or not self.parent_app:
+            return
+        # Points queued so far belong to the current view
+        self.addPendingPoints()
+        
+        fit = self.fitRect()
+        target = self.imageTarget()
+        position = event.posF()
+        point_x = (position.x() - target.x()) / target.width()
+        point_y = (position.y() - target.y()) / target.height()
+        zoom = min(max(self.zoom * ZOOM_STEP ** steps, 1.0), MAX_ZOOM)
+        self.setView(zoom, (point_x - (position.x() - self.width() / 2) / (fit.width() * zoom),
+                            point_y - (position.y() - self.height() / 2) / (fit.height() * zoom)))
+        if self.drawing:
+            # Redraw the stroke so far at the new zoom; the next points are drawn at it too
+            self.resetStrokeLayer()
+        event.accept()
+
+    def isZoomed(self):
+        return self.zoom > 1.0
+
+    def setView(self, zoom, center):
+        """Show the image at a zoom (1 = fitted) around a center (fractions of the image);
+        the center is limited so that the zoomed image always covers the label"""
+        self.zoom = min(max(zoom, 1.0), MAX_ZOOM)
+        fit = self.fitRect()
+        limits = []
+        for value, half in zip(center, (self.width() / (2 * max(fit.width(), 1) * self.zoom),
+                                        self.height() / (2 * max(fit.height(), 1) * self.zoom))):
+            # half: half of the label, as a fraction of the zoomed image
+            limits.append(min(max(value, half), 1 - half) if half < 0.5 else 0.5)
+        self.view_center = tuple(limits)
+        self.image_transform = None
+        self.update()
+
+    def resetView(self):
+        """Show the whole image again"""
+        self.setView(1.0, (0.5, 0.5))
+
+    def tabletEvent(self, event):
+        """Draw with a pen: every sample of the pen is used, and its eraser end erases.
+
+        Accepting the events stops Qt from turning them into (fewer) mouse events.
+        """
+        position = event.posF()
+        if event.type() == QEvent.TabletPress:
+            self.beginStroke((position.x(), position.y()),
+                             event.pointerType() == QTabletEvent.Eraser or bool(event.modifiers() & ERASE_MODIFIER))
+        elif event.type() == QEvent.TabletMove:
+            if self.drawing:
+                self.queuePosition((position.x(), position.y()))
+        elif event.type() == QEvent.TabletRelease:
+            self.finishStroke()
+        event.accept()
+
+    def beginStroke(self, position, erase=False):
+        """Start a lasso stroke at a label position (ignored outside the image)"""
+        if not self.pixmap() or not self.parent_app or self.imageTransform() is None:
+            return
+
+        # Convert to original image coordinates
+        offset, scale, size = self.imageTransform()
+        img_x, img_y = (np.asarray(position, dtype=np.float64) - offset) * scale
+        if not (0 <= img_x < size[0] and 0 <= img_y < size[1]):
+            # Click is outside the image
+            return
+        
+        # Start a new selection
+        self.drawing = True
+        self.erasing = self.parent_app.erase_button.isChecked() or erase
+        self.lasso_points = [(img_x, img_y)]
+        self.last_point = (img_x, img_y)
+        self.pending_positions = []
+        self.max_frame_ms = 0.0
+        self.resetStrokeLayer()
+
+    def resetStrokeLayer(self):
+        """Fit the stroke layer to the visible part of the display and draw the stroke so far"""
+        original_pixmap = self.parent_app.original_pixmap
+        if self.parent_app.display_pixmap is None:
+            return
+        target = self.imageTarget()
+        dx0, dy0, dx1, dy1 = self.visibleArea(target)
+        self.stroke_layer.reset(dx1 - dx0, dy1 - dy0,
+                                target.width() / original_pixmap.width(),
+                                target.height() / original_pixmap.height(),
+                                color=ERASE_STROKE_COLOR if self.erasing else None, origin=(dx0, dy0))
+        self.stroke_layer.addSegments(self.lasso_points)
+
+    def queuePosition(self, position):
+        """Queue a pointer position of the stroke; queued positions are converted and
+        drawn together, at most once per display frame"""
+        self.pending_positions.append(position)
+        self.scheduleRepaint()
+
+    @timed("input.strokeBatch")
+    def addPendingPoints(self):
+        """Convert the queued positions at once and add them to the lasso and its layer"""
+        if not self.pending_positions or not self.drawing or self.imageTransform() is None:
+            self.pending_positions = []
+            return
+        points = self.toImage(self.pending_positions).tolist()
+        self.pending_positions = []
+        
+        # Draw only the new segments
+        self.stroke_layer.addSegments([self.last_point] + points)
+        self.lasso_points.extend(map(tuple, points))
+        self.last_point = self.lasso_points[-1]
+
+    def finishStroke(self):
+        """Finish drawing the lasso and set the selected area"""
+        self.repaint_timer.stop()
+        self.addPendingPoints()
+        if not self.parent_app:
+            return
+        if self.drawing:
+            log.debug("Lasso stroke: %d points, max frame time %.2f ms (target %.0f ms)",
+                      len(self.lasso_points), self.max_frame_ms, STROKE_FRAME_TARGET_MS)
+        self.realise_lasso = True
+        if self.drawing and len(self.lasso_points) > 2:
+            # Close the lasso
+            self.lasso_points.append(self.lasso_points[0])  # Close the polygon
+            
+            # Process the lasso to check intersection with the hand mask
+            # This will also set click_position and calculate center
+            if not self.parent_app.processLassoSelection(self.lasso_points, erase=self.erasing) and not self.erasing:
+                # Reset if the area doesn't intersect with the hand
+                # self.parent_app.selected_area = []
+                self.parent_app.click_position = (None, None)
+                log.info("Selected area does not intersect with the hand area")
+            
+            # Only the stroke area changed: the overlay was updated there and the stroke goes away
+            self.parent_app.redrawAreaSelection(strokeBox(self.lasso_points))
+        else:
+            self.parent_app.redrawAreaSelection()
+        
+        self.drawing = False
+        self.erasing = False
+        self.realise_lasso = False
+        self.stroke_layer.clear()
+
+    
+    @timed("render.paint")
+    def paintEvent(self, event):
+        """Draw the cached hand image (the visible tiles when zoomed in), then composite
+        the selection layers on top of it"""
+        pixmap = self.pixmap()
+        if not pixmap or pixmap.isNull() or not self.parent_app or not self.isZoomed():
+            super().paintEvent(event)
+        if not pixmap or pixmap.isNull() or not self.parent_app:
+            return
+
+        target = self.imageTarget()
+        painter = QPainter(self)
+        if self.isZoomed():
+            self.parent_app.imagePyramid().draw(painter, target, event.rect())
+        self.parent_app.paintSelectionLayers(painter, target)
+        painter.end()
+
+    def fitRect(self):
+        """Return the rectangle QLabel uses to draw the aligned pixmap (the whole image)"""
+        if not self.pixmap():
+            return QRect()
+        return QStyle.alignedRect(self.layoutDirection(), self.alignment(),
+                                  self.pixmap().size(), self.contentsRect())
+
+    def imageTarget(self):
+        """Return the rectangle of the whole image in the label at the current zoom
+        (it extends past the label when zoomed in)"""
+        fit = self.fitRect()
+        if not self.isZoomed():
+            return fit
+        width, height = round(fit.width() * self.zoom), round(fit.height() * self.zoom)
+        center_x, center_y = self.view_center
+        return QRect(round(self.width() / 2 - center_x * width), round(self.height() / 2 - center_y * height),
+                     width, height)
+
+    def visibleArea(self, target):
+        """Part of the image target inside the label, as a display rect (dx0, dy0, dx1, dy1)"""
+        return (max(0, -target.x()), max(0, -target.y()),
+                min(target.width(), self.width() - target.x()), min(target.height(), self.height() - target.y()))
+
+    def updateImageRegion(self, bbox):
+        """Schedule a repaint of the part of the label showing bbox (x0, y0, x1, y1) of the original image"""
+        pixmap = self.pixmap()
+        original_pixmap = self.parent_app.original_pixmap if self.parent_app else None
+        if not pixmap or pixmap.isNull() or original_pixmap is None or original_pixmap.isNull():
+            self.update()
+            return
+        target = self.imageTarget()
+        scale_x = target.width() / original_pixmap.width()
+        scale_y = target.height() / original_pixmap.height()
+        x0, y0, x1, y1 = bbox
+        # A couple of pixels of margin cover the rounding and the width of the stroke
+        self.update(QRect(target.x() + int(x0 * scale_x) - 2, target.y() + int(y0 * scale_y) - 2,
+                          int((x1 - x0) * scale_x) + 5, int((y1 - y0) * scale_y) + 5))
+
+    def getImageRect(self):
+        """Return the exact rectangle occupied by the image within the label"""
+        if not self.pixmap():
+            return QRect()
+            
+        # Label and image dimensions
+        label_size = self.size()
+        pixmap_size = self.pixmap().size()
+        
+        # Calculate scale factor to maintain proportions
+        scale_w = label_size.width() / pixmap_size.width()
+        scale_h = label_size.height() / pixmap_size.height()
+        scale = min(scale_w, scale_h)
+        
+        # Scaled image dimensions
+        scaled_width = pixmap_size.width() * scale
+        scaled_height = pixmap_size.height() * scale
+        
+        # Position of the centered image within the label
+        x_offset = (label_size.width() - scaled_width) / 2
+        y_offset = (label_size.height() - scaled_height) / 2
+        
+        return QRect(int(x_offset), int(y_offset), int(scaled_width), int(scaled_height))
+
+def strokeBox(points):
+    """Bounding box (x0, y0, x1, y1) of stroke points, in whole pixels"""
+    points = np.asarray(points, dtype=np.float64)
+    x0, y0 = np.floor(points.min(axis=0)).astype(int)
+    x1, y1 = np.ceil(points.max(axis=0)).astype(int) + 1
+    return (x0, y0, x1, y1)
+
+
+class SensationApp(QWidget):
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("Sensory NBLab")
+    
+        # Set the application icon
+        app_icon = QIcon("Icon/Icon.png")
+        self.setWindowIcon(app_icon)
+        
+        self.setWindowState(Qt.WindowMaximized)  # Make window maximized
+        
+        # Initialize variables
+        self.click_position = (None, None)
+        self.device_name = ""  # Store device name
+        self.patient_id = ""   # Store patient ID
+        self.point_markers = []
+        self.selected_area = None  # SelectionMask of the selected area (None if nothing is selected)
+        self.selection_vectors = None  # Simplified lasso strokes of the selected area
+        self.selection_history = SelectionHistory()  # Undo/redo of the edits to the selected area
+        self.sensation_checkboxes = {}  # Store references to checkboxes
+        self.sensation_types = []  # Names of the sensation types, in the order of the checkboxes
+        self.hand_region = None  # Binary hand region (255 inside the hand), from the hand asset registry
+        self.hand_region_id = None  # Fingerprint of the hand region, stored with the selections
+        self.hand_labels = None  # Anatomical HandLabels aligned with the hand region (None if not available)
+        self.selection_data = None  # Parameters received from the selection screen
+        self.journal = None  # On-disk journal of the reports saved in this session
+        self.journal_failed = False  # Set when a report could not be journaled
+        self.export_worker = None  # Background worker writing the session file
+        # Thread running the export worker. Not Qt's global pool: smooth image scaling runs
+        # on that pool and, with a single core, would wait for the export while holding the GIL
+        self.export_pool = QThreadPool(self)
+        self.export_pool.setMaxThreadCount(1)
+        self.export_progress = None  # Progress dialog shown while exporting
+        self.export_target = None  # File replaced by the export once it is written (resumed sessions)
+        self.selection_overlay = SelectionOverlay()  # Cached rendering of the selected area
+        self.heatmap_overlay = HeatmapOverlay()  # Cumulative coverage of the saved reports
+        self.heatmap_pending = False  # Set while the heatmap has to be rebuilt from the reports
+        self.original_pixmap = None  # Full resolution hand image
+        self.image_pyramid = None  # Tiled levels of the hand image for zoomed views (built on first zoom)
+        self.display_pixmap = None  # Hand image scaled to the label, without overlays
+        self.pixmap_cache = ScaledPixmapCache()  # Recently used scaled versions of the hand image
+        self.sweep = None  # ParameterSweep in progress (None outside sweep mode)
+        self.sweep_start_input = None  # Sweep controls (created with the parameter panel)
+
+        # Rescale with smooth filtering once interactive resizing has stopped
+        self.smooth_resize_timer = QTimer(self)
+        self.smooth_resize_timer.setSingleShot(True)
+        self.smooth_resize_timer.setInterval(SMOOTH_RESCALE_DELAY_MS)
+        self.smooth_resize_timer.timeout.connect(self.displayImage)
+
+        
+        # Parameters from selection screen (default values)
+        self.hand_side = "right"  # Default to right hand
+        self.modulation_type = "amplitude"
+        self.modulation_param_name = "Current (mA)"
+        self.fixed_parameters = {
+            "current": None,
+            "frequency": 50,
+            "pulse_width": 200,
+            "interphase": 100,
+            "sensory_threshold": 1,
+            "motor_threshold": 10
+        }
+        self.stimulation_types = {
+            "median_nerve": False,
+            "ulnar_nerve": False
+        }
+        
+        # Configure better style
+        self.setStyleSheet("""
+            QWidget {
+                font-size: 11pt;
+                background-color: #f5f5f5;
+            }
+            QLabel {
+                font-weight: bold;
+                color: #333333;
+            }
+            QPushButton {
+                background-color: #4CAF50;
+                color: white;
+                padding: 8px 16px;
+                border-radius: 4px;
+                font-weight: bold;
+                min-height: 30px;
+            }
+            QPushButton:hover {
+                background-color: #45a049;
+            }
+            QTextEdit {
+                border: 1px solid #cccccc;
+                border-radius: 4px;
+                padding: 5px;
+                background-color: white;
+            }
+            QSlider::groove:horizontal {
+                height: 8px;
+                background: #cccccc;
+                border-radius: 4px;
+            }
+            QSlider::handle:horizontal {
+                background: #4CAF50;
+                border: 1px solid #4CAF50;
+                width: 18px;
+                margin: -5px 0;
+                border-radius: 9px;
+            }
+            QGroupBox {
+                border: 1px solid #cccccc;
+                border-radius: 5px;
+                margin-top: 10px;
+                padding-top: 15px;
+                font-weight: bold;
+            }
+            QCheckBox {
+                font-weight: normal;
+                margin: 3px;
+            }
+            QScrollArea {
+                border: none;
+                background-color: transparent;
+            }
+        """)
+        
+        # Create frame for image with border
+        image_frame = QFrame()
+        image_frame.setFrameStyle(QFrame.Panel | QFrame.Sunken)
+        image_frame.setLineWidth(2)
+        
+        # Use the custom class for the image label
+        self.image_label = ImageLabelWithClick()
+        self.image_label.setParentApp(self)
+        
+        # Load hand image and mask based on selection (default to right)
+        self.loadHandAssets()
+        
+        self.displayImage()
+        
+        # Add the image to the frame
+        image_layout = QVBoxLayout(image_frame)
+        image_layout.addWidget(self.image_label)
+        
+        # Right panel for controls
+        right_panel = QFrame()
+        right_layout = QVBoxLayout(right_panel)
+        
+        # Parameter information
+        param_group = QGroupBox("Stimulation Parameters")
+        self.param_layout = QFormLayout()
+        
+        # Create modulation parameter input
+        self.modulation_input = QDoubleSpinBox()
+        self.modulation_input.setMinimumHeight(30)
+        
+        if self.modulation_type == "amplitude":
+            self.modulation_input.setRange(0.1, 50.0)
+            self.modulation_input.setSingleStep(0.10)
+            self.modulation_input.setValue(1.0)
+            self.modulation_input.setSuffix(" mA")
+            self.modulation_input.setDecimals(2)  # 2 decimal places for current
+        elif self.modulation_type == "pulse_width":
+            self.modulation_input.setRange(1, 5000)
+            self.modulation_input.setSingleStep(1)  # Changed from 10 to 1
+            self.modulation_input.setValue(200)
+            self.modulation_input.setSuffix(" μs")
+            self.modulation_input.setDecimals(0)  # No decimals for pulse width
+        else:  # frequency
+            self.modulation_input.setRange(1, 1000)
+            self.modulation_input.setSingleStep(1)
+            self.modulation_input.setValue(50)
+            self.modulation_input.setSuffix(" Hz")
+            self.modulation_input.setDecimals(0)  # No decimals for frequency
+                
+        # Call updateParameterDisplay to set up the parameter layout
+        self.updateParameterDisplay()
+        
+        param_group.setLayout(self.param_layout)
+        
+        # Sweep of the modulated parameter: it steps to the next level after each saved report
+        sweep_group = QGroupBox("Parameter Sweep")
+        sweep_layout = QGridLayout()
+        self.sweep_start_input = QDoubleSpinBox()
+        self.sweep_stop_input = QDoubleSpinBox()
+        self.sweep_step_input = QDoubleSpinBox()
+        for column, (text, spin_box) in enumerate((("From", self.sweep_start_input),
+                                                  ("To", self.sweep_stop_input),
+                                                  ("Step", self.sweep_step_input))):
+            spin_box.setMinimumHeight(30)
+            sweep_layout.addWidget(QLabel(text), 0, column)
+            sweep_layout.addWidget(spin_box, 1, column)
+        self.sweep_button = QPushButton("Start Sweep")
+        self.sweep_button.setMinimumHeight(30)
+        self.sweep_button.setCheckable(True)
+        self.sweep_button.setToolTip("Set the parameter to each level in turn, moving on after each saved report")
+        self.sweep_button.toggled.connect(self.toggleSweep)
+        sweep_layout.addWidget(self.sweep_button, 1, 3)
+        self.sweep_label = QLabel("")
+        sweep_layout.addWidget(self.sweep_label, 2, 0, 1, 4)
+        sweep_group.setLayout(sweep_layout)
+        self.configureSweepInputs()
+        
+        # Sensation type selection area
+        sensation_group = QGroupBox("Sensation Type")
+        sensation_layout = QGridLayout()
+        
+        # Create checkboxes for each sensation type
+        sensation_types = [
+            "Vibration", "Flutter", "Buzz", 
+            "Movement through body/across skin",
+            "Movement without motor activity",
+            "Urge to move",
+            "Touch",
+            "Pressure",
+            "Sharp",
+            "Prick",
+            "Tap",
+            "Electric current",
+            "Shock",
+            "Pulsing",
+            "Tickle",
+            "Itch",
+            "Tingle",
+            "Numb",
+            "Warm",
+            "Cool"
+        ]
+        
+        # Create a scrollable area for checkboxes
+        scroll_widget = QWidget()
+        checkbox_layout = QVBoxLayout(scroll_widget)
+        
+        for sensation in sensation_types:
+            checkbox = QCheckBox(sensation)
+            checkbox_layout.addWidget(checkbox)
+            self.sensation_checkboxes[sensation] = checkbox
+        self.heatmap_overlay.setSensationTypes(sensation_types)
+        self.sensation_types = sensation_types
+        # Scalar fields of the saved reports, exported next to the session file
+        self.report_table = ReportTable(sensation_types)
+        
+        # Add "Other" checkbox with text field
+        other_layout = QHBoxLayout()
+        self.other_checkbox = QCheckBox("Other:")
+        self.other_textfield = QTextEdit()
+        self.other_textfield.setMaximumHeight(50)
+        self.other_textfield.setEnabled(False)
+        self.other_checkbox.toggled.connect(lambda checked: self.other_textfield.setEnabled(checked))
+        
+        other_layout.addWidget(self.other_checkbox)
+        other_layout.addWidget(self.other_textfield, 1)
+        
+        checkbox_layout.addLayout(other_layout)
+        checkbox_layout.addStretch()
+        
+        # Add scrollable area
+        scroll = QScrollArea()
+        scroll.setWidgetResizable(True)
+        scroll.setWidget(scroll_widget)
+        sensation_layout.addWidget(scroll)
+        sensation_group.setLayout(sensation_layout)
+        
+        # Additional description area
+        description_group = QGroupBox("Additional Description")
+        description_layout = QVBoxLayout()
+        self.description_box = QTextEdit()
+        self.description_box.setPlaceholderText("Describe the sensation in more detail...")
+        self.description_box.setMinimumHeight(100)
+        description_layout.addWidget(self.description_box)
+        description_group.setLayout(description_layout)
+        
+        # Sensation parameter sliders
+        sliders_group = QGroupBox("Sensation Parameters")
+        sliders_layout = QGridLayout()
+        
+        # Natural slider
+        natural_label = QLabel("How natural was the sensation?")
+        self.natural_slider = QSlider(Qt.Horizontal)
+        self.natural_slider.setMinimum(0)
+        self.natural_slider.setMaximum(10)
+        self.natural_slider.setValue(5)
+        self.natural_slider.setTickPosition(QSlider.TicksBelow)
+        self.natural_slider.setTickInterval(1)
+        self.natural_value = QLabel("5")
+        self.natural_slider.valueChanged.connect(lambda v: self.natural_value.setText(str(v)))
+        
+        # Pain slider
+        pain_label = QLabel("How painful was the sensation?")
+        self.pain_slider = QSlider(Qt.Horizontal)
+        self.pain_slider.setMinimum(0)
+        self.pain_slider.setMaximum(10)
+        self.pain_slider.setValue(0)
+        self.pain_slider.setTickPosition(QSlider.TicksBelow)
+        self.pain_slider.setTickInterval(1)
+        self.pain_value = QLabel("0")
+        self.pain_slider.valueChanged.connect(lambda v: self.pain_value.setText(str(v)))
+        
+        # Electrode sensation slider
+        electrode_label = QLabel("Sensation under the electrode:")
+        self.electrode_slider = QSlider(Qt.Horizontal)
+        self.electrode_slider.setMinimum(0)
+        self.electrode_slider.setMaximum(10)
+        self.electrode_slider.setValue(5)
+        self.electrode_slider.setTickPosition(QSlider.TicksBelow)
+        self.electrode_slider.setTickInterval(1)
+        self.electrode_value = QLabel("5")
+        self.electrode_slider.valueChanged.connect(lambda v: self.electrode_value.setText(str(v)))
+        
+        # Add sliders to layout
+        sliders_layout.addWidget(natural_label, 0, 0)
+        sliders_layout.addWidget(self.natural_slider, 0, 1)
+        sliders_layout.addWidget(self.natural_value, 0, 2)
+        
+        sliders_layout.addWidget(pain_label, 1, 0)
+        sliders_layout.addWidget(self.pain_slider, 1, 1)
+        sliders_layout.addWidget(self.pain_value, 1, 2)
+        
+        sliders_layout.addWidget(electrode_label, 2, 0)
+        sliders_layout.addWidget(self.electrode_slider, 2, 1)
+        sliders_layout.addWidget(self.electrode_value, 2, 2)
+        
+        sliders_group.setLayout(sliders_layout)
+        
+        # Save and Return buttons
+        button_layout = QHBoxLayout()
+        
+        # Return to Selection Screen button
+        self.return_button = QPushButton("Return to Selection")
+        self.return_button.setMinimumHeight(40)
+        self.return_button.clicked.connect(self.returnToSelection)
+        self.return_button.setStyleSheet("""
+            QPushButton {
+                background-color: #2196F3;
+                color: white;
+            }
+            QPushButton:hover {
+                background-color: #0b7dda;
+            }
+        """)
+        
+        # Clear selection button
+        self.clear_button = QPushButton("Clear Selection")
+        self.clear_button.setMinimumHeight(40)
+        self.clear_button.clicked.connect(self.clearSelection)
+        self.clear_button.setStyleSheet("""
+            QPushButton {
+                background-color: #FF5722;
+                color: white;
+            }
+            QPushButton:hover {
+                background-color: #E64A19;
+            }
+        """)
+        
+        # Heatmap of the reports saved so far, under the current selection
+        self.heatmap_combo = QComboBox()
+        self.heatmap_combo.setMinimumHeight(40)
+        self.heatmap_combo.addItems(["Heatmap: off", "Heatmap: coverage", "Heatmap: by sensation"])
+        self.heatmap_combo.setToolTip("Show where the saved reports of this session were mapped")
+        self.heatmap_combo.currentIndexChanged.connect(self.setHeatmapMode)
+        
+        # Erase toggle: lasso strokes subtract from the selection (also Alt held while drawing)
+        self.erase_button = QPushButton("Erase")
+        self.erase_button.setMinimumHeight(40)
+        self.erase_button.setCheckable(True)
+        self.erase_button.setToolTip("Lasso strokes remove from the selection (or hold Alt while drawing)")
+        
+        # Undo / redo buttons for the lasso strokes (also Ctrl+Z / Ctrl+Y)
+        self.undo_button = QPushButton("Undo")
+        self.undo_button.setMinimumHeight(40)
+        self.undo_button.setToolTip("Undo the last selection change (Ctrl+Z)")
+        self.undo_button.clicked.connect(self.undoSelection)
+        self.redo_button = QPushButton("Redo")
+        self.redo_button.setMinimumHeight(40)
+        self.redo_button.setToolTip("Redo the last undone selection change (Ctrl+Y)")
+        self.redo_button.clicked.connect(self.redoSelection)
+        QShortcut(QKeySequence.Undo, self, self.undoSelection)
+        QShortcut(QKeySequence.Redo, self, self.redoSelection)
+        # Zoom back out to the whole hand (zoom with the mouse wheel, pan by dragging with the right button)
+        QShortcut(QKeySequence("Ctrl+0"), self, self.image_label.resetView)
+        self.updateHistoryButtons()
+        
+        # Save button
+        self.save_button = QPushButton("Save Sensation")
+        self.save_button.setMinimumHeight(40)
+        self.save_button.setToolTip("Save the report of this sensation (Ctrl+S)")
+        self.save_button.clicked.connect(self.save_data)
+        self.save_shortcut = QShortcut(QKeySequence.Save, self, self.save_data)
+        
+        # Save & Exit button
+        self.save_exit_button = QPushButton("Save & Exit")
+        self.save_exit_button.setMinimumHeight(40)
+        self.save_exit_button.clicked.connect(self.save_and_exit)
+        self.save_exit_button.setStyleSheet("""
+            QPushButton {
+                background-color: #9C27B0;
+                color: white;
+            }
+            QPushButton:hover {
+                background-color: #7B1FA2;
+            }
+        """)
+        
+        button_layout.addStretch()
+        button_layout.addWidget(self.heatmap_combo)
+        button_layout.addWidget(self.erase_button)
+        button_layout.addWidget(self.undo_button)
+        button_layout.addWidget(self.redo_button)
+        button_layout.addWidget(self.clear_button)
+        button_layout.addWidget(self.return_button)
+        button_layout.addWidget(self.save_button)
+        button_layout.addWidget(self.save_exit_button)
+        button_layout.addStretch()
+        
+        # Status of the last saved report (it does not block the next one, unlike a dialog)
+        self.status_label = QLabel("")
+        self.status_label.setAlignment(Qt.AlignCenter)
+        self.status_label.setWordWrap(True)
+        self.status_timer = QTimer(self)
+        self.status_timer.setSingleShot(True)
+        self.status_timer.setInterval(STATUS_MESSAGE_MS)
+        self.status_timer.timeout.connect(self.status_label.clear)
+        
+        # Right panel layout
+        right_layout.addWidget(param_group, 0)
+        right_layout.addWidget(sweep_group, 0)
+        right_layout.addWidget(sensation_group, 2)
+        right_layout.addWidget(description_group, 1)
+        right_layout.addWidget(sliders_group, 1)
+        right_layout.addLayout(button_layout)
+        right_layout.addWidget(self.status_label)
+        right_layout.addStretch()
+        
+        # Main layout
+        main_layout = QHBoxLayout()
+        main_layout.addWidget(image_frame, 3)  # Ratio 3:2
+        main_layout.addWidget(right_panel, 2)
+        
+        self.setLayout(main_layout)
+        
+        log.info("Interface initialized")
+        
+        # Schedule initial image resizing after rendering
+        QApplication.instance().processEvents()
+        self.adjustImage()
+
+    def resizeEvent(self, event):
+        # Resize the image quickly while the window is being resized,
+        # then switch to smooth scaling once resizing stops
+        self.displayImage(fast=True)
+        self.smooth_resize_timer.start()
+        super().resizeEvent(event)
+
+    @timed("render.displayImage")
+    def displayImage(self, fast=False):
+        # Resize image proportionally to container
+        label_size = self.image_label.size()
+        if label_size.width() > 0 and label_size.height() > 0:
+            scaled_pixmap = self.pixmap_cache.scaled(label_size, smooth=not fast)
+            if scaled_pixmap is None:
+                return
+            self.display_pixmap = scaled_pixmap
+            self.image_label.setPixmap(scaled_pixmap)
+            
+            # Selection layers are composited by the label on top of the cached image
+            self.image_label.update()
+
+    def redrawPointMarkers(self):
+        # Get pixmap for drawing
+        pixmap = self.image_label.pixmap().copy()
+        
+        # Get rectangle of image in label
+        img_rect = self.image_label.getImageRect()
+        
+        # Calculate scale factor
+        scale_x = pixmap.width() / self.original_pixmap.width()
+        scale_y = pixmap.height() / self.original_pixmap.height()
+        
+        painter = QPainter(pixmap)
+        painter.setRenderHint(QPainter.Antialiasing)
+        
+        for x, y in self.point_markers:
+            # Convert original image coordinates to displayed pixmap coordinates
+            display_x = x * scale_x
+            display_y = y * scale_y
+            
+            # Draw marker
+            marker_size = 16
+            painter.setPen(QColor(255, 0, 0))
+            painter.setBrush(QColor(255, 0, 0, 128))
+            painter.drawEllipse(int(display_x - marker_size/2), 
+                               int(display_y - marker_size/2),
+                               marker_size, marker_size)
+        
+        painter.end()
+        self.image_label.setPixmap(pixmap)    
+        
+    def redrawAreaSelection(self, bbox=None):
+        """Draw the selected area with the lasso on the map (only bbox of the image, if given)"""
+        # The label composites the selection layers over the cached hand image when it repaints
+        if bbox is None:
+            self.image_label.update()
+        else:
+            self.image_label.updateImageRegion(bbox)
+
+    def updateSelectionOverlay(self, bbox):
+        """Bring the cached overlay up to date after the selection changed inside bbox"""
+        if self.selection_overlay.mask is not self.selected_area.mask:
+            self.selection_overlay.setMask(self.selected_area.mask)
+        else:
+            self.selection_overlay.updateRegion(bbox)
+
+    def paintSelectionLayers(self, painter, target):
+        """Composite the selection overlay and the lasso stroke into the target rectangle"""
+        if self.display_pixmap is None or self.original_pixmap.isNull():
+            return
+        
+        width, height = target.width(), target.height()
+        
+        # Calculate scale factor to convert original image coordinates to displayed coordinates
+        scale_x = width / self.original_pixmap.width()
+        scale_y = height / self.original_pixmap.height()
+        
+        # Only the visible part of the display is rendered when zoomed in
+        visible = self.image_label.visibleArea(target)
+        
+        # Saved reports below the current selection, also as a single cached image
+        heatmap, origin = self.heatmap_overlay.view(width, height, visible)
+        if heatmap is not None:
+            painter.drawImage(target.topLeft() + QPoint(*origin), heatmap)
+        
+        # Draw the selected area as a single cached overlay image
+        overlay, origin = self.selection_overlay.view(width, height, visible)
+        if overlay is not None:
+            painter.drawImage(target.topLeft() + QPoint(*origin), overlay)
+        
+        # Draw the selection area in progress (during lasso drawing)
+        # Only show the lasso stroke while actively drawing
+        if self.image_label.drawing and len(self.image_label.lasso_points) > 1:
+            dx0, dy0, dx1, dy1 = visible
+            stroke = self.image_label.stroke_layer.image(dx1 - dx0, dy1 - dy0, scale_x, scale_y,
+                                                         self.image_label.lasso_points, origin=(dx0, dy0))
+            if stroke is not None:
+                painter.drawImage(target.topLeft() + QPoint(dx0, dy0), stroke)
+
+    def setHeatmapMode(self, index):
+        """Show the heatmap of the saved reports (index of the heatmap combo box)"""
+        mode = (None, 'coverage', 'sensation')[index]
+        self.heatmap_overlay.setMode(mode)
+        if mode is not None and self.heatmap_pending:
+            self.rebuildHeatmap()
+        
+        # In sensation mode the sensation checkboxes double as the legend
+        for sensation, checkbox in self.sensation_checkboxes.items():
+            color = self.heatmap_overlay.colorOf(sensation)
+            checkbox.setStyleSheet(f"color: rgb{color};" if mode == 'sensation' else "")
+        self.other_checkbox.setStyleSheet(f"color: rgb{OTHER_SENSATION_COLOR};" if mode == 'sensation' else "")
+        self.redrawAreaSelection()
+
+    @timed("render.heatmapRebuild")
+    def rebuildHeatmap(self):
+        """Build the heatmap from all the reports of the session (reading their maps)"""
+        self.heatmap_overlay.reset()
+        for report in self.reports.values():
+            self.addReportToHeatmap(report)
+        self.heatmap_pending = False
+
+    def addReportToHeatmap(self, report):
+        """Add a saved report to the heatmap, inside the bounding box of its map only"""
+        report_map = report['Map']
+        if not hasattr(report_map, 'box'):
+            report_map = CompactMap.fromArray(report_map)
+        row, col = report_map.offset
+        height, width = report_map.box_shape
+        if height and width:
+            self.heatmap_overlay.addReport(report_map.box(), (col, row, col + width, row + height),
+                                           report_map.shape, report['Sensation'])
+
+    def updateParameterDisplay(self):
+        """Update the parameter display with current modulation values"""
+        # Clear the existing form layout
+        while self.param_layout.count() > 0:
+            item = self.param_layout.takeAt(0)
+            if item.widget():
+                item.widget().deleteLater()
+        
+        # Ricrea modulation_input since it's been deleted
+        self.modulation_input = QDoubleSpinBox()
+        self.modulation_input.setMinimumHeight(30)
+        
+        # In updateParameterDisplay method:
+        if self.modulation_type == "amplitude":
+            self.modulation_input.setRange(0.1, 50.0)
+            self.modulation_input.setSingleStep(0.10)
+            self.modulation_input.setSuffix(" mA")
+            self.modulation_input.setDecimals(2)  # 2 decimal places for current
+        elif self.modulation_type == "pulse_width":
+            self.modulation_input.setRange(1, 5000)
+            self.modulation_input.setSingleStep(1)  # Changed from 10 to 1
+            self.modulation_input.setSuffix(" μs")
+            self.modulation_input.setDecimals(0)  # No decimals for pulse width
+        else:  # frequency
+            self.modulation_input.setRange(1, 1000)
+            self.modulation_input.setSingleStep(1)
+            self.modulation_input.setSuffix(" Hz")
+            self.modulation_input.setDecimals(0)  # No decimals for frequency
+        
+        # Add modulation type label
+        mod_type_text = "Current"
+        if self.modulation_type == "pulse_width":
+            mod_type_text = "Pulse-Width"
+        elif self.modulation_type == "frequency":
+            mod_type_text = "Frequency"
+                
+        mod_type_label = QLabel(f"Modulation type: {mod_type_text}")
+        mod_type_label.setStyleSheet("font-weight: bold;")
+        self.param_layout.addRow(mod_type_label)
+        
+        # Add modulated parameter with correct formatting
+        if self.modulation_type == "amplitude":
+            self.param_layout.addRow("Current (mA):", self.modulation_input)
+        elif self.modulation_type == "pulse_width":
+            self.param_layout.addRow("Pulse width (μs):", self.modulation_input)
+        else:  # frequency
+            self.param_layout.addRow("Frequency (Hz):", self.modulation_input)
+        
+        # Add fixed parameters as labels
+        current_value = "-" if self.modulation_type == "amplitude" else f"{self.fixed_parameters['current']} mA"
+        current_label = QLabel(f"Current: {current_value}")
+        self.param_layout.addRow(current_label)
+        
+        freq_value = "-" if self.modulation_type == "frequency" else f"{self.fixed_parameters['frequency']} Hz"
+        freq_label = QLabel(f"Frequency: {freq_value}")
+        self.param_layout.addRow(freq_label)
+        
+        pw_value = "-" if self.modulation_type == "pulse_width" else f"{self.fixed_parameters['pulse_width']} μs"
+        pw_label = QLabel(f"Pulse width: {pw_value}")
+        self.param_layout.addRow(pw_label)
+        
+        # Always show interphase
+        interphase_label = QLabel(f"Interphase: {self.fixed_parameters['interphase']} μs")
+        self.param_layout.addRow(interphase_label)
+        
+        self.configureSweepInputs()
+
+    def configureSweepInputs(self):
+        """Give the sweep inputs the range and units of the modulated parameter.
+
+        A sweep in progress is stopped: the parameter it was stepping may have changed.
+        """
+        if self.sweep_start_input is None:
+            return  # Not created yet
+        self.stopSweep()
+        for spin_box in (self.sweep_start_input, self.sweep_stop_input, self.sweep_step_input):
+            spin_box.setRange(self.modulation_input.minimum(), self.modulation_input.maximum())
+            spin_box.setSingleStep(self.modulation_input.singleStep())
+            spin_box.setSuffix(self.modulation_input.suffix())
+            spin_box.setDecimals(self.modulation_input.decimals())
+        # The step must move the parameter by at least its last decimal
+        self.sweep_step_input.setMinimum(10 ** -self.modulation_input.decimals())
+        self.sweep_step_input.setValue(self.modulation_input.singleStep())
+
+    def formatModulation(self, value):
+        return f"{value:.{self.modulation_input.decimals()}f}{self.modulation_input.suffix()}"
+
+    def toggleSweep(self, checked):
+        if checked:
+            self.startSweep()
+        else:
+            self.stopSweep()
+
+    def startSweep(self):
+        """Start a sweep of the modulated parameter over the levels of the sweep inputs"""
+        self.sweep = ParameterSweep(self.sweep_start_input.value(), self.sweep_stop_input.value(),
+                                    self.sweep_step_input.value(), self.modulation_input.decimals())
+        
+        # Make room for the reports of the sweep now rather than while capturing them
+        if not hasattr(self, 'reports'):
+            self.reports = newReportStore()
+        count = len(self.reports)
+        stored = getattr(self.reports, 'nbytes', 0)
+        per_report = stored // count if count and stored else SWEEP_REPORT_BYTES
+        self.reports.reserve(len(self.sweep) * per_report)
+        
+        # The parameter follows the planned levels until the sweep ends or is stopped
+        for widget in (self.modulation_input, self.sweep_start_input, self.sweep_stop_input, self.sweep_step_input):
+            widget.setEnabled(False)
+        self.sweep_button.setText("Stop Sweep")
+        self.modulation_input.setValue(self.sweep.value)
+        self.updateSweepStatus()
+        log.info("Started a sweep of %d levels from %s to %s", len(self.sweep),
+                 self.formatModulation(self.sweep.levels[0]), self.formatModulation(self.sweep.levels[-1]))
+
+    def stopSweep(self):
+        self.sweep = None
+        for widget in (self.modulation_input, self.sweep_start_input, self.sweep_stop_input, self.sweep_step_input):
+            widget.setEnabled(True)
+        self.sweep_button.blockSignals(True)
+        self.sweep_button.setChecked(False)
+        self.sweep_button.blockSignals(False)
+        self.sweep_button.setText("Start Sweep")
+        self.sweep_label.clear()
+
+    def advanceSweep(self):
+        """Step the parameter to the next level of the sweep after a saved report"""
+        if self.sweep.advance():
+            self.modulation_input.setValue(self.sweep.value)
+            self.updateSweepStatus()
+            return
+        count = len(self.sweep)
+        self.stopSweep()
+        self.sweep_label.setText(f"Sweep complete: {count} levels captured")
+        log.info("Sweep complete: %d levels captured", count)
+
+    def updateSweepStatus(self):
+        self.sweep_label.setText(f"Level {self.sweep.index + 1} of {len(self.sweep)}: "
+                                 f"{self.formatModulation(self.sweep.value)}")
+
+    def showStatus(self, text):
+        """Show a message under the buttons for a few seconds"""
+        self.status_label.setText(text)
+        self.status_timer.start()
+
+
+    def adjustImage(self):
+        """Ensure image is correctly sized at application startup"""
+        # Force layout calculation
+        self.layout().activate()
+        QApplication.instance().processEvents()
+        
+        # Resize image based on current label size
+        self.displayImage()
+          
+    def showEvent(self, event):
+        """Handles initial window display event"""
+        super().showEvent(event)
+        # Schedule image adjustment after display
+        QApplication.instance().processEvents()
+        self.adjustImage()
+        
+    def clearSelection(self):
+        """Clear the currently selected area"""
+        if self.selected_area:
+            # Record the whole selection as one edit, so that clearing can be undone
+            x0, y0, x1, y1 = self.selected_area.bbox
+            roi = self.selected_area.mask[y0:y1, x0:x1]
+            strokes = self.selection_vectors.entries() if self.selection_vectors is not None else []
+            self.selection_history.record(SelectionEdit((x0, y0, x1, y1), roi, np.zeros_like(roi),
+                                                        removed_strokes=strokes))
+            self.updateHistoryButtons()
+            
+            self.selected_area = None
+            self.selection_vectors = None
+            self.click_position = (None, None)
+            self.selection_overlay.clear()
+            self.displayImage()
+            log.info("Selection cleared")
+
+    @timed("selection.undo")
+    def undoSelection(self):
+        """Revert the last lasso stroke or clear"""
+        self.applyHistoryStep(undo=True)
+
+    @timed("selection.redo")
+    def redoSelection(self):
+        """Reapply the last undone lasso stroke or clear"""
+        self.applyHistoryStep(undo=False)
+
+    def applyHistoryStep(self, undo):
+        if not (self.selection_history.canUndo() if undo else self.selection_history.canRedo()):
+            return
+        if self.image_label.drawing or self.export_worker is not None:
+            return
+        
+        if self.selected_area is None:
+            if self.hand_region is not None:
+                height, width = self.hand_region.shape
+            else:
+                height, width = self.original_pixmap.height(), self.original_pixmap.width()
+            self.selected_area = SelectionMask.empty(height, width)
+        if self.selection_vectors is None:
+            self.selection_vectors = SelectionVectors(self.hand_side, self.hand_region_id,
+                                                      self.selected_area.shape)
+        
+        # Toggle the pixels changed by the edit, inside its bounding box only
+        if undo:
+            edit = self.selection_history.undo(self.selected_area)
+            removed, added = edit.added_strokes, edit.removed_strokes
+        else:
+            edit = self.selection_history.redo(self.selected_area)
+            removed, added = edit.removed_strokes, edit.added_strokes
+        
+        self.selection_vectors.removeStrokes(removed)
+        self.selection_vectors.appendStrokes(added)
+        
+        self.updateSelectionOverlay(edit.bbox)
+        self.click_position = self.selected_area.normalizedCentroid or (None, None)
+        self.updateHistoryButtons()
+        self.redrawAreaSelection(edit.bbox)
+
+    def updateHistoryButtons(self):
+        self.undo_button.setEnabled(self.selection_history.canUndo())
+        self.redo_button.setEnabled(self.selection_history.canRedo())
+
+    def returnToSelection(self):
+        """Return to the selection screen"""
+        if hasattr(self, 'reports') and len(self.reports) > 0:
+            reply = QMessageBox.question(self, 'Warning', 
+                                        'All reports saved so far will be deleted. Do you want to continue?',
+                                        QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+            if reply == QMessageBox.No:
+                # User chose to cancel
+                return
+        # Hide the main window
+        self.hide()
+        if self.journal is not None:
+            # The reports are dropped from the session, but the journal is kept aside on disk
+            self.journal.discard()
+            self.journal = None
+        self.journal_failed = False
+        self.selected_area = None
+        self.selection_vectors = None
+        self.selection_history.clear()
+        self.updateHistoryButtons()
+        self.selection_overlay.clear()
+        self.setReports(newReportStore())
+        # Show the selection screen again (this is done through the main script)
+        if hasattr(self, 'selection_screen'):
+            self.selection_screen.show()
+
+    
+    def updateFromSelectionScreen(self, data):
+        """Update the interface based on parameters from the selection screen"""
+        self.selection_data = data
+        
+        # Store the selected hand
+        self.hand_side = data["hand"]  # "right" or "left"
+        
+        # Store modulation info
+        self.modulation_type = data["modulation"]["type"]
+        self.modulation_param_name = data["modulation"]["param_name"]
+
+        # Store patient ID and device name
+        self.patient_id = data.get("patient_id", "")
+        self.device_name = data.get("device_name", "")
+            
+        # Store fixed parameters
+        self.fixed_parameters = data["parameters"]
+        
+        # Store stimulation types
+        self.stimulation_types = data["stimulation"]
+        
+        # Load the appropriate hand image and the matching hand mask
+        self.loadHandAssets()
+        
+        self.displayImage()
+        
+        # Update the modulation parameter input and set correct value based on modulation type
+        if self.modulation_type == "amplitude":
+            self.modulation_input.setRange(0.1, 20.0)
+            self.modulation_input.setSingleStep(0.10)
+            self.modulation_input.setSuffix(" mA")
+            self.modulation_input.setDecimals(2)  # 2 decimal places for current
+            # Default value is 1.0 but only set if we don't have a current parameter
+            if self.fixed_parameters["current"] is None:
+                self.modulation_input.setValue(1.0)
+            else:
+                # Use the fixed current as the starting value
+                self.modulation_input.setValue(float(self.fixed_parameters["current"]))
+        elif self.modulation_type == "pulse_width":
+            self.modulation_input.setRange(1, 1000)
+            self.modulation_input.setSingleStep(1)  # Changed from 10 to 1
+            self.modulation_input.setSuffix(" μs")
+            self.modulation_input.setDecimals(0)  # No decimals for pulse width
+            # Default value is 200 but only set if we don't have a pulse width parameter
+            if self.fixed_parameters["pulse_width"] is None:
+                self.modulation_input.setValue(200)
+            else:
+                # Use the fixed pulse width as the starting value
+                self.modulation_input.setValue(float(self.fixed_parameters["pulse_width"]))
+        else:  # frequency
+            self.modulation_input.setRange(1, 1000)
+            self.modulation_input.setSingleStep(1)
+            self.modulation_input.setSuffix(" Hz")
+            self.modulation_input.setDecimals(0)  # No decimals for frequency
+            # Default value is 50 but only set if we don't have a frequency parameter
+            if self.fixed_parameters["frequency"] is None:
+                self.modulation_input.setValue(50)
+            else:
+                # Use the fixed frequency as the starting value
+                self.modulation_input.setValue(float(self.fixed_parameters["frequency"]))
+        
+        # Update the parameter display instead of updating individual labels
+        self.updateParameterDisplay()
+
+    def loadHandAssets(self):
+        """Load the image and mask of the selected hand from the process-wide asset registry"""
+        assets = HandAssetRegistry.instance().get(self.hand_side)
+        if self.original_pixmap is not assets.pixmap():
+            self.original_pixmap = assets.pixmap()
+            self.pixmap_cache.setSource(self.original_pixmap)
+            self.image_pyramid = None
+            self.image_label.resetView()
+        self.loadHandMask(assets)
+
+    def imagePyramid(self):
+        """Tiled levels of the hand image, built on first use"""
+        if self.image_pyramid is None:
+            self.image_pyramid = ImagePyramid(self.original_pixmap.toImage())
+        return self.image_pyramid
+
+    def loadHandMask(self, assets=None):
+        """Load the binary mask for the selected hand (right or left)"""
+        if assets is None:
+            assets = HandAssetRegistry.instance().get(self.hand_side)
+        
+        # The registry keeps the hand region precomputed and lossless, so
+        # each lasso stroke only has to AND against it
+        self.hand_region = assets.region
+        self.hand_region_id = assets.region_id
+        self.hand_labels = assets.labels
+        if self.hand_region is None:
+            log.error("Error: %s", assets.error)
+            QMessageBox.warning(self, "Warning", assets.error)
+        else:
+            log.info("Hand mask loaded from %s", assets.region_source)
+            if self.hand_labels is None:
+                log.warning("No anatomical labels for the %s hand, reports will have no region summary%s",
+                            self.hand_side, f" ({assets.label_error})" if assets.label_error else "")
+
+    def sessionData(self):
+        """Return the session parameters in the format emitted by the selection screen"""
+        if self.selection_data is not None:
+            return self.selection_data
+        return {
+            "hand": self.hand_side,
+            "modulation": {
+                "type": self.modulation_type,
+                "param_name": self.modulation_param_name
+            },
+            "parameters": self.fixed_parameters,
+            "stimulation": self.stimulation_types,
+            "patient_id": self.patient_id,
+            "device_name": self.device_name
+        }
+
+    @timed("journal.append")
+    def journalReport(self, report_key, report):
+        """Append a saved report to the session journal, creating the journal on first use"""
+        if self.journal_failed:
+            return
+        try:
+            if self.journal is None:
+                timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+                name = f"{self.patient_id or 'session'}_{timestamp}"
+                self.journal = SessionJournal.create(journalDirectory(), self.sessionData(), name)
+                log.info("Session journal created at %s", self.journal.path)
+            self.journal.appendReport(report_key, report)
+        except Exception as e:
+            # Keep the report in memory; the export will fall back to the in-memory reports
+            self.journal_failed = True
+            log.error("Error writing session journal: %s", e)
+            QMessageBox.warning(self, "Warning", f"The report could not be written to the session journal: {e}")
+
+    def setReports(self, reports):
+        """Replace the reports of the session, releasing the previous report store"""
+        if hasattr(self, 'reports') and hasattr(self.reports, 'close'):
+            self.reports.close()
+        self.reports = reports
+        # The rows of the new reports are added as they are exported (which reads their maps)
+        self.report_table = ReportTable(self.sensation_types)
+        
+        # Rebuild the heatmap from the reports of the new session (if any), but only once
+        # it is shown: this is what reads the maps of the reports
+        self.heatmap_overlay.reset()
+        self.heatmap_pending = len(reports) > 0
+        if self.heatmap_overlay.mode is not None and self.heatmap_pending:
+            self.rebuildHeatmap()
+
+    def offerSessionRecovery(self):
+        """Offer to recover the most recent session that was not exported (e.g. after a crash)"""
+        try:
+            journals = SessionJournal.findUnfinished(journalDirectory())
+        except Exception as e:
+            log.error("Error looking for session journals: %s", e)
+            return False
+        
+        for path in journals:
+            reply = QMessageBox.question(self, 'Recover Session',
+                                         f'An unfinished session was found:\n{os.path.basename(path)}\n\n'
+                                         'Do you want to recover it?',
+                                         QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
+            if reply == QMessageBox.Yes:
+                return self.recoverSession(path)
+            # Do not offer this journal again, but keep it on disk
+            SessionJournal(path).discard()
+        return False
+
+    def recoverSession(self, path):
+        """Restore the parameters and reports of a journaled session and continue it"""
+        try:
+            journal = SessionJournal.open(path)
+            session = journal.session()
+            if session is not None and session.get("resumed_from"):
+                # The journal only holds the reports added to a resumed session file
+                reports = SessionFileReportStore(openSession(session["resumed_from"]), newReportStore())
+            else:
+                reports = newReportStore()
+            reports.update(journal.iterReports())
+        except Exception as e:
+            log.error("Error recovering session from %s: %s", path, e)
+            QMessageBox.critical(self, "Error", f"Error recovering the session: {e}")
+            return False
+        
+        if session is None:
+            journal.close()
+            QMessageBox.warning(self, "Warning", "The session journal does not contain session data.")
+            return False
+        
+        self.updateFromSelectionScreen(session)
+        self.setReports(reports)
+        self.journal = journal
+        self.journal_failed = False
+        log.info("Recovered session from %s with %d reports", path, len(reports))
+        
+        if hasattr(self, 'selection_screen'):
+            self.selection_screen.hide()
+        self.show()
+        return True
+
+    @timed("session.resume")
+    def resumeSession(self, path):
+        """Continue the session of a file saved earlier: restore its parameters and reports.
+
+        The reports stay in the file until they are needed, so even a large session
+        reopens at once; exporting again writes them along with the new reports.
+        """
+        if hasattr(self, 'reports') and len(self.reports) > 0:
+            reply = QMessageBox.question(self, 'Warning',
+                                         'All reports saved so far will be deleted. Do you want to continue?',
+                                         QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+            if reply == QMessageBox.No:
+                return False
+        reader = None
+        try:
+            reader = openSession(path)
+            session = sessionFromHeader(reader.header, path)
+            reports = SessionFileReportStore(reader, newReportStore())
+        except Exception as e:
+            if reader is not None:
+                reader.close()
+            log.error("Error resuming session from %s: %s", path, e)
+            QMessageBox.critical(self, "Error", f"Error opening the session file: {e}")
+            return False
+        
+        if self.journal is not None:
+            # Like returning to the selection screen: the current reports are dropped
+            self.journal.discard()
+            self.journal = None
+        self.journal_failed = False
+        self.selected_area = None
+        self.selection_vectors = None
+        self.selection_history.clear()
+        self.updateHistoryButtons()
+        self.selection_overlay.clear()
+        
+        self.updateFromSelectionScreen(session)
+        self.setReports(reports)
+        log.info("Resumed session from %s with %d reports", path, len(reports))
+        
+        if hasattr(self, 'selection_screen'):
+            self.selection_screen.setSessionData(session)
+            self.selection_screen.hide()
+        self.show()
+        return True
+
+    def save_and_exit(self):
+        """Save all data to a MATLAB struct file and exit the application"""
+        from PyQt5.QtWidgets import QMessageBox
+        
+        # Check if there are any saved sensations
+        if not hasattr(self, 'reports') or len(self.reports) == 0:
+            reply = QMessageBox.question(self, 'Exit Confirmation', 
+                                        'No sensations have been saved. Exit anyway?',
+                                        QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+            if reply == QMessageBox.Yes:
+                QApplication.quit()
+            return
+        
+        # Dialog to select file
+        default_dir = os.path.join(os.getcwd(), "Saving_folder")
+        if not os.path.exists(default_dir):
+            os.makedirs(default_dir)
+            
+        # Each available export backend is offered as a file type
+        backends = availableBackends()
+        resumed_from = self.sessionData().get("resumed_from")
+        filename, selected_filter = QFileDialog.getSaveFileName(
+            self, "Save Session Data", 
+            resumed_from or os.path.join(default_dir, f"{self.patient_id}_session.mat"),
+            ";;".join(backend.file_filter for backend in backends)
+        )
+        
+        if not filename:
+            # User cancelled
+            return
+        
+        backend_class = next((backend for backend in backends if backend.file_filter == selected_filter),
+                             backends[0])
+        
+        # Debug: Print the reports before saving
+        log.debug("Reports before saving: %s", list(self.reports.keys()))
+        
+        # Create the MATLAB struct for main data
+        matlab_data = {}
+        
+        # Add general session information
+        matlab_data['Date'] = datetime.datetime.now().strftime("%Y/%m/%d %H:%M")
+        matlab_data['PatientID'] = self.patient_id
+        matlab_data['DeviceName'] = self.device_name
+        matlab_data['Hand'] = self.hand_side.capitalize()
+        matlab_data['ModulationType'] = self.modulation_type
+        
+        
+        # Determine which nerve was stimulated
+        nerve = "None"
+        if self.stimulation_types["median_nerve"] and self.stimulation_types["ulnar_nerve"]:
+            nerve = "Both"
+        elif self.stimulation_types["median_nerve"]:
+            nerve = "Median"
+        elif self.stimulation_types["ulnar_nerve"]:
+            nerve = "Ulnar"
+        matlab_data['Nerve'] = nerve
+        
+        # Add stimulation parameters
+        matlab_data['InterphaseDistance_us'] = self.fixed_parameters['interphase']
+        
+        # Set parameters based on modulation type
+        if self.modulation_type == "amplitude":
+            matlab_data['Current'] = np.array([])  # Empty array for modulated parameter
+            matlab_data['Frequency'] = self.fixed_parameters['frequency']
+            matlab_data['PulseWidth'] = self.fixed_parameters['pulse_width']
+        elif self.modulation_type == "frequency":
+            matlab_data['Current'] = self.fixed_parameters['current']
+            matlab_data['Frequency'] = np.array([])  # Empty array for modulated parameter
+            matlab_data['PulseWidth'] = self.fixed_parameters['pulse_width']
+        else:  # pulse_width
+            matlab_data['Current'] = self.fixed_parameters['current']
+            matlab_data['Frequency'] = self.fixed_parameters['frequency']
+            matlab_data['PulseWidth'] = np.array([])  # Empty array for modulated parameter
+        
+        matlab_data['MotorThreshold'] = self.fixed_parameters['motor_threshold']
+        matlab_data['SensoryThreshold'] = self.fixed_parameters['sensory_threshold']
+        
+        # Build the export from the session journal when it holds every report
+        # (records are in save order); otherwise use the session's reports.
+        # Either way the reports are read one at a time while the file is written.
+        if self.journal is not None and not self.journal_failed and not resumed_from:
+            report_items = self.journal.iterReports()
+        else:
+            # Sort the keys to ensure they're in order
+            sorted_keys = sorted(self.reports.keys(), key=lambda x: int(x))
+            report_items = ((report_key, self.reports[report_key]) for report_key in sorted_keys)
+
+        # The maps of a resumed session are read from its file during the export, so
+        # overwriting it goes through a temporary file that replaces it at the end
+        self.export_target = None
+        if resumed_from and os.path.exists(filename) and os.path.samefile(filename, resumed_from):
+            base, ext = os.path.splitext(filename)
+            self.export_target, filename = filename, f"{base}.partial{ext}"
+
+        # Write the file in the background so the window stays responsive, followed
+        # by the table of the reports next to it (the reports missing from the table,
+        # e.g. those of a resumed session, are added as they are written)
+        self.startExport(filename, matlab_data, report_items, backend_class(), len(self.reports),
+                         summary=(self.report_table, summaryPath(self.export_target or filename)))
+
+    def startExport(self, filename, matlab_data, report_items, backend, report_count=None, summary=None):
+        """Run the export on the export thread, showing its progress"""
+        self.setExportControlsEnabled(False)
+        
+        self.export_progress = QProgressDialog("Saving session data...", None, 0, 0, self)
+        self.export_progress.setWindowTitle("Saving")
+        self.export_progress.setWindowModality(Qt.WindowModal)
+        self.export_progress.setMinimumDuration(0)
+        self.export_progress.setAutoClose(False)
+        self.export_progress.show()
+        
+        log.info("Exporting session with the %s backend", backend.name)
+        self.export_worker = SessionExportWorker(filename, matlab_data, report_items, backend,
+                                                 report_count=report_count, summary=summary)
+        self.export_worker.setAutoDelete(False)
+        self.export_worker.signals.progress.connect(self.onExportProgress)
+        self.export_worker.signals.finished.connect(self.onExportFinished)
+        self.export_worker.signals.failed.connect(self.onExportFailed)
+        self.export_pool.start(self.export_worker)
+
+    def setExportControlsEnabled(self, enabled):
+        """Enable or disable the controls that must not be used while exporting"""
+        for button in (self.save_button, self.save_exit_button, self.return_button, self.clear_button,
+                       self.undo_button, self.redo_button, self.sweep_button):
+            button.setEnabled(enabled)
+        self.save_shortcut.setEnabled(enabled)
+        if enabled:
+            self.updateHistoryButtons()
+
+    def onExportProgress(self, done, total, message):
+        progress = self.export_progress
+        if progress is not None:
+            # setValue() may process pending events (including the end of the export)
+            progress.setLabelText(message)
+            progress.setMaximum(total)
+            progress.setValue(done)
+
+    def onExportFinished(self, filename):
+        """Called once the worker has written the file: clean up and quit"""
+        self.closeExportProgress()
+        
+        # The session is safely exported: its journal is no longer needed
+        if self.journal is not None:
+            self.journal.remove()
+            self.journal = None
+        self.setReports(newReportStore())
+        
+        if self.export_target is not None:
+            # The resumed file is closed: it can now be replaced by the new export
+            try:
+                os.replace(filename, self.export_target)
+            except OSError as e:
+                log.error("Error replacing %s: %s", self.export_target, e)
+                QMessageBox.critical(self, "Error", f"The session was saved to {filename}, "
+                                     f"but {self.export_target} could not be replaced: {e}")
+                QApplication.quit()
+                return
+            filename, self.export_target = self.export_target, None
+        log.info("Session data saved to %s", filename)
+        
+        QMessageBox.information(self, "Success", "Session data saved successfully!")
+        QApplication.quit()
+
+    def onExportFailed(self, error):
+        self.closeExportProgress()
+        if self.export_target is not None:
+            base, ext = os.path.splitext(self.export_target)
+            removeFile(f"{base}.partial{ext}")
+            self.export_target = None
+        self.setExportControlsEnabled(True)
+        QMessageBox.critical(self, "Error", f"Error saving session data: {error}")
+
+    def closeExportProgress(self):
+        if self.export_progress is not None:
+            self.export_progress.close()
+            self.export_progress = None
+        self.export_worker = None
+
+    @timed("report.save")
+    def save_data(self):
+        # If no point or area has been selected
+        if not self.selected_area:
+            from PyQt5.QtWidgets import QMessageBox
+            QMessageBox.warning(self, "Warning", "Select an area on the image before saving.")
+            return
+            
+        # Get selected sensation types
+        selected_sensations = []
+        for sensation, checkbox in self.sensation_checkboxes.items():
+            if checkbox.isChecked():
+                selected_sensations.append(sensation)
+        
+        # Add custom sensation if selected
+        if self.other_checkbox.isChecked() and self.other_textfield.toPlainText().strip():
+            selected_sensations.append(f"Other: {self.other_textfield.toPlainText().strip()}")
+
+        # Check if any sensation types were selected
+        if not selected_sensations:
+            from PyQt5.QtWidgets import QMessageBox
+            QMessageBox.warning(self, "Warning", "Please select at least one sensation type.")
+            return
+        
+        # Initialize reports list if it doesn't exist
+        if not hasattr(self, 'reports'):
+            self.reports = newReportStore()
+        
+        # Get the next report number (after those of a resumed session, whatever their numbering)
+        report_num = max((int(key) for key in self.reports), default=0) + 1
+        
+        # Store the binary map of the selected area in compact form (bounding box + packed bits)
+        map_matrix = CompactMap.fromArray(self.selected_area.mask, bbox=self.selected_area.bbox)
+        self.selection_overlay.clear()
+        
+        # Selected pixels per anatomical zone and nerve territory, in one pass over the bounding box
+        region_pixels, nerve_pixels = {}, {}
+        if self.hand_labels is not None and self.hand_labels.shape == self.selected_area.shape:
+            region_pixels, nerve_pixels = self.hand_labels.summarize(self.selected_area.mask,
+                                                                     self.selected_area.bbox)
+        # Create a report entry
+        report = {
+            'Map': map_matrix,
+            'ModulatedParameter': self.modulation_input.value(),
+            'Sensation': selected_sensations,
+            'AdditionalDescription': self.description_box.toPlainText(),
+            'Naturalness': self.natural_slider.value(),
+            'Painfulness': self.pain_slider.value(),
+            'UnderElectrodeSensation': self.electrode_slider.value(),
+            'Strokes': self.selection_vectors,
+            'RegionPixels': region_pixels,
+            'NervePixels': nerve_pixels
+        }
+        
+        # Add report to the list and write it to the session journal right away
+        self.reports[str(report_num)] = report
+        self.journalReport(str(report_num), report)
+        self.report_table.add(str(report_num), report, self.selected_area.area, self.selected_area.centroid)
+        
+        # Add it to the heatmap of the session, inside its bounding box only
+        # (unless the heatmap is still to be rebuilt, which will include it)
+        if not self.heatmap_pending:
+            x0, y0, x1, y1 = self.selected_area.bbox
+            self.heatmap_overlay.addReport(self.selected_area.mask[y0:y1, x0:x1], (x0, y0, x1, y1),
+                                           self.selected_area.shape, selected_sensations)
+        
+        # Clear fields for next recording
+        self.description_box.clear()
+        self.natural_slider.setValue(5)
+        self.pain_slider.setValue(0)
+        self.electrode_slider.setValue(5)
+        
+        # Reset all checkboxes
+        for checkbox in self.sensation_checkboxes.values():
+            checkbox.setChecked(False)
+        self.other_checkbox.setChecked(False)
+        self.other_textfield.clear()
+        self.other_textfield.setEnabled(False)
+        
+        # Reset selected area and click position; the saved selection can no longer be undone
+        self.selected_area = None
+        self.selection_vectors = None
+        self.selection_history.clear()
+        self.updateHistoryButtons()
+        self.click_position = (None, None)
+        
+        # Update display
+        self.displayImage()  # Aggiornamento completo dell'immagine
+        
+        regions = describeRegions(region_pixels, nerve_pixels).replace("\n", "; ")
+        self.showStatus(f"Sensation #{report_num} saved at {self.formatModulation(report['ModulatedParameter'])}"
+                        + (f" — {regions}" if regions else ""))
+        
+        # In a sweep, move on to the next level right away
+        if self.sweep is not None:
+            self.advanceSweep()
+            
+    @timed("selection.lasso")
+    def processLassoSelection(self, lasso_points, erase=False):
+        """Process the lasso points and check intersection with hand mask,
+        uniting with any previously selected area (or subtracting from it when erasing)
+        
+        Args:
+            lasso_points: List of (x, y) tuples representing the lasso polygon points
+            erase: Remove the lasso area from the selection instead of adding it
+            
+        Returns:
+            bool: True if the selection changed (for additions: if the area intersects
+            with the hand mask), False otherwise
+        """
+
+        
+        if self.hand_region is None:
+            # If no mask is loaded, accept all selections
+            log.warning("Warning: No hand mask loaded, accepting all selections")
+            
+        try:
+            if self.hand_region is not None:
+                mask_height, mask_width = self.hand_region.shape
+            else:
+                mask_height, mask_width = self.original_pixmap.height(), self.original_pixmap.width()
+            
+            # Convert the lasso points once (the stroke is simplified from the same array),
+            # then to integers in opencv format
+            lasso_points = np.asarray(lasso_points, dtype=np.float64)
+            points = lasso_points.astype(np.int32)
+            
+            # Restrict all the work to the bounding box of the lasso, clipped to the image
+            x, y, w, h = cv2.boundingRect(points)
+            x0, y0 = max(x, 0), max(y, 0)
+            x1, y1 = min(x + w, mask_width), min(y + h, mask_height)
+            
+            selected_pixels = 0
+            if x1 > x0 and y1 > y0:
+                # Draw the lasso polygon on a mask the size of its bounding box (255 = white/selected)
+                lasso_mask = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+                cv2.fillPoly(lasso_mask, [points - (x0, y0)], 255)
+                
+                # Calculate the intersection between lasso selection and hand region
+                # (not needed to erase: nothing outside the hand is selected)
+                if erase:
+                    roi_intersection = lasso_mask
+                elif self.hand_region is not None:
+                    roi_intersection = cv2.bitwise_and(lasso_mask, self.hand_region[y0:y1, x0:x1])
+                else:
+                    roi_intersection = lasso_mask
+                selected_pixels = cv2.countNonZero(roi_intersection)
+            
+            if erase:
+                if not self.selected_area or selected_pixels == 0:
+                    log.info("Nothing to erase")
+                    return False
+            
+            # Check if the intersection is empty
+            elif selected_pixels == 0:
+                # No intersection with the hand
+                log.info("Selected area is completely outside the hand region")
+                from PyQt5.QtWidgets import QMessageBox
+                QMessageBox.warning(self, "Warning", "The selection must intersect with the hand area.")
+                return False
+            
+            # Merge the new region into (or remove it from) the accumulated selection,
+            # in place and inside the box only
+            if self.selected_area is None:
+                self.selected_area = SelectionMask.empty(mask_height, mask_width)
+            bbox = (x0, y0, x1, y1)
+            roi = self.selected_area.mask[y0:y1, x0:x1]
+            before = roi.copy()
+            if erase:
+                cv2.bitwise_and(roi, cv2.bitwise_not(roi_intersection), dst=roi)
+                if np.array_equal(before, roi):
+                    log.info("Nothing to erase")
+                    return False
+            else:
+                cv2.bitwise_or(roi, roi_intersection, dst=roi)
+            self.selected_area.regionChanged(bbox, before)
+            self.updateSelectionOverlay(bbox)
+            
+            # Keep the stroke itself, simplified, to be able to re-render the selection later
+            if self.selection_vectors is None:
+                self.selection_vectors = SelectionVectors(self.hand_side, self.hand_region_id,
+                                                          (mask_height, mask_width))
+            stroke = self.selection_vectors.addStroke(lasso_points, erase)
+            
+            # Record the change of the bounding box for undo
+            self.selection_history.record(SelectionEdit(bbox, before, roi, added_strokes=[stroke]))
+            self.updateHistoryButtons()
+            
+            # Center of the selected area (normalized to the image size), from the image moments
+            self.click_position = self.selected_area.normalizedCentroid or (None, None)
+            if self.selected_area:
+                log.debug("Area %s with center at coordinates: (%.1f, %.1f)",
+                          "erased" if erase else "selected", *self.click_position)
+            else:
+                log.debug("Selection erased entirely")
+            
+            return True
+            
+        except Exception as e:
+            log.error("Error processing lasso selection: %s", e)
+            return False
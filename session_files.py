@@ -0,0 +1,214 @@
+import re
+
+import numpy as np
+import scipy.io as sio
+
+from report_maps import LazyMap
+from selection_vectors import SelectionVectors
+
+try:
+    import h5py
+except ImportError:  # h5py is optional: without it only MAT v5 session files can be read
+    h5py = None
+
+REPORT_FIELD = re.compile(r'report_(\d+)$')
+
+
+def headerText(value):
+    """Normalize a char field of a session file to a str ('' if it is empty).
+
+    loadmat returns an empty char array for an empty string, and bytes or 0-d arrays
+    may stand for short strings, none of which str() converts as intended.
+    """
+    if value is None:
+        return ''
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    if isinstance(value, np.ndarray):
+        if value.size == 0:
+            return ''
+        if value.size == 1:
+            return headerText(value.item())
+        return ''.join(headerText(item) for item in value.ravel())
+    return str(value)
+
+
+def sensationList(value):
+    """Normalize a Sensation field (string, cell array or list) to a list of strings"""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value] if value else []
+    return [str(item) for item in np.asarray(value, dtype=object).ravel() if str(item)]
+
+
+def strokeList(value):
+    """Normalize a Strokes field (cell array of N x 2 vertex arrays) to a list of arrays"""
+    if value is None or isinstance(value, str):
+        return []
+    if isinstance(value, np.ndarray) and value.dtype != object:
+        # A cell array with a single stroke is loaded as the stroke itself
+        return [value.reshape(-1, 2)] if value.size else []
+    return [np.asarray(stroke, dtype=np.float64).reshape(-1, 2) for stroke in value]
+
+
+def eraseFlags(value, count):
+    """Normalize a StrokeErase field to one bool per stroke (files without it only added)"""
+    flags = [bool(flag) for flag in np.atleast_1d(np.asarray(value if value is not None else [])).ravel()]
+    return flags if len(flags) == count else [False] * count
+
+
+def normalizeReport(report):
+    """Normalize the fields of a report read from a session file (both formats)"""
+    report['Sensation'] = sensationList(report.get('Sensation'))
+    report['Strokes'] = strokeList(report.get('Strokes'))
+    report['StrokeErase'] = eraseFlags(report.get('StrokeErase'), len(report['Strokes']))
+    return report
+
+
+class MatV5SessionReader:
+    """Reads a session file written by the MAT v5 export backend.
+
+    MAT v5 files have no random access: the whole 'data' variable is decoded on open.
+    """
+    def __init__(self, path):
+        self.path = path
+        data = sio.loadmat(path, simplify_cells=True)['data']
+        self._reports = data.pop('report', None) or {}
+        self.header = data
+
+    def reportKeys(self):
+        """Numbers of the reports in the file, in order"""
+        keys = [int(match.group(1)) for match in map(REPORT_FIELD.match, self._reports) if match]
+        return sorted(keys)
+
+    def report(self, key):
+        report = self.reportFields(key)
+        report['Map'] = self.readMap(key)
+        return report
+
+    def reportFields(self, key):
+        """The fields of a report, without its map"""
+        report = {name: value for name, value in self._reports[f'report_{int(key)}'].items() if name != 'Map'}
+        return normalizeReport(report)
+
+    def readMap(self, key):
+        return np.asarray(self._reports[f'report_{int(key)}']['Map'])
+
+    def mapShape(self, key):
+        return np.shape(self._reports[f'report_{int(key)}']['Map'])
+
+    def close(self):
+        self._reports = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class Hdf5SessionReader:
+    """Reads a session file written by the MATLAB v7.3 (HDF5) export backend.
+
+    Only the session header is decoded on open; each report, and its map, is read
+    from the file when it is requested.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = h5py.File(path, 'r')
+        data = self.file['data']
+        self.header = {name: self._read(data[name]) for name in data if name != 'report'}
+
+    def reportKeys(self):
+        reports = self.file['data'].get('report', {})
+        keys = [int(match.group(1)) for match in map(REPORT_FIELD.match, reports) if match]
+        return sorted(keys)
+
+    def report(self, key):
+        report = self.reportFields(key)
+        report['Map'] = self.readMap(key)
+        return report
+
+    def reportFields(self, key):
+        """The fields of a report, without reading its map"""
+        group = self.file[f'data/report/report_{int(key)}']
+        return normalizeReport({name: self._read(group[name]) for name in group if name != 'Map'})
+
+    def readMap(self, key):
+        return self._readArray(self.file[f'data/report/report_{int(key)}/Map'])
+
+    def mapShape(self, key):
+        # Stored transposed (MATLAB is column-major)
+        return self.file[f'data/report/report_{int(key)}/Map'].shape[::-1]
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _read(self, node):
+        """Decode a MATLAB value stored as written by Hdf5Backend"""
+        matlab_class = node.attrs.get('MATLAB_class', b'')
+        matlab_class = matlab_class.decode() if isinstance(matlab_class, bytes) else str(matlab_class)
+
+        if isinstance(node, h5py.Group):
+            return {name: self._read(node[name]) for name in node}
+
+        empty = bool(node.attrs.get('MATLAB_empty', 0))
+        if matlab_class == 'char':
+            return '' if empty else node[()].ravel().astype(np.uint16).tobytes().decode('utf-16-le')
+        if matlab_class == 'cell':
+            if empty:
+                return []
+            return [self._read(self.file[ref]) for ref in node[()].ravel()]
+        if empty:
+            return np.array([])
+
+        value = self._readArray(node)
+        return value.item() if value.size == 1 else value
+
+    @staticmethod
+    def _readArray(node):
+        # Stored transposed (MATLAB is column-major)
+        value = node[()].T
+        if node.attrs.get('MATLAB_class', b'') in (b'logical', 'logical'):
+            value = value.astype(bool)
+        return value
+
+
+def openSession(path):
+    """Open a session file with the reader matching its format"""
+    if h5py is not None and h5py.is_hdf5(path):
+        return Hdf5SessionReader(path)
+    return MatV5SessionReader(path)
+
+
+def sessionReport(reader, key, hand):
+    """A report of a session file in the form the app keeps the reports of a session.
+
+    Its map is a LazyMap, read from the file only when the report is displayed or
+    exported again, and its strokes become SelectionVectors again.
+    """
+    report = reader.reportFields(key)
+    shape = reader.mapShape(key)
+    report['Map'] = LazyMap(shape, lambda: reader.readMap(key))
+
+    strokes, erased = report.pop('Strokes'), report.pop('StrokeErase')
+    region_id = report.pop('HandMaskId', None)
+    report['Strokes'] = SelectionVectors(
+        hand, region_id if isinstance(region_id, str) and region_id else None, shape,
+        [stroke.astype(np.float32) for stroke in strokes], erased) if strokes else None
+
+    description = report.get('AdditionalDescription')
+    report['AdditionalDescription'] = description if isinstance(description, str) else ''
+    for name in ('RegionPixels', 'NervePixels'):
+        if not isinstance(report.get(name), dict):
+            report[name] = {}
+    return report
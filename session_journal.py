@@ -0,0 +1,142 @@
+import glob
+import json
+import os
+import struct
+import zlib
+
+from instrumentation import log, span
+from report_maps import CompactMap
+from selection_vectors import SelectionVectors
+
+# Every record is written as: length (uint32) | crc32 (uint32) | payload
+# and the payload is: metadata length (uint32) | JSON metadata | binary blob
+RECORD_HEADER = struct.Struct('<II')
+META_HEADER = struct.Struct('<I')
+
+JOURNAL_VERSION = 1
+JOURNAL_EXTENSION = '.journal'
+
+
+class SessionJournal:
+    """Append-only, on-disk journal of the reports saved during a session.
+
+    The first record describes the session (the parameters from the selection screen),
+    then one record is appended per saved report, with its map stored compressed.
+    Each record is written with a single write and fsync'ed, and carries its length
+    and a CRC, so a crash can at worst lose the record being written: a torn tail is
+    detected and dropped when the journal is read back.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    @classmethod
+    def create(cls, directory, session, name="session"):
+        """Start a new journal in directory, writing the session record first"""
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, name)
+        path = base + JOURNAL_EXTENSION
+        index = 1
+        while os.path.exists(path):
+            index += 1
+            path = f"{base}_{index}{JOURNAL_EXTENSION}"
+
+        journal = cls(path)
+        journal._file = open(path, 'ab')
+        journal._append({'type': 'session', 'version': JOURNAL_VERSION, 'session': session})
+        return journal
+
+    @classmethod
+    def open(cls, path):
+        """Open an existing journal for appending, dropping a torn tail left by a crash"""
+        journal = cls(path)
+        valid_end = 0
+        for _, _, end in journal._scan():
+            valid_end = end
+        if valid_end != os.path.getsize(path):
+            log.warning("Journal %s: discarding %d bytes of incomplete data",
+                        path, os.path.getsize(path) - valid_end)
+            with open(path, 'r+b') as f:
+                f.truncate(valid_end)
+        journal._file = open(path, 'ab')
+        return journal
+
+    @staticmethod
+    def findUnfinished(directory):
+        """Return the journals left in directory by sessions that were never exported, newest first"""
+        paths = glob.glob(os.path.join(directory, '*' + JOURNAL_EXTENSION))
+        return sorted(paths, key=os.path.getmtime, reverse=True)
+
+    def appendReport(self, key, report):
+        """Append one report (with a CompactMap as 'Map' and SelectionVectors as 'Strokes') to the journal"""
+        fields = {name: value for name, value in report.items() if name not in ('Map', 'Strokes')}
+        strokes = report.get('Strokes')
+        map_header, map_payload = report['Map'].encode()
+        self._append({'type': 'report', 'key': key, 'report': fields, 'map': map_header,
+                      'strokes': strokes.toDict() if strokes is not None else None}, map_payload)
+
+    def session(self):
+        """Return the session parameters stored in the journal"""
+        for meta, _, _ in self._scan():
+            if meta['type'] == 'session':
+                return meta['session']
+        return None
+
+    def iterReports(self):
+        """Yield (key, report) for every journaled report, decoding one map at a time"""
+        for meta, blob, _ in self._scan():
+            if meta['type'] != 'report':
+                continue
+            report = dict(meta['report'])
+            report['Map'] = CompactMap.decode(meta['map'], blob)
+            if meta.get('strokes'):
+                report['Strokes'] = SelectionVectors.fromDict(meta['strokes'])
+            yield meta['key'], report
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        """Delete the journal once its session has been exported"""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def discard(self):
+        """Set the journal aside so it is no longer offered for recovery, without deleting it"""
+        self.close()
+        if os.path.exists(self.path):
+            os.replace(self.path, self.path + '.discarded')
+
+    def _append(self, meta, blob=b''):
+        meta_bytes = json.dumps(meta).encode('utf-8')
+        payload = META_HEADER.pack(len(meta_bytes)) + meta_bytes + blob
+        record = RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+        # One write per record, forced to disk before the report is considered saved
+        with span("journal.write"):
+            self._file.write(record)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def _scan(self):
+        """Yield (metadata, blob, end offset) for every complete, valid record"""
+        if self._file is not None:
+            self._file.flush()
+        with open(self.path, 'rb') as f:
+            offset = 0
+            while True:
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    return
+                length, crc = RECORD_HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    return
+                meta_length = META_HEADER.unpack_from(payload)[0]
+                meta_end = META_HEADER.size + meta_length
+                meta = json.loads(payload[META_HEADER.size:meta_end].decode('utf-8'))
+                offset += RECORD_HEADER.size + length
+                yield meta, payload[meta_end:], offset
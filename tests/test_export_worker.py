@@ -0,0 +1,126 @@
+import faulthandler
+import os
+import sys
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+import pytest  # noqa: E402
+from PyQt5.QtCore import QThreadPool  # noqa: E402
+from PyQt5.QtWidgets import QApplication, QFileDialog, QMessageBox  # noqa: E402
+
+from export_backends import Hdf5Backend, availableBackends, h5py  # noqa: E402
+from export_worker import matlabReportEntry  # noqa: E402
+from report_maps import CompactMap  # noqa: E402
+from sensation_app import SensationApp  # noqa: E402
+from session_files import openSession  # noqa: E402
+
+
+def sessionReports(shape, count, seed=0):
+    """Reports with elliptic maps of random size and position, like lasso selections"""
+    rng = np.random.default_rng(seed)
+    reports = {}
+    for i in range(count):
+        mask = np.zeros(shape, dtype=np.uint8)
+        center = (int(rng.integers(0, shape[1])), int(rng.integers(0, shape[0])))
+        axes = (int(rng.integers(5, 150)), int(rng.integers(5, 150)))
+        cv2.ellipse(mask, center, axes, float(rng.uniform(0, 180)), 0, 360, 255, -1)
+        reports[str(i + 1)] = {
+            'Map': CompactMap.fromArray(mask),
+            'ModulatedParameter': 1.0 + 0.1 * i,
+            'Sensation': ["Touch"],
+            'AdditionalDescription': "",
+            'Naturalness': 5,
+            'Painfulness': 0,
+            'UnderElectrodeSensation': 5,
+            'Strokes': None
+        }
+    return reports
+
+
+@pytest.fixture
+def app():
+    return QApplication.instance() or QApplication([])
+
+
+@pytest.fixture
+def window(app, tmp_path, monkeypatch):
+    # The app reads its images from PIC and writes its journal in the working directory
+    os.symlink(os.path.join(REPO_DIR, 'PIC'), tmp_path / 'PIC')
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(QMessageBox, 'information', staticmethod(lambda *args, **kwargs: QMessageBox.Ok))
+    monkeypatch.setattr(QMessageBox, 'critical', staticmethod(lambda *args, **kwargs: QMessageBox.Ok))
+    quit_calls = []
+    monkeypatch.setattr(QApplication, 'quit', staticmethod(lambda: quit_calls.append(True)))
+
+    window = SensationApp()
+    window.resize(1600, 1000)
+    window.show()
+    app.processEvents()
+    window.loadHandAssets()
+    window.quit_calls = quit_calls
+    yield window
+    window.hide()
+
+
+@pytest.mark.parametrize('backend_class', availableBackends(), ids=lambda backend: backend.name)
+def test_export_alongside_smooth_rescale(app, window, tmp_path, monkeypatch, backend_class):
+    # Qt's global pool also runs smooth image scaling, and has a single thread on a
+    # single-core machine: an export holding it would hang the rescale below
+    global_pool = QThreadPool.globalInstance()
+    thread_count = global_pool.maxThreadCount()
+    global_pool.setMaxThreadCount(1)
+    faulthandler.dump_traceback_later(60, exit=True)  # Fail with the stacks instead of hanging
+    try:
+        window.reports = sessionReports(window.hand_region.shape, 60)
+        filename = str(tmp_path / "P_session.mat")
+        monkeypatch.setattr(QFileDialog, 'getSaveFileName',
+                            staticmethod(lambda *args, **kwargs: (filename, backend_class.file_filter)))
+        window.save_and_exit()
+
+        rescales = 0
+        while window.export_worker is not None:
+            # A resize that ended: the hand image is rescaled with smooth filtering
+            window.pixmap_cache.setSource(window.original_pixmap)
+            window.displayImage()
+            rescales += 1
+            app.processEvents()
+    finally:
+        faulthandler.cancel_dump_traceback_later()
+        global_pool.setMaxThreadCount(thread_count)
+
+    assert rescales > 0
+    assert window.quit_calls
+    with openSession(filename) as reader:
+        assert len(reader.reportKeys()) == 60
+
+
+@pytest.mark.skipif(not Hdf5Backend.available(), reason="h5py is not installed")
+@pytest.mark.parametrize('shape', [(954, 1470), (512, 512), (3, 700), (0, 0)])
+def test_hdf5_precompressed_chunks(tmp_path, shape):
+    rng = np.random.default_rng(1)
+    selection = np.zeros(shape, dtype=np.uint8)
+    if selection.size:
+        selection[rng.random(shape) < 0.2] = 255
+    report = dict(sessionReports((10, 10), 1)['1'], Map=CompactMap.fromArray(selection))
+
+    # As the export worker does: compressed on a pool thread, then written
+    backend = Hdf5Backend()
+    path = str(tmp_path / "session.mat")
+    backend.begin(path, {'PatientID': "P7"})
+    backend.writeReport("1", backend.prepareReport(matlabReportEntry(report)))
+    backend.writeReport("2", matlabReportEntry(report))
+    backend.finish()
+
+    with h5py.File(path, 'r') as file:
+        for key in ('report_1', 'report_2'):
+            dataset = file['data/report'][key]['Map']
+            if selection.size:
+                assert dataset.compression == 'gzip'
+                assert dataset.chunks == tuple(min(512, size) for size in shape[::-1])
+    with openSession(path) as reader:
+        for key in ("1", "2"):
+            assert np.array_equal(np.asarray(reader.readMap(key)).reshape(shape), selection)
@@ -0,0 +1,78 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+import pytest  # noqa: E402
+
+from export_worker import matlabReportEntry  # noqa: E402
+from report_maps import CompactMap, LazyMap  # noqa: E402
+from selection_mask import SelectionMask  # noqa: E402
+
+SHAPE = (60, 90)
+
+
+def selection(*pixels):
+    """A selection map with the given (row, col) slices set to 255"""
+    array = np.zeros(SHAPE, dtype=np.uint8)
+    for rows, cols in pixels:
+        array[rows, cols] = 255
+    return array
+
+
+MAPS = {
+    'empty': selection(),
+    'single pixel': selection((17, 42)),
+    'top-left pixel': selection((0, 0)),
+    'bottom-right pixel': selection((-1, -1)),
+    'left and right borders': selection((slice(10, 20), 0), (slice(30, 40), -1)),
+    'top and bottom borders': selection((0, slice(5, 9)), (-1, slice(50, 60))),
+    'whole frame': selection((slice(None), slice(None))),
+    'blob': selection((slice(5, 25), slice(30, 70)), (slice(22, 40), slice(10, 35))),
+}
+
+
+@pytest.fixture(params=MAPS.values(), ids=MAPS.keys())
+def array(request):
+    return request.param
+
+
+def test_round_trip(array):
+    compact = CompactMap.fromArray(array)
+    assert compact.toArray().dtype == array.dtype
+    assert np.array_equal(compact.toArray(), array)
+    assert np.array_equal(CompactMap.decode(*compact.encode()).toArray(), array)
+    assert np.array_equal(LazyMap(array.shape, lambda: array).toArray(), array)
+
+
+def test_round_trip_from_selection_bbox(array):
+    mask = SelectionMask(array.copy())
+    compact = CompactMap.fromArray(mask.mask, bbox=mask.bbox)
+    assert compact.bbox == mask.bbox
+    assert np.array_equal(compact.toArray(), array)
+
+
+def test_exported_map_unchanged(array):
+    report = {'Map': CompactMap.fromArray(array), 'ModulatedParameter': 1.0, 'Sensation': ["Touch"],
+              'AdditionalDescription': "", 'Naturalness': 5, 'Painfulness': 0, 'UnderElectrodeSensation': 5}
+    exported = matlabReportEntry(report)['Map']
+    assert exported.dtype == array.dtype
+    assert np.array_equal(exported, array)
+
+
+def test_bbox_order():
+    compact = CompactMap.fromArray(selection((slice(5, 8), slice(40, 50))))
+    assert compact.offset == (5, 40)
+    assert compact.bbox == (40, 5, 50, 8)
+    assert CompactMap.fromArray(selection()).bbox is None
+
+
+def test_non_binary_round_trip():
+    array = np.zeros(SHAPE, dtype=np.uint16)
+    array[0, 3:7] = [1, 2, 3, 4]
+    array[-1, -1] = 900
+    compact = CompactMap.fromArray(array)
+    assert compact.dense is not None
+    assert np.array_equal(compact.toArray(), array)
+    assert np.array_equal(CompactMap.decode(*compact.encode()).toArray(), array)
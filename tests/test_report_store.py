@@ -0,0 +1,87 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from report_maps import CompactMap  # noqa: E402
+from report_store import MemmapReportStore, MemoryReportStore  # noqa: E402
+
+SHAPE = (200, 300)
+INITIAL_BYTES = 16 * 1024
+
+
+def makeReports(count, seed=0):
+    """Reports with noisy maps, which compress poorly and fill the store quickly"""
+    rng = np.random.default_rng(seed)
+    reports = {}
+    for i in range(count):
+        array = np.zeros(SHAPE, dtype=np.uint8)
+        row, col = int(rng.integers(0, SHAPE[0] - 60)), int(rng.integers(0, SHAPE[1] - 60))
+        array[row:row + 60, col:col + 60][rng.random((60, 60)) < 0.5] = 255
+        reports[str(i + 1)] = {'Map': CompactMap.fromArray(array), 'ModulatedParameter': float(i),
+                               'Sensation': ["Touch"], 'Naturalness': i % 11}
+    return reports
+
+
+def assertSameReports(store, reports):
+    assert list(store) == list(reports)
+    for (key, report), expected in zip(store.items(), reports.values()):
+        assert np.array_equal(report['Map'].toArray(), expected['Map'].toArray())
+        assert {name: value for name, value in report.items() if name != 'Map'} == \
+            {name: value for name, value in expected.items() if name != 'Map'}
+
+
+def test_grows_past_initial_capacity(tmp_path):
+    store = MemmapReportStore(str(tmp_path), initial_bytes=INITIAL_BYTES)
+    reports = makeReports(100)
+    for key, report in reports.items():
+        store[key] = report
+
+    size = os.path.getsize(store.path)
+    assert store.nbytes > INITIAL_BYTES
+    assert size >= store.nbytes and size % INITIAL_BYTES == 0
+    assert (size // INITIAL_BYTES) & (size // INITIAL_BYTES - 1) == 0  # Grown by doubling
+    assertSameReports(store, reports)
+
+    path = store.path
+    store.close()
+    assert not os.path.exists(path)
+
+
+def test_reserve_then_append(tmp_path):
+    store = MemmapReportStore(str(tmp_path), initial_bytes=INITIAL_BYTES)
+    reports = makeReports(30)
+    store["1"] = reports["1"]
+    needed = sum(len(report['Map'].encode(level=1)[1]) for report in reports.values())
+    store.reserve(needed)
+    size, mapping = os.path.getsize(store.path), store._mmap
+    assert size >= store.nbytes + needed
+
+    for key, report in list(reports.items())[1:]:
+        store[key] = report
+    # The reserved space was enough: the file was neither grown nor remapped
+    assert os.path.getsize(store.path) == size
+    assert store._mmap is mapping
+    assertSameReports(store, reports)
+    store.close()
+
+
+def test_replace_and_delete(tmp_path):
+    store = MemmapReportStore(str(tmp_path), initial_bytes=INITIAL_BYTES)
+    first, second = makeReports(2).values()
+    store["1"] = first
+    store["2"] = second
+    store["1"] = second
+    del store["2"]
+    assertSameReports(store, {"1": second})
+    store.close()
+
+
+def test_memory_store_reserve():
+    store = MemoryReportStore()
+    reports = makeReports(3)
+    store.reserve(1024 * 1024)  # Nothing to preallocate, but callers need not check
+    store.update(reports)
+    assertSameReports(store, reports)
@@ -0,0 +1,121 @@
+import csv
+import math
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+import pytest  # noqa: E402
+
+import report_table  # noqa: E402
+from report_maps import CompactMap  # noqa: E402
+from report_table import ReportTable, summaryFormat, summaryPath  # noqa: E402
+
+SENSATIONS = ["Touch", "Urge to move", "Pins & needles"]
+
+
+def makeReport(i, sensations, description=""):
+    array = np.zeros((40, 60), dtype=np.uint8)
+    if i % 5:
+        array[i % 30:i % 30 + 4, i % 50:i % 50 + 6] = 255
+    return {'Map': CompactMap.fromArray(array), 'ModulatedParameter': 0.25 * i, 'Sensation': sensations,
+            'AdditionalDescription': description, 'Naturalness': i % 11, 'Painfulness': 10 - i % 11,
+            'UnderElectrodeSensation': i % 3}
+
+
+def readCsv(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+def test_csv_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(report_table, 'WRITE_BLOCK_ROWS', 7)  # Several blocks
+    table = ReportTable(SENSATIONS)
+    reports = {}
+    # More rows than INITIAL_ROWS, added out of order
+    for i in list(range(100, 0, -2)) + list(range(1, 100, 2)):
+        sensations = [SENSATIONS[i % 3]]
+        if i % 4 == 0:
+            sensations.append(SENSATIONS[(i + 1) % 3])
+        if i % 7 == 0:
+            sensations.append(f"Other: warm, then \"cold\" {i}")
+        if i == 50:
+            sensations.append("Vibration")  # Not in the list: gets its own column
+        reports[i] = makeReport(i, sensations, description=f"line one\nline two, {i}" if i % 9 == 0 else "")
+        table.add(str(i), reports[i])
+    table.add("3", reports[3])  # Replaced, not added twice
+    assert len(table) == 100
+
+    path = str(tmp_path / "P_summary.csv")
+    table.write(path)
+    rows = readCsv(path)
+
+    assert list(rows[0])[:8] == [name for name, _ in report_table.COLUMNS]
+    sensation_columns = ["Sensation_Touch", "Sensation_Urge_to_move", "Sensation_Pins_needles",
+                         "Sensation_Other", "Sensation_Vibration"]
+    assert [name for name in rows[0] if name.startswith("Sensation_")] == sensation_columns
+    assert [int(row['Report']) for row in rows] == list(range(1, 101))
+    for row in rows:
+        i = int(row['Report'])
+        report = reports[i]
+        assert float(row['ModulatedParameter']) == report['ModulatedParameter']
+        assert int(row['Naturalness']) == report['Naturalness']
+        assert int(row['Painfulness']) == report['Painfulness']
+        assert int(row['UnderElectrodeSensation']) == report['UnderElectrodeSensation']
+
+        array = report['Map'].toArray()
+        ys, xs = np.nonzero(array)
+        assert int(row['Area']) == len(xs)
+        if len(xs):
+            assert float(row['CentroidX']) == pytest.approx(xs.mean())
+            assert float(row['CentroidY']) == pytest.approx(ys.mean())
+        else:
+            assert math.isnan(float(row['CentroidX'])) and math.isnan(float(row['CentroidY']))
+
+        named = [sensation for sensation in report['Sensation'] if not sensation.startswith("Other: ")]
+        other = [sensation[len("Other: "):] for sensation in report['Sensation'] if sensation.startswith("Other: ")]
+        expected = {report_table.sensationColumn(sensation): '1' for sensation in named}
+        if other:
+            expected["Sensation_Other"] = '1'
+        assert {name: row[name] for name in sensation_columns} == \
+            {name: expected.get(name, '0') for name in sensation_columns}
+        assert row['OtherSensation'] == "; ".join(other)
+        assert row['AdditionalDescription'] == report['AdditionalDescription']
+
+
+def test_csv_without_pyarrow(tmp_path, monkeypatch):
+    monkeypatch.setattr(report_table, 'pq', None)
+    monkeypatch.delenv("SENSATION_SUMMARY_FORMAT", raising=False)
+    assert summaryFormat() == "csv"
+    path = summaryPath(str(tmp_path / "P_session.mat"))
+    assert path == str(tmp_path / "P_session_summary.csv")
+
+    table = ReportTable(SENSATIONS)
+    table.add("1", makeReport(1, ["Touch"]))
+    table.write(path)
+    assert [row['Report'] for row in readCsv(path)] == ['1']
+    with pytest.raises(RuntimeError):
+        table.writeParquet(str(tmp_path / "P_session_summary.parquet"))
+
+
+def test_csv_requested(monkeypatch):
+    monkeypatch.setenv("SENSATION_SUMMARY_FORMAT", "CSV")
+    assert summaryFormat() == "csv"
+
+
+def test_parquet_round_trip(tmp_path, monkeypatch):
+    pq = pytest.importorskip("pyarrow.parquet")
+    monkeypatch.delenv("SENSATION_SUMMARY_FORMAT", raising=False)
+    assert summaryFormat() == "parquet"
+    table = ReportTable(SENSATIONS)
+    for i in (2, 1):
+        table.add(str(i), makeReport(i, ["Urge to move", "Other: warm"]))
+    path = str(tmp_path / "P_session_summary.parquet")
+    table.write(path)
+
+    columns = pq.read_table(path).to_pydict()
+    assert columns['Report'] == [1, 2]
+    assert columns['Sensation_Urge_to_move'] == [True, True]
+    assert columns['Sensation_Touch'] == [False, False]
+    assert columns['OtherSensation'] == ["warm", "warm"]
@@ -0,0 +1,112 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+
+from selection_history import MAX_UNDO_LEVELS, SelectionEdit, SelectionHistory  # noqa: E402
+from selection_mask import SelectionMask  # noqa: E402
+
+SHAPE = (80, 120)
+
+
+def randomEdit(selection, rng):
+    """Add or erase a random polygon (possibly crossing the image edge), as a lasso does;
+    return its SelectionEdit"""
+    height, width = SHAPE
+    center = rng.uniform([-10, -10], [width + 10, height + 10])
+    polygon = (center + rng.uniform(-25, 25, (int(rng.integers(3, 12)), 2))).astype(np.int32)
+    x, y, w, h = cv2.boundingRect(polygon)
+    x0, y0, x1, y1 = max(x, 0), max(y, 0), min(x + w, width), min(y + h, height)
+    if x1 <= x0 or y1 <= y0:
+        x0, y0, x1, y1 = 0, 0, 1, 1
+
+    roi = selection.mask[y0:y1, x0:x1]
+    before = roi.copy()
+    stroke = np.zeros_like(roi)
+    cv2.fillPoly(stroke, [polygon - (x0, y0)], 255)
+    if rng.random() < 0.3:
+        roi[stroke != 0] = 0
+    else:
+        roi |= stroke
+    selection.regionChanged((x0, y0, x1, y1), before)
+    return SelectionEdit((x0, y0, x1, y1), before, roi)
+
+
+def assertMatches(selection, expected):
+    assert np.array_equal(selection.mask, expected)
+    # The measurements updated from the boxes agree with the whole mask
+    fresh = SelectionMask(expected.copy())
+    assert selection.area == fresh.area
+    assert selection.bbox == fresh.bbox
+    if fresh.area:
+        assert np.allclose(selection.centroid, fresh.centroid)
+
+
+def test_undo_redo_all():
+    rng = np.random.default_rng(0)
+    selection = SelectionMask.empty(*SHAPE)
+    history = SelectionHistory()
+    states = [selection.mask.copy()]
+    for _ in range(200):
+        history.record(randomEdit(selection, rng))
+        states.append(selection.mask.copy())
+
+    for expected in reversed(states[:-1]):
+        assert history.undo(selection) is not None
+        assertMatches(selection, expected)
+    assert not history.canUndo()
+    assert history.undo(selection) is None
+
+    for expected in states[1:]:
+        assert history.redo(selection) is not None
+        assertMatches(selection, expected)
+    assert not history.canRedo()
+    assert history.redo(selection) is None
+
+
+def test_new_edit_discards_redo():
+    rng = np.random.default_rng(1)
+    selection = SelectionMask.empty(*SHAPE)
+    history = SelectionHistory()
+    for _ in range(3):
+        history.record(randomEdit(selection, rng))
+    history.undo(selection)
+    assert history.canRedo()
+    history.record(randomEdit(selection, rng))
+    assert not history.canRedo()
+
+
+def test_oldest_edit_dropped_at_cap():
+    rng = np.random.default_rng(2)
+    selection = SelectionMask.empty(*SHAPE)
+    history = SelectionHistory(max_levels=5)
+    states = [selection.mask.copy()]
+    for _ in range(8):
+        history.record(randomEdit(selection, rng))
+        states.append(selection.mask.copy())
+
+    for expected in reversed(states[3:-1]):
+        history.undo(selection)
+        assertMatches(selection, expected)
+    # The three oldest edits were forgotten
+    assert not history.canUndo()
+    assert np.array_equal(selection.mask, states[3])
+
+
+def test_default_cap():
+    rng = np.random.default_rng(3)
+    selection = SelectionMask.empty(*SHAPE)
+    history = SelectionHistory()
+    edits = []
+    for _ in range(MAX_UNDO_LEVELS + 1):
+        edits.append(randomEdit(selection, rng))
+        history.record(edits[-1])
+
+    undone = []
+    while history.canUndo():
+        undone.append(history.undo(selection))
+    assert len(undone) == MAX_UNDO_LEVELS
+    assert undone[-1] is edits[1]
@@ -0,0 +1,74 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+import pytest  # noqa: E402
+
+from selection_mask import SelectionMask  # noqa: E402
+from selection_overlay import SelectionOverlay  # noqa: E402
+
+SHAPE = (300, 450)
+
+# Lasso polygons (x, y) and whether they erase; several cross the edges of the image
+STROKES = [
+    ([(40, 40), (200, 30), (220, 160), (60, 180)], False),
+    ([(-30, 100), (80, 90), (70, 260), (-50, 240)], False),       # Left edge
+    ([(380, -40), (480, -20), (470, 120), (360, 90)], False),     # Top-right corner
+    ([(100, 250), (300, 240), (320, 340), (90, 330)], False),     # Bottom edge
+    ([(60, 60), (150, 50), (140, 140)], True),
+    ([(-20, 150), (30, 140), (20, 320), (-40, 310)], True),       # Erase across the left edge
+    ([(400, 50), (470, 60), (460, 200)], True),                   # Erase across the right edge
+    ([(5, 5), (6, 5), (6, 6)], False),                            # A few pixels
+]
+
+
+def applyStroke(selection, polygon, erase):
+    """Add or erase a polygon like processLassoSelection; return the edited bbox"""
+    height, width = selection.shape
+    points = np.array(polygon, dtype=np.int32)
+    x, y, w, h = cv2.boundingRect(points)
+    x0, y0, x1, y1 = max(x, 0), max(y, 0), min(x + w, width), min(y + h, height)
+    roi = selection.mask[y0:y1, x0:x1]
+    before = roi.copy()
+    stroke = np.zeros_like(roi)
+    cv2.fillPoly(stroke, [points - (x0, y0)], 255)
+    if erase:
+        roi[stroke != 0] = 0
+    else:
+        roi |= stroke
+    selection.regionChanged((x0, y0, x1, y1), before)
+    return (x0, y0, x1, y1)
+
+
+def overlayPixels(overlay, width, height, visible):
+    image, origin = overlay.view(width, height, visible)
+    return origin, overlay._buffer.copy()
+
+
+@pytest.mark.parametrize('display_size, visible', [
+    ((450, 300), None),                       # Same size as the mask
+    ((317, 211), None),                       # Downscaled, not an integer factor
+    ((1000, 667), None),                      # Upscaled
+    ((2250, 1500), (600, 300, 1400, 900)),    # Zoomed in: only the tiles around the view
+    ((2250, 1500), (1900, 1200, 2250, 1500)),  # Zoomed in on the bottom-right corner
+])
+def test_region_updates_match_full_build(display_size, visible):
+    width, height = display_size
+    selection = SelectionMask.empty(*SHAPE)
+    overlay = SelectionOverlay()
+    overlay.setMask(selection.mask)  # Shared with the selection, as in the app
+    overlay.view(width, height, visible)
+
+    for polygon, erase in STROKES:
+        bbox = applyStroke(selection, polygon, erase)
+        overlay.updateRegion(bbox)
+
+        rebuilt = SelectionOverlay()
+        rebuilt.setMask(selection.mask.copy())
+        origin, expected = overlayPixels(rebuilt, width, height, visible)
+        updated_origin, updated = overlayPixels(overlay, width, height, visible)
+        assert updated_origin == origin
+        assert np.array_equal(updated, expected)
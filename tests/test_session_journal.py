@@ -0,0 +1,141 @@
+import os
+import sys
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+
+from export_backends import MatV5Backend  # noqa: E402
+from export_worker import SessionExportWorker  # noqa: E402
+from report_maps import CompactMap  # noqa: E402
+from selection_vectors import SelectionVectors  # noqa: E402
+from session_files import openSession  # noqa: E402
+from session_journal import SessionJournal  # noqa: E402
+
+MAP_SHAPE = (120, 160)
+SESSION = {'patient_id': "P7", 'hand': "left"}
+
+
+def makeReports(count, seed=0):
+    """Reports like save_data builds them, with an elliptic selection and its stroke"""
+    rng = np.random.default_rng(seed)
+    reports = {}
+    for i in range(count):
+        mask = np.zeros(MAP_SHAPE, dtype=np.uint8)
+        center = (int(rng.integers(0, MAP_SHAPE[1])), int(rng.integers(0, MAP_SHAPE[0])))
+        cv2.ellipse(mask, center, (int(rng.integers(3, 40)), int(rng.integers(3, 40))), 0, 0, 360, 255, -1)
+        strokes = SelectionVectors("left", "region", MAP_SHAPE)
+        strokes.addStroke(rng.uniform(0, 100, (30, 2)))
+        reports[str(i + 1)] = {
+            'Map': CompactMap.fromArray(mask),
+            'ModulatedParameter': 1.0 + 0.5 * i,
+            'Sensation': ["Touch", f"Other: report {i + 1}"],
+            'AdditionalDescription': "",
+            'Naturalness': i % 11,
+            'Painfulness': 0,
+            'UnderElectrodeSensation': 3,
+            'Strokes': strokes
+        }
+    return reports
+
+
+def writeJournal(directory, reports):
+    """Journal the reports; return the journal path and the end offset of each record"""
+    journal = SessionJournal.create(str(directory), SESSION)
+    ends = [os.path.getsize(journal.path)]
+    for key, report in reports.items():
+        journal.appendReport(key, report)
+        ends.append(os.path.getsize(journal.path))
+    journal.close()
+    return journal.path, ends
+
+
+def assertSameReports(journaled, reports):
+    assert [key for key, _ in journaled] == list(reports)
+    for key, report in journaled:
+        expected = reports[key]
+        assert np.array_equal(report['Map'].toArray(), expected['Map'].toArray())
+        for name in ('ModulatedParameter', 'Sensation', 'AdditionalDescription', 'Naturalness',
+                     'Painfulness', 'UnderElectrodeSensation'):
+            assert report[name] == expected[name]
+        assert report['Strokes'].erased == expected['Strokes'].erased
+        for stroke, expected_stroke in zip(report['Strokes'].strokes, expected['Strokes'].strokes):
+            assert np.allclose(stroke, expected_stroke, atol=0.005)  # Journaled to 0.01 pixel
+
+
+def test_round_trip(tmp_path):
+    reports = makeReports(5)
+    path, _ = writeJournal(tmp_path, reports)
+
+    journal = SessionJournal.open(path)
+    assert journal.session() == SESSION
+    assertSameReports(list(journal.iterReports()), reports)
+    journal.close()
+
+
+def test_truncated_last_record(tmp_path):
+    reports = makeReports(3)
+    path, ends = writeJournal(tmp_path, reports)
+    with open(path, 'r+b') as f:
+        f.truncate(ends[-1] - 10)  # Crash while the last report was written
+
+    journal = SessionJournal.open(path)
+    assert os.path.getsize(path) == ends[-2]
+    assertSameReports(list(journal.iterReports()), {key: reports[key] for key in ("1", "2")})
+
+    # Appending goes on from the last complete record
+    extra = makeReports(1, seed=1)["1"]
+    journal.appendReport("3", extra)
+    assertSameReports(list(journal.iterReports()), {"1": reports["1"], "2": reports["2"], "3": extra})
+    journal.close()
+
+
+def test_flipped_byte(tmp_path):
+    reports = makeReports(3)
+    path, ends = writeJournal(tmp_path, reports)
+    with open(path, 'r+b') as f:
+        f.seek((ends[1] + ends[2]) // 2)  # In the map of the second report
+        byte = f.read(1)
+        f.seek(-1, os.SEEK_CUR)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+    # The records are not trusted from the first bad CRC on
+    journal = SessionJournal(path)
+    assertSameReports(list(journal.iterReports()), {"1": reports["1"]})
+    SessionJournal.open(path).close()
+    assert os.path.getsize(path) == ends[1]
+
+
+def test_find_unfinished(tmp_path):
+    older, _ = writeJournal(tmp_path, makeReports(1))
+    newer, _ = writeJournal(tmp_path, makeReports(1))
+    os.utime(older, (time.time() - 60, time.time() - 60))
+    exported, _ = writeJournal(tmp_path, makeReports(1))
+    SessionJournal(exported).remove()
+    abandoned, _ = writeJournal(tmp_path, makeReports(1))
+    SessionJournal(abandoned).discard()
+
+    assert SessionJournal.findUnfinished(str(tmp_path)) == [newer, older]
+
+
+def test_export_from_journal(tmp_path):
+    reports = makeReports(4)
+    path, _ = writeJournal(tmp_path, reports)
+
+    filename = str(tmp_path / "P7_session.mat")
+    journal = SessionJournal.open(path)
+    worker = SessionExportWorker(filename, {'PatientID': "P7"}, journal.iterReports(), MatV5Backend(),
+                                 report_count=len(reports))
+    failures = []
+    worker.signals.failed.connect(failures.append)
+    worker.run()
+    journal.close()
+
+    assert not failures
+    with openSession(filename) as reader:
+        assert reader.reportKeys() == [int(key) for key in reports]
+        for key, report in reports.items():
+            assert np.array_equal(np.asarray(reader.readMap(key)), report['Map'].toArray())
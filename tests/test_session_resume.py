@@ -0,0 +1,85 @@
+import os
+import sys
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+import pytest  # noqa: E402
+
+from export_backends import availableBackends  # noqa: E402
+from export_worker import matlabReportEntry  # noqa: E402
+from report_maps import CompactMap  # noqa: E402
+from report_store import SessionFileReportStore  # noqa: E402
+from sensation_app import sessionFromHeader  # noqa: E402
+from session_files import headerText, openSession  # noqa: E402
+
+
+def writeSession(path, backend, patient_id, device_name):
+    """Write a one-report session file like save_and_exit"""
+    header = {
+        'Date': "2026/01/01 10:00",
+        'PatientID': patient_id,
+        'DeviceName': device_name,
+        'Hand': "Left",
+        'ModulationType': "frequency",
+        'Nerve': "Ulnar",
+        'InterphaseDistance_us': 50.0,
+        'Current': 2.5,
+        'Frequency': np.array([]),
+        'PulseWidth': 300.0,
+        'MotorThreshold': 80.0,
+        'SensoryThreshold': 20.0
+    }
+    selection = np.zeros((40, 60), dtype=np.uint8)
+    selection[10:20, 30:45] = 255
+    report = {
+        'Map': CompactMap.fromArray(selection),
+        'ModulatedParameter': 40.0,
+        'Sensation': ["Touch"],
+        'AdditionalDescription': "",
+        'Naturalness': 5,
+        'Painfulness': 0,
+        'UnderElectrodeSensation': 5,
+        'Strokes': None
+    }
+    backend.begin(path, header)
+    backend.writeReport("1", matlabReportEntry(report))
+    backend.finish()
+
+
+@pytest.mark.parametrize('backend_class', availableBackends(), ids=lambda backend: backend.name)
+@pytest.mark.parametrize('patient_id, device_name', [("", ""), ("P7", "dev")])
+def test_resume_restores_text_fields(tmp_path, backend_class, patient_id, device_name):
+    path = str(tmp_path / "P_session.mat")
+    writeSession(path, backend_class(), patient_id, device_name)
+
+    with openSession(path) as reader:
+        session = sessionFromHeader(reader.header, path)
+    assert session['patient_id'] == patient_id
+    assert session['device_name'] == device_name
+    assert session['hand'] == "left"
+    assert session['modulation']['type'] == "frequency"
+    assert session['stimulation'] == {"median_nerve": False, "ulnar_nerve": True}
+    assert session['parameters']['frequency'] is None
+
+    reports = SessionFileReportStore(openSession(path))
+    try:
+        assert reports.hand == "left"
+        assert list(reports) == ["1"]
+        assert reports["1"]['Map'].toArray().sum() == 255 * 150
+    finally:
+        reports.close()
+
+
+@pytest.mark.parametrize('value, text', [
+    (np.array([]), ''),
+    (np.array([], dtype='<U1'), ''),
+    (np.array('P7'), 'P7'),
+    (np.array(['P7']), 'P7'),
+    (b'P7', 'P7'),
+    (None, ''),
+    ("P7", "P7"),
+])
+def test_header_text(value, text):
+    assert headerText(value) == text